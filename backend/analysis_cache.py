@@ -0,0 +1,259 @@
+# analysis_cache.py
+"""
+Content-addressed cache for analysis results.
+
+Results are keyed on the analysis name, the normalized input text, doc_date,
+language, model and a hash of the analysis' prompt template, so editing one
+analyzer's prompt only invalidates that analyzer's entries. Analyses whose
+results reference sentence ids also key on the sentence segmentation
+(sentences.fingerprint()), which whitespace normalization would otherwise hide.
+
+Two tiers:
+  - an in-process LRU bounded by the total size (bytes) of the cached JSON
+  - a SQLite table that survives restarts and is shared by worker processes
+
+Tunables (environment variables):
+  ANANSI_CACHE_ENABLED     "0" disables the cache entirely       (default "1")
+  ANANSI_CACHE_MAX_BYTES   memory tier budget in bytes            (default 64 MiB)
+  ANANSI_CACHE_DB          SQLite file (default cache/analysis_cache.sqlite3
+                           next to this module)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+CACHE_ENABLED = os.environ.get("ANANSI_CACHE_ENABLED", "1") != "0"
+DEFAULT_MAX_BYTES = int(os.environ.get("ANANSI_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_DB_PATH = os.environ.get(
+    "ANANSI_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "analysis_cache.sqlite3"),
+)
+
+
+def normalize_text(text):
+    """
+    Normalizes text for keying: Unicode NFC, collapsed whitespace, stripped.
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+
+def prompt_hash(template):
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(analysis, input_text, doc_date, language, model, template, sentences=""):
+    """
+    Builds the content address for one analysis of one document.
+
+    :param sentences: sentences.fingerprint() of the text, for analyses whose
+        results reference sentence ids ("" otherwise)
+    """
+    parts = [
+        analysis,
+        normalize_text(input_text),
+        (doc_date or "").strip(),
+        (language or "").strip().lower(),
+        model,
+        prompt_hash(template),
+    ]
+    if sentences:
+        parts.append(sentences)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class MemoryLRU:
+    """
+    Thread-safe LRU holding serialized JSON, evicting least recently used
+    entries once the summed size exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.current_bytes -= len(old)
+            self._items[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SQLiteStore:
+    """
+    Persistent key -> JSON store. One connection guarded by a lock; WAL mode
+    lets several worker processes read while one writes.
+    """
+
+    def __init__(self, path, table="analysis_cache"):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " analysis TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, analysis, value):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, analysis, value, created_at) VALUES (?, ?, ?, ?)",
+                (key, analysis, value, time.time()),
+            )
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class TieredCache:
+    """
+    Memory LRU in front of a SQLite store. Disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, db_path=DEFAULT_DB_PATH, table="analysis_cache"):
+        self.memory = MemoryLRU(max_bytes)
+        self.disk = SQLiteStore(db_path, table)
+        self._stats_lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+    def _bump(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get(self, key):
+        """
+        :return: (value, tier) where tier is "memory", "disk" or "miss".
+        """
+        raw = self.memory.get(key)
+        if raw is not None:
+            self._bump("memory_hits")
+            return json.loads(raw), "memory"
+        raw = self.disk.get(key)
+        if raw is not None:
+            self.memory.set(key, raw)
+            self._bump("disk_hits")
+            return json.loads(raw), "disk"
+        self._bump("misses")
+        return None, "miss"
+
+    def set(self, key, analysis, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        self.memory.set(key, raw)
+        self.disk.set(key, analysis, raw)
+        self._bump("writes")
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_bytes"] = self.memory.current_bytes
+        stats["disk_entries"] = self.disk.count()
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Returns the process-wide analysis cache, or None when caching is disabled.
+    """
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TieredCache()
+    return _cache
+
+
+def _cacheable(result):
+    # Parse failures and salvaged partial answers are not worth remembering:
+    # the next call may succeed.
+    return isinstance(result, (dict, list)) and not (
+        isinstance(result, dict) and ("error" in result or "warning" in result))
+
+
+def lookup(analysis, key_fields):
+    """
+    Looks up one analysis result without computing it.
+
+    :param key_fields: dict with input_text, doc_date, language, model, template
+        and optionally sentences
+    :return: (result or None, cache status: "memory", "disk", "miss" or "disabled")
+    """
+    cache = get_cache()
+    if cache is None:
+        return None, "disabled"
+    return cache.get(cache_key(analysis, **key_fields))
+
+
+def store(analysis, key_fields, result):
+    """
+    Stores a freshly computed result, unless caching is disabled or it failed.
+    """
+    cache = get_cache()
+    if cache is not None and _cacheable(result):
+        cache.set(cache_key(analysis, **key_fields), analysis, result)
+
+
+def cached_call(analysis, func, args, key_fields):
+    """
+    Returns func(*args), served from the cache when possible.
+
+    :param analysis: Analysis name ("events", "causation", ...)
+    :param func: The analyzer function
+    :param args: Positional arguments for func
+    :param key_fields: dict with input_text, doc_date, language, model, template
+        and optionally sentences
+    :return: (result dict, cache status: "memory", "disk", "miss" or "disabled")
+    """
+    cached, status = lookup(analysis, key_fields)
+    if cached is not None:
+        return cached, status
+
+    result = func(*args)
+    store(analysis, key_fields, result)
+    return result, status
@@ -0,0 +1,178 @@
+# analyze_corpus.py
+"""
+Offline batch runner: analyzes a corpus with the same pipeline as /analyze
+and appends one JSON line per document to an output file.
+
+The input is either a JSONL file of {id, input_text, doc_date, language}
+records or a directory of text files (the id is the path relative to the
+directory). Completed ids are appended to a checkpoint file, so re-running the
+same command after a crash or a rate-limit stop skips documents that were
+already paid for. Failed documents are written to <output>.failed.jsonl and
+retried on the next run.
+
+Usage:
+    python analyze_corpus.py corpus.jsonl -o results.jsonl
+    python analyze_corpus.py articles/ -o results.jsonl --analyses events,entities --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from batch import iter_batch, parse_jsonl
+from llm_client import usage_totals
+from pipeline import ANALYSES, MODES, DEFAULT_MODE
+
+
+def iter_directory(path, pattern_suffixes, default_language, default_doc_date):
+    """
+    Yields parse_jsonl-style (number, record, error) tuples for each text
+    file under *path*, in sorted order so ids and numbering are stable.
+    """
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name.endswith(pattern_suffixes):
+                files.append(os.path.join(root, name))
+    for number, file_path in enumerate(sorted(files), start=1):
+        doc_id = os.path.relpath(file_path, path)
+        try:
+            with open(file_path, encoding="utf-8") as handle:
+                text = handle.read()
+        except (OSError, UnicodeDecodeError) as exc:
+            yield number, None, f"{doc_id}: {exc}"
+            continue
+        yield number, {
+            "id": doc_id,
+            "input_text": text,
+            "language": default_language,
+            "doc_date": default_doc_date,
+        }, None
+
+
+def iter_jsonl(path, default_language, default_doc_date):
+    with open(path, encoding="utf-8") as handle:
+        for number, record, error in parse_jsonl(handle):
+            if record is not None:
+                record.setdefault("id", number)
+                record.setdefault("language", default_language)
+                record.setdefault("doc_date", default_doc_date)
+            yield number, record, error
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as handle:
+        return {line.rstrip("\n") for line in handle if line.strip()}
+
+
+def skip_completed(records, completed):
+    for number, record, error in records:
+        if record is not None and str(record["id"]) in completed:
+            continue
+        yield number, record, error
+
+
+def _append_line(handle, text):
+    handle.write(text + "\n")
+    handle.flush()
+    os.fsync(handle.fileno())
+
+
+def _progress_line(done, total, failed, skipped, started):
+    elapsed = max(time.time() - started, 1e-9)
+    usage = usage_totals()
+    total_str = f"/{total}" if total is not None else ""
+    return (
+        f"[{done}{total_str}] {done / elapsed:.2f} docs/s | "
+        f"failed {failed} | skipped {skipped} | "
+        f"tokens prompt={usage['prompt_tokens']} (cached {usage['cache_hit_ratio']:.0%}) "
+        f"completion={usage['completion_tokens']} "
+        f"reasoning={usage['reasoning_tokens']} | calls {usage['calls']} | {elapsed:.0f}s"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the temporal_reasoning analyses over a corpus.")
+    parser.add_argument("input", help="JSONL file of {id, input_text, doc_date, language} or a directory of .txt files")
+    parser.add_argument("-o", "--output", required=True, help="Output JSONL (appended to)")
+    parser.add_argument("--analyses", default=",".join(ANALYSES),
+                        help=f"Comma-separated subset of: {', '.join(ANALYSES)} (default: all)")
+    parser.add_argument("--mode", default=DEFAULT_MODE, choices=MODES)
+    parser.add_argument("--workers", type=int, default=4, help="Documents analyzed concurrently")
+    parser.add_argument("--language", default="English", help="Default language for records without one")
+    parser.add_argument("--doc-date", default="", help="Default doc_date for records without one")
+    parser.add_argument("--suffix", action="append", default=None,
+                        help="File suffixes to read from a directory (default: .txt); repeatable")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <output>.done)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the result cache")
+    parser.add_argument("--max-consecutive-failures", type=int, default=20,
+                        help="Stop (resumably) after this many failures in a row, e.g. when rate limited")
+    parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.analyses.split(",") if name.strip()]
+    unknown = [name for name in names if name not in ANALYSES]
+    if unknown:
+        parser.error(f"unknown analyses: {', '.join(unknown)}")
+
+    checkpoint_path = args.checkpoint or args.output + ".done"
+    failed_path = args.output + ".failed.jsonl"
+    completed = load_checkpoint(checkpoint_path)
+
+    if os.path.isdir(args.input):
+        suffixes = tuple(args.suffix or [".txt"])
+        total = sum(1 for _ in iter_directory(args.input, suffixes, "", ""))
+        records = iter_directory(args.input, suffixes, args.language, args.doc_date)
+    else:
+        with open(args.input, encoding="utf-8") as handle:
+            total = sum(1 for line in handle if line.strip())
+        records = iter_jsonl(args.input, args.language, args.doc_date)
+
+    pending_total = max(total - len(completed), 0)
+    print(f"{total} documents, {len(completed)} already completed, {pending_total} to go "
+          f"(analyses: {', '.join(names)}, mode: {args.mode}, workers: {args.workers})", file=sys.stderr)
+
+    started = last_report = time.time()
+    done = failed = consecutive_failures = 0
+    stopped_early = False
+    results = iter_batch(skip_completed(records, completed), args.workers, args.mode,
+                         not args.no_cache, names)
+    with open(args.output, "a", encoding="utf-8") as out, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint, \
+            open(failed_path, "a", encoding="utf-8") as failures:
+        try:
+            for item in results:
+                errors = item.get("error") or (item.get("result") or {}).get("meta", {}).get("errors")
+                if item["status"] == "ok" and not errors:
+                    _append_line(out, json.dumps({"id": item["id"], "result": item["result"]}, ensure_ascii=False))
+                    _append_line(checkpoint, str(item["id"]))
+                    consecutive_failures = 0
+                else:
+                    _append_line(failures, json.dumps({"id": item["id"], "error": errors}, ensure_ascii=False))
+                    failed += 1
+                    consecutive_failures += 1
+                done += 1
+
+                if consecutive_failures >= args.max_consecutive_failures:
+                    print(f"Stopping after {consecutive_failures} consecutive failures; "
+                          f"re-run the same command to resume.", file=sys.stderr)
+                    stopped_early = True
+                    break
+                if time.time() - last_report >= args.progress_every:
+                    print(_progress_line(done, pending_total, failed, len(completed), started), file=sys.stderr)
+                    last_report = time.time()
+        except KeyboardInterrupt:
+            print("Interrupted; re-run the same command to resume.", file=sys.stderr)
+            stopped_early = True
+        finally:
+            results.close()
+
+    print(_progress_line(done, pending_total, failed, len(completed), started), file=sys.stderr)
+    return 1 if stopped_early or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
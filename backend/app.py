@@ -1,16 +1,74 @@
 # app.py
-from flask import Flask, request, jsonify
+import hmac
+import json
+import time
+
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 # Import the function that performs the analysis:
-from temporal_reasoning import analyze_text_events
-from temporal_reasoning import analyze_text_causation
-from temporal_reasoning import analyze_text_entities
 from temporal_reasoning import analyze_parts_of_speech
-from temporal_reasoning import analyze_word_morphology
+from temporal_reasoning import analyze_word_morphology, analyze_morphology_batch
+from pipeline import run_analyses, iter_outcomes, iter_stream_outcomes, section_payload, build_meta, MODES, DEFAULT_MODE
+from llm_client import connection_stats, usage_stats
+from json_repair import repair_stats
+from schemas import validation_stats
+from resilience import resilience_stats, UpstreamUnavailable, DeadlineExceeded
+from tokens import token_stats, tokenizer_name
+from routing import route_stats
+from logging_config import logging_stats
+import metrics
+import artifacts
+import openai
+from analysis_cache import get_cache
+from morphology_cache import morphology_stats, words_of
+from jobs import job_queue
+from batch import iter_batch, parse_jsonl, DEFAULT_CONCURRENCY
+from sentences import expand_events
+from pos_tagger import ENGINES as POS_ENGINES, DEFAULT_ENGINE as POS_DEFAULT_ENGINE
 
 app = Flask(__name__)
 CORS(app)  # Allow CORS so that the React app can fetch from a different port or domain.
 
+
+def _endpoint_label():
+    # The route pattern, not the path, so job ids do not become label values.
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+@app.before_request
+def _start_request_metrics():
+    # Model output made while handling this request is stored under its id,
+    # which is always generated here; the client's X-Request-ID is only a label.
+    client_request_id = request.headers.get("X-Request-ID", "")
+    g.client_request_id = client_request_id if artifacts.valid_request_id(client_request_id) else None
+    g.request_id = artifacts.new_request_id()
+    g.request_id_token = artifacts.bind_request(g.request_id, g.client_request_id)
+    g.metrics_start = time.perf_counter()
+    g.metrics_endpoint = _endpoint_label()
+    metrics.inc(metrics.HTTP_IN_FLIGHT, (g.metrics_endpoint,))
+
+
+@app.after_request
+def _finish_request_metrics(response):
+    start = g.get("metrics_start")
+    if start is None:
+        return response
+    response.headers["X-Request-ID"] = g.request_id
+    if g.client_request_id:
+        response.headers["X-Client-Request-ID"] = g.client_request_id
+    endpoint, method, status = g.metrics_endpoint, request.method, str(response.status_code)
+
+    def finish():
+        # Runs once the body has been sent, so streamed responses are timed
+        # until their last event.
+        metrics.inc(metrics.HTTP_IN_FLIGHT, (endpoint,), -1)
+        metrics.inc(metrics.HTTP_REQUESTS, (endpoint, method, status))
+        metrics.observe(metrics.HTTP_DURATION, (endpoint,), time.perf_counter() - start)
+
+    response.call_on_close(finish)
+    return response
+
+
 @app.route('/', methods=['GET'])
 def home():
     """
@@ -18,6 +76,18 @@ def home():
     """
     return "API is running. POST to /analyze to analyze text."
 
+def _read_mode(values):
+    """
+    Reads the "mode" field shared by the analysis endpoints.
+
+    :param values: request.form, request.args or request.values
+    :return: (mode, None), or (mode, 400 response) for an unknown mode
+    """
+    mode = values.get('mode', DEFAULT_MODE)
+    if mode not in MODES:
+        return mode, (jsonify({"error": f"Unknown mode '{mode}'. Expected one of: {', '.join(MODES)}"}), 400)
+    return mode, None
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
     """
@@ -25,53 +95,209 @@ def analyze():
       - input_text
       - doc_date
       - language
+      - mode (optional): "fanout" (default) runs the three analyses
+        concurrently, "sequential" runs them back-to-back and "combined"
+        asks for every section in a single model call.
+      - cache (optional): "0" bypasses the result cache for this request.
+      - expand_sentences (optional): "1" writes each event's sentence
+        ("sentence", "sentence_start", "sentence_end") next to its
+        sentence_id; by default events only carry the id, resolved through
+        the "sentences" index of offsets.
 
-    Uses analyze_text_events and analyze_text_causation to get the analyses,
-    and returns a unified JSON response.
+    Uses analyze_text_events, analyze_text_causation and analyze_text_entities
+    to get the analyses, and returns a unified JSON response. Per-analysis
+    timings, errors and cache hit/miss status are reported under "meta".
+    A failed analysis does not fail the request: its sections are empty,
+    meta.sections marks it "error" and meta.partial is true.
     """
     input_text = request.form.get('input_text', '')
     doc_date_string = request.form.get('doc_date', '')
     language = request.form.get('language', 'English')
+    mode, error = _read_mode(request.form)
+    use_cache = request.form.get('cache', '1') != '0'
+    expand_sentences = request.form.get('expand_sentences', '0') == '1'
 
-    # Perform the analyses
-    results = analyze_text_events(input_text, doc_date_string, language)
-    causation_analysis = analyze_text_causation(input_text, language)
-    entity_relations = analyze_text_entities(input_text, language)
-    
-    # Merge the two JSON objects into a unified structure
-    unified_json = {
-        "events": results.get("events", []),
-        "named_entities": results.get("named_entities", {}),
-        "temporal_references": results.get("temporal_references", []),
-        "important_notes": results.get("important_notes", []),
-        "timeline_of_events": results.get("timeline_of_events", []),
-        "summary": results.get("summary", ""),
-        # Structured event-to-event relations (causation, temporal ordering, etc.)
-        # The new analyze_text_causation() format returns {
-        #   "events": { "e1": "…", ... },
-        #   "relations": [ { "source": "e1", "target": "e2", "type": "CAUSES" }, ... ]
-        # }
-        # We expose this unaltered under the key `event_relations` for the frontend.
-        "event_relations": causation_analysis,
-
-        # Entity-to-entity relations extracted by analyze_text_entities()
-        "entity_relations": entity_relations.get("entity_relations", [])
-    }
+    if error is not None:
+        return error
+
+    # Perform the analyses and merge them into a unified structure
+    unified_json = run_analyses(input_text, doc_date_string, language, mode, use_cache,
+                                expand_sentences=expand_sentences)
 
     return jsonify(unified_json)
 
+def _sse(event, data):
+    """
+    Formats one Server-Sent Events message.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/analyze/stream', methods=['GET', 'POST'])
+def analyze_stream():
+    """
+    Same fields as /analyze (as form data, or as query parameters so that a
+    browser EventSource can use GET), but answers with a text/event-stream that
+    emits each section as soon as its analysis finishes:
+
+      event: events     -> events, named_entities, temporal_references,
+                           important_notes, timeline_of_events, summary, timexes
+      event: causation  -> event_relations
+      event: entities   -> entity_relations
+      event: done       -> the "meta" entry of /analyze
+
+    Each section message carries {"section", "data", "timing", "cache", "error"}.
+
+    With items=1 (fanout mode only) the model output itself is streamed and
+    every element of "events", "relations" and "entity_relations" is sent as
+    an "item" message {"section", "key", "item"} as soon as the model has
+    finished writing it, before its section message. expand_sentences=1
+    expands the events of both kinds of message as in /analyze.
+    """
+    input_text = request.values.get('input_text', '')
+    doc_date_string = request.values.get('doc_date', '')
+    language = request.values.get('language', 'English')
+    mode, error = _read_mode(request.values)
+    use_cache = request.values.get('cache', '1') != '0'
+    stream_items = request.values.get('items', '0') == '1'
+    expand_text = input_text if request.values.get('expand_sentences', '0') == '1' else None
+
+    if error is not None:
+        return error
+    if stream_items and mode != 'fanout':
+        return jsonify({"error": "items=1 is only supported with mode=fanout"}), 400
+
+    def sections():
+        if not stream_items:
+            yield from iter_outcomes(input_text, doc_date_string, language, mode, use_cache)
+            return
+        for message in iter_stream_outcomes(input_text, doc_date_string, language, use_cache):
+            if message[0] == "item":
+                yield message
+            else:
+                yield message[1], message[2]
+
+    def generate():
+        start = time.perf_counter()
+        outcomes = {}
+        yield _sse("started", {"mode": mode})
+        for message in sections():
+            if message[0] == "item":
+                _, name, key, element = message
+                if expand_text is not None and name == "events" and key == "events":
+                    element = expand_events([element], expand_text)[0]
+                yield _sse("item", {"section": name, "key": key, "item": element})
+                continue
+            name, outcome = message
+            outcomes[name] = outcome
+            result, elapsed, error, cache_status = outcome
+            yield _sse(name, {
+                "section": name,
+                "data": section_payload(name, result, expand_text),
+                "timing": round(elapsed, 3),
+                "cache": cache_status,
+                "error": error,
+            })
+        yield _sse("done", build_meta(mode, outcomes, time.perf_counter() - start))
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Receives a JSONL body with one {id, input_text, doc_date, language}
+    record per line and streams back one JSONL result per document as soon
+    as it finishes (completion order, not input order):
+
+      {"id": ..., "status": "ok", "result": <same JSON as /analyze>}
+      {"id": ..., "status": "error", "error": "..."}
+
+    Query parameters:
+      - concurrency (optional): documents analyzed at once
+      - mode, cache (optional): as for /analyze
+    """
+    mode, error = _read_mode(request.args)
+    use_cache = request.args.get('cache', '1') != '0'
+    try:
+        concurrency = int(request.args.get('concurrency', DEFAULT_CONCURRENCY))
+    except ValueError:
+        return jsonify({"error": "concurrency must be an integer"}), 400
+
+    if error is not None:
+        return error
+
+    lines = request.get_data(as_text=True).splitlines()
+
+    def generate():
+        for item in iter_batch(parse_jsonl(lines), concurrency, mode, use_cache):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.before_request
+def start_job_workers():
+    # Started lazily so that only the process actually serving requests (and
+    # not the debug reloader's watcher process) runs background jobs.
+    job_queue.ensure_started()
+
+@app.route('/analyze/jobs', methods=['POST'])
+def create_analysis_job():
+    """
+    Receives the same form fields as /analyze, queues the analysis and returns
+    immediately with a job id. Poll GET /analyze/jobs/<job_id> for the result.
+    """
+    input_text = request.form.get('input_text', '')
+    doc_date_string = request.form.get('doc_date', '')
+    language = request.form.get('language', 'English')
+    mode, error = _read_mode(request.form)
+    use_cache = request.form.get('cache', '1') != '0'
+    expand_sentences = request.form.get('expand_sentences', '0') == '1'
+
+    if error is not None:
+        return error
+
+    job_id = job_queue.submit(input_text, doc_date_string, language, mode, use_cache, expand_sentences)
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/analyze/jobs/{job_id}",
+    }), 202
+
+@app.route('/analyze/jobs/<job_id>', methods=['GET'])
+def get_analysis_job(job_id):
+    """
+    Returns the job status ("queued", "running", "done" or "failed"), the
+    per-analysis progress and, once done, the unified JSON under "result".
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+    return jsonify(job)
+
 @app.route('/analyze_pos', methods=['POST'])
 def analyze_pos():
     """
     Receives a POST with:
       - input_text
-    
+      - language (optional, "English" or "Spanish"; default "English")
+      - engine (optional, "llm" or "local"; default ANANSI_POS_ENGINE)
+
     Uses analyze_parts_of_speech to get the part of speech for each token.
+    "local" tags with the bundled perceptron tagger without a model call,
+    trading accuracy for speed.
     """
     input_text = request.form.get('input_text', '')
-    
+    language = request.form.get('language', 'English')
+    engine = request.form.get('engine', POS_DEFAULT_ENGINE)
+
+    if engine not in POS_ENGINES:
+        return jsonify({"error": f"Unknown engine '{engine}'. Expected one of: {', '.join(POS_ENGINES)}"}), 400
+
     # Perform the analysis
-    results = analyze_parts_of_speech(input_text)
+    results = analyze_parts_of_speech(input_text, language, engine)
     
     return jsonify(results)
 
@@ -81,17 +307,121 @@ def analyze_morphology():
     Receives a POST with:
       - word
       - language
+      - cache (optional, "0" bypasses the morphology store)
     
     Uses analyze_word_morphology to get detailed morphological analysis for a word.
+    Words analyzed before are answered from the morphology store; "cache"
+    in the response says which tier answered. Answers 503 with
+    {"word", "analysis": "", "error"} when the model provider is unavailable
+    even after retries.
     """
     word = request.form.get('word', '')
     language = request.form.get('language', 'English')
+    use_cache = request.form.get('cache', '1') != '0'
     
     # Perform the analysis
-    results = analyze_word_morphology(word, language)
+    try:
+        results = analyze_word_morphology(word, language, use_cache)
+    except (openai.APIError, UpstreamUnavailable, DeadlineExceeded) as exc:
+        return jsonify({"word": word, "analysis": "", "error": f"{type(exc).__name__}: {exc}"}), 503
     
     return jsonify(results)
 
+@app.route('/analyze_morphology/batch', methods=['POST'])
+def analyze_morphology_batch_endpoint():
+    """
+    Receives a POST with:
+      - word (repeatable) and/or text (a selected phrase, split into words)
+      - language
+      - cache (optional, "0" bypasses the morphology store)
+
+    Analyzes every distinct word: stored ones are answered locally and the
+    rest are packed into as few model calls as fit the token budget, so a
+    sentence's vocabulary costs one call instead of one per word. Returns
+    {"language", "results": [{"word", "analysis", "cache"}, ...], "meta"};
+    words whose call failed carry an "error" and an empty analysis. More
+    than ANANSI_MORPHOLOGY_BATCH_MAX_WORDS distinct words is a 400.
+    """
+    words = request.form.getlist('word') + words_of(request.form.get('text', ''))
+    language = request.form.get('language', 'English')
+    use_cache = request.form.get('cache', '1') != '0'
+
+    if not words:
+        return jsonify({"error": "Expected at least one word (word or text)"}), 400
+
+    try:
+        results, meta = analyze_morphology_batch(words, language, use_cache)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify({"language": language, "results": results, "meta": meta})
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    """
+    Returns runtime counters: connection reuse of the shared OpenAI client,
+    token usage per analysis (as billed, with the provider prompt-cache hit
+    ratio, and counted locally split into static instruction, input and
+    output tokens), JSON repair and schema
+    validation outcomes, upstream retries and circuit breakers, calls,
+    latency and tokens per model route, dropped and sampled log records,
+    stored model output artifacts, and result and morphology cache hit
+    rates.
+    """
+    cache = get_cache()
+    return jsonify({
+        "openai_client": connection_stats(),
+        "token_usage": usage_stats(),
+        "local_tokens": {"tokenizer": tokenizer_name(), "per_analysis": token_stats()},
+        "json_repair": repair_stats(),
+        "schema_validation": validation_stats(),
+        "upstream": resilience_stats(),
+        "routes": route_stats(),
+        "logging": logging_stats(),
+        "artifacts": artifacts.artifact_stats(),
+        "analysis_cache": cache.stats() if cache else None,
+        "morphology_cache": morphology_stats(),
+    })
+
+@app.teardown_request
+def _unbind_request_id(exc):
+    token = g.pop("request_id_token", None)
+    if token is not None:
+        artifacts.unbind_request(token)
+
+
+@app.route('/artifacts/<request_id>', methods=['GET'])
+def get_artifacts(request_id):
+    """
+    Returns the prompts and raw model output stored for a request (the
+    X-Request-ID of its response) or job (its job id), oldest first.
+    Disabled (404) unless ANANSI_ARTIFACTS_ENDPOINT=1; requires
+    "Authorization: Bearer <ANANSI_ARTIFACTS_TOKEN>" when that token is set.
+    """
+    if not artifacts.ENDPOINT_ENABLED:
+        return jsonify({"error": "Not found"}), 404
+    # Compared as bytes: compare_digest() rejects non-ASCII str.
+    if artifacts.ENDPOINT_TOKEN and not hmac.compare_digest(
+            request.headers.get("Authorization", "").encode("utf-8"),
+            f"Bearer {artifacts.ENDPOINT_TOKEN}".encode("utf-8")):
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        stored = artifacts.load(request_id)
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    if stored is None:
+        return jsonify({"error": f"No artifacts for request {request_id}"}), 404
+    return jsonify({"request_id": request_id, "artifacts": stored})
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Request, upstream call, token and JSON parse metrics in the Prometheus
+    text format, summed over all worker processes when ANANSI_METRICS_DIR is
+    set (see metrics.py).
+    """
+    return Response(metrics.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
 if __name__ == '__main__':
     # Host on 0.0.0.0 (accessible externally), port 5001
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,309 @@
+# artifacts.py
+"""
+Per-request store of raw model output, for debugging an analysis after the
+fact (it replaces the answer.txt every events request used to overwrite).
+
+Every model call made while handling a request is saved under that request's
+id: the analysis, the model, the prompt messages and the raw answer text.
+The app generates each request's id and returns it in the X-Request-ID
+response header; background jobs use their job id. A client's own
+X-Request-ID is only kept as a correlation label ("client_request_id" in
+the artifacts), never used to name storage, so one caller cannot write into
+or collide with another request's artifacts. Calls made outside a request
+(CLI scripts) are not saved.
+
+save() only puts the artifact on a bounded queue; a writer thread compresses
+it (zstd when the zstandard package is installed, gzip otherwise) and writes
+<artifact dir>/<request id>/<time>-<analysis>.json.<zst|gz>. The same thread
+prunes the store: whole requests are deleted once older than
+ANANSI_ARTIFACTS_MAX_AGE_DAYS, then the oldest ones until the store fits in
+ANANSI_ARTIFACTS_MAX_BYTES. When the queue is full artifacts are dropped
+(and counted) rather than blocking the request.
+
+load(request_id) returns a request's artifacts. GET /artifacts/<request_id>
+serves them only when ANANSI_ARTIFACTS_ENDPOINT=1, and then, if
+ANANSI_ARTIFACTS_TOKEN is set, only with "Authorization: Bearer <token>":
+the artifacts hold every prompt and raw answer.
+
+Tunables (environment variables):
+  ANANSI_ARTIFACTS_ENABLED         "0" disables the store          (default "1")
+  ANANSI_ARTIFACTS_DIR             directory (default artifacts/ next to this module)
+  ANANSI_ARTIFACTS_MAX_BYTES       total size kept                 (default 512 MiB)
+  ANANSI_ARTIFACTS_MAX_AGE_DAYS    age after which a request is deleted (default 7)
+  ANANSI_ARTIFACTS_COMPRESSION     "zstd" or "gzip"                (default zstd if installed)
+  ANANSI_ARTIFACTS_QUEUE_SIZE      artifacts buffered before dropping (default 1000)
+  ANANSI_ARTIFACTS_PRUNE_INTERVAL  seconds between prunes          (default 60)
+  ANANSI_ARTIFACTS_ENDPOINT        "1" enables GET /artifacts/<id>  (default "0")
+  ANANSI_ARTIFACTS_TOKEN           bearer token that endpoint requires (default none)
+"""
+import contextvars
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from logging_config import get_logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = get_logger("artifacts")
+
+ARTIFACTS_ENABLED = os.environ.get("ANANSI_ARTIFACTS_ENABLED", "1") != "0"
+ARTIFACTS_DIR = os.environ.get(
+    "ANANSI_ARTIFACTS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"),
+)
+MAX_BYTES = int(os.environ.get("ANANSI_ARTIFACTS_MAX_BYTES", str(512 * 1024 * 1024)))
+MAX_AGE = float(os.environ.get("ANANSI_ARTIFACTS_MAX_AGE_DAYS", "7")) * 86400
+COMPRESSION = os.environ.get("ANANSI_ARTIFACTS_COMPRESSION", "zstd" if zstandard else "gzip")
+QUEUE_SIZE = int(os.environ.get("ANANSI_ARTIFACTS_QUEUE_SIZE", "1000"))
+PRUNE_INTERVAL = float(os.environ.get("ANANSI_ARTIFACTS_PRUNE_INTERVAL", "60"))
+ENDPOINT_ENABLED = os.environ.get("ANANSI_ARTIFACTS_ENDPOINT", "0") == "1"
+ENDPOINT_TOKEN = os.environ.get("ANANSI_ARTIFACTS_TOKEN", "")
+
+if COMPRESSION == "zstd" and zstandard is None:
+    raise RuntimeError("ANANSI_ARTIFACTS_COMPRESSION=zstd needs the 'zstandard' package")
+if COMPRESSION not in ("zstd", "gzip"):
+    raise ValueError(f"ANANSI_ARTIFACTS_COMPRESSION must be 'zstd' or 'gzip', not {COMPRESSION!r}")
+
+_VALID_ID = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+_EXTENSIONS = {".zst": "zstd", ".gz": "gzip"}
+
+_stats_lock = threading.Lock()
+_stats = {"saved": 0, "written": 0, "dropped": 0, "failed": 0, "pruned_requests": 0}
+
+
+def _bump(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def artifact_stats():
+    """
+    Returns counters of saved, written, dropped and pruned artifacts.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["compression"] = COMPRESSION
+    return stats
+
+
+# -------------------- Request ids --------------------
+
+_request_id = contextvars.ContextVar("anansi_request_id", default=None)
+_client_request_id = contextvars.ContextVar("anansi_client_request_id", default=None)
+
+
+def valid_request_id(request_id):
+    return bool(request_id) and bool(_VALID_ID.match(request_id)) and request_id not in (".", "..")
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def bind_request(request_id, client_request_id=None):
+    """
+    Makes *request_id* the current request id; returns a token for
+    unbind_request().
+
+    :param request_id: Server-generated id that names the stored artifacts
+    :param client_request_id: The caller's own id, kept only as a label
+    """
+    return _request_id.set(request_id), _client_request_id.set(client_request_id)
+
+
+def unbind_request(token):
+    request_token, client_token = token
+    _client_request_id.reset(client_token)
+    _request_id.reset(request_token)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def submit_in_context(executor, func, *args):
+    """
+    executor.submit() that runs *func* with the caller's context, so the
+    current request id follows the work onto the pool's threads.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+# -------------------- Writing --------------------
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_writer_pid = None
+_writer_lock = threading.Lock()
+_sequence = 0
+
+
+def save(analysis, model, messages, output):
+    """
+    Queues one model call's prompt and raw output under the current request
+    id. Does nothing outside a request or when the store is disabled.
+    """
+    request_id = _request_id.get()
+    if not ARTIFACTS_ENABLED or request_id is None:
+        return
+    _ensure_writer()
+    artifact = {
+        "request_id": request_id,
+        "client_request_id": _client_request_id.get(),
+        "analysis": analysis,
+        "model": model,
+        "created_at": time.time(),
+        "messages": messages,
+        "output": output,
+    }
+    try:
+        _queue.put_nowait(artifact)
+    except queue.Full:
+        _bump("dropped")
+        return
+    _bump("saved")
+
+
+def _compress(data):
+    if COMPRESSION == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=6), ".gz"
+
+
+def _decompress(data, extension):
+    if _EXTENSIONS[extension] == "zstd":
+        if zstandard is None:
+            raise RuntimeError("artifact is zstd-compressed but 'zstandard' is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _write(artifact):
+    global _sequence
+    _sequence += 1
+    directory = os.path.join(ARTIFACTS_DIR, artifact["request_id"])
+    os.makedirs(directory, exist_ok=True)
+    data, extension = _compress(json.dumps(artifact, ensure_ascii=False, default=str).encode("utf-8"))
+    name = f"{time.time_ns()}-{os.getpid()}-{_sequence}-{artifact['analysis']}.json{extension}"
+    path = os.path.join(directory, name)
+    with open(f"{path}.tmp", "wb") as handle:
+        handle.write(data)
+    os.replace(f"{path}.tmp", path)
+
+
+def _request_dirs():
+    """
+    Returns [(newest mtime, total bytes, path)] for every stored request.
+    """
+    requests = []
+    try:
+        entries = list(os.scandir(ARTIFACTS_DIR))
+    except FileNotFoundError:
+        return requests
+    for entry in entries:
+        if not entry.is_dir():
+            continue
+        newest, size = 0.0, 0
+        try:
+            for item in os.scandir(entry.path):
+                stat = item.stat()
+                newest, size = max(newest, stat.st_mtime), size + stat.st_size
+        except FileNotFoundError:
+            continue
+        requests.append((newest or entry.stat().st_mtime, size, entry.path))
+    return requests
+
+
+def prune(now=None):
+    """
+    Deletes requests older than the age limit, then the oldest requests
+    until the store fits the size limit.
+    """
+    now = time.time() if now is None else now
+    requests = sorted(_request_dirs())
+    total = sum(size for _, size, _ in requests)
+    for newest, size, path in requests:
+        if newest >= now - MAX_AGE and total <= MAX_BYTES:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        _bump("pruned_requests")
+
+
+def _write_forever():
+    last_prune = 0.0
+    while True:
+        try:
+            artifact = _queue.get(timeout=PRUNE_INTERVAL)
+        except queue.Empty:
+            artifact = None
+        if artifact is not None:
+            try:
+                _write(artifact)
+                _bump("written")
+            except Exception as exc:
+                _bump("failed")
+                logger.warning("could not write artifact for request %s: %s", artifact["request_id"], exc)
+            finally:
+                _queue.task_done()
+        if time.monotonic() - last_prune >= PRUNE_INTERVAL:
+            try:
+                prune()
+            except OSError as exc:
+                logger.warning("could not prune artifacts: %s", exc)
+            last_prune = time.monotonic()
+
+
+def _ensure_writer():
+    global _writer_pid
+    if _writer_pid == os.getpid():
+        return
+    with _writer_lock:
+        # Keyed on the pid: a writer started before a fork does not run in the child.
+        if _writer_pid != os.getpid():
+            threading.Thread(target=_write_forever, name="artifact-writer", daemon=True).start()
+            _writer_pid = os.getpid()
+
+
+def flush(timeout=5.0):
+    """
+    Waits until the queued artifacts have been written (for tests and scripts).
+    """
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+# -------------------- Lookup --------------------
+
+def load(request_id):
+    """
+    Returns the artifacts stored for *request_id*, oldest first, or None if
+    there are none.
+
+    :raises ValueError: if *request_id* is not a valid request id
+    """
+    if not valid_request_id(request_id):
+        raise ValueError(f"Invalid request id: {request_id!r}")
+    directory = os.path.join(ARTIFACTS_DIR, request_id)
+    try:
+        names = sorted(name for name in os.listdir(directory) if not name.endswith(".tmp"))
+    except FileNotFoundError:
+        return None
+    artifacts = []
+    for name in names:
+        extension = os.path.splitext(name)[1]
+        if extension not in _EXTENSIONS:
+            continue
+        with open(os.path.join(directory, name), "rb") as handle:
+            artifacts.append(json.loads(_decompress(handle.read(), extension)))
+    return artifacts or None
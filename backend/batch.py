@@ -0,0 +1,94 @@
+# batch.py
+"""
+Batch analysis of many documents per request.
+
+iter_batch() takes an iterable of {id, input_text, doc_date, language}
+records, keeps at most *concurrency* documents in flight against the upstream
+model and yields one result record per document as soon as it finishes.
+A bad record or a failed analysis produces an error record for that item only.
+
+Tunables (environment variables):
+  ANANSI_BATCH_CONCURRENCY      default documents in flight per batch (default 4)
+  ANANSI_BATCH_MAX_CONCURRENCY  upper bound a request may ask for      (default 16)
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from artifacts import submit_in_context
+from pipeline import run_analyses, DEFAULT_MODE
+
+DEFAULT_CONCURRENCY = int(os.environ.get("ANANSI_BATCH_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.environ.get("ANANSI_BATCH_MAX_CONCURRENCY", "16"))
+
+
+def parse_jsonl(lines):
+    """
+    Yields (line number, record dict or None, error string or None) for each
+    non-blank JSONL line.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get("input_text"), str):
+            yield number, None, "Each record must be an object with an 'input_text' string"
+            continue
+        yield number, record, None
+
+
+def _analyze_record(record, mode, use_cache, names):
+    return run_analyses(
+        record["input_text"],
+        record.get("doc_date", "") or "",
+        record.get("language", "English") or "English",
+        mode,
+        use_cache,
+        names=names,
+    )
+
+
+def iter_batch(parsed_records, concurrency=DEFAULT_CONCURRENCY, mode=DEFAULT_MODE, use_cache=True,
+               names=None):
+    """
+    Analyzes records from parse_jsonl() and yields result records in
+    completion order:
+
+      {"id": ..., "status": "ok", "result": <unified_json>}
+      {"id": ..., "status": "error", "error": "..."}
+
+    Records without an "id" are identified by their line number. *names*
+    optionally restricts which analyses run (see pipeline.run_analyses).
+    """
+    concurrency = max(1, min(concurrency, MAX_CONCURRENCY))
+    records = iter(parsed_records)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch") as executor:
+        in_flight = {}
+        exhausted = False
+        while True:
+            # Submit lazily so a batch of thousands never queues thousands of futures.
+            while not exhausted and len(in_flight) < concurrency:
+                try:
+                    number, record, error = next(records)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if error:
+                    yield {"id": number, "status": "error", "error": error}
+                    continue
+                future = submit_in_context(executor, _analyze_record, record, mode, use_cache, names)
+                in_flight[future] = record.get("id", number)
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                doc_id = in_flight.pop(future)
+                try:
+                    yield {"id": doc_id, "status": "ok", "result": future.result()}
+                except Exception as exc:
+                    yield {"id": doc_id, "status": "error", "error": f"{type(exc).__name__}: {exc}"}
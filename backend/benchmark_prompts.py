@@ -0,0 +1,123 @@
+# benchmark_prompts.py
+"""
+Compares prompt versions (temporal_reasoning.PROMPT_VERSIONS) on the same
+documents: static instruction tokens, billed prompt/completion tokens,
+latency, estimated cost and how often the answer parsed.
+
+Every call goes to whatever OPENAI_BASE_URL points at, so this costs real
+tokens against the real API; against mock_llm_server.py it measures only the
+static prompt size and the local overhead:
+
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock python benchmark_prompts.py
+    python benchmark_prompts.py --versions v1,v2 --analyses events --text-file article.txt --repeat 3
+"""
+import argparse
+import json
+import statistics
+import time
+
+import temporal_reasoning as tr
+from json_repair import repair_stats
+from llm_client import usage_stats
+from loadtest import SAMPLE_TEXTS
+from routing import choose_route
+from tokens import count_tokens, estimate_cost, tokenizer_name
+
+ANALYZERS = {
+    "events": lambda text, version: tr.analyze_text_events(text, "2023-01-20", "English", version),
+    "causation": lambda text, version: tr.analyze_text_causation(text, "English", version),
+    "entities": lambda text, version: tr.analyze_text_entities(text, "English", version),
+    "combined": lambda text, version: tr.analyze_text_combined(text, "2023-01-20", "English", version),
+}
+
+
+def _usage(analysis):
+    return usage_stats().get(analysis, {"prompt_tokens": 0, "completion_tokens": 0})
+
+
+def _clean_parses(analysis):
+    return repair_stats().get(analysis, {}).get("parsed", 0)
+
+
+def run(analysis, version, texts, repeat):
+    """
+    Calls *analysis* with prompt *version* on every text *repeat* times, one
+    call at a time so the usage deltas belong to this run.
+    """
+    analyze = ANALYZERS[analysis]
+    before_usage, before_clean = _usage(analysis), _clean_parses(analysis)
+    latencies, ok, calls, cost = [], 0, 0, 0.0
+    for _ in range(repeat):
+        for text in texts:
+            # Price each call at the model it is routed to.
+            model = choose_route(analysis, text, "English").model
+            call_before = _usage(analysis)
+            start = time.perf_counter()
+            try:
+                result = analyze(text, version)
+                ok += not (result.get("error") or result.get("warning"))
+            except Exception as exc:
+                print(f"{analysis}/{version}: {type(exc).__name__}: {exc}")
+            latencies.append(time.perf_counter() - start)
+            calls += 1
+            call_after = _usage(analysis)
+            call_cost = estimate_cost(model, call_after["prompt_tokens"] - call_before["prompt_tokens"],
+                                      call_after["completion_tokens"] - call_before["completion_tokens"])
+            cost = None if cost is None or call_cost is None else cost + call_cost
+    after_usage = _usage(analysis)
+    prompt_tokens = after_usage["prompt_tokens"] - before_usage["prompt_tokens"]
+    completion_tokens = after_usage["completion_tokens"] - before_usage["completion_tokens"]
+    return {
+        "analysis": analysis,
+        "version": version,
+        "calls": calls,
+        "static_tokens": count_tokens(tr.instructions(analysis, version)),
+        "prompt_tokens_per_call": round(prompt_tokens / calls, 1),
+        "completion_tokens_per_call": round(completion_tokens / calls, 1),
+        "cost_per_call_usd": round(cost / calls, 6) if cost is not None else None,
+        "latency_p50": round(statistics.median(latencies), 3),
+        "latency_mean": round(statistics.mean(latencies), 3),
+        "parse_success": round(ok / calls, 3),
+        "clean_parse": round((_clean_parses(analysis) - before_clean) / calls, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare analyzer prompt versions.")
+    parser.add_argument("--versions", default=",".join(tr.PROMPT_VERSIONS))
+    parser.add_argument("--analyses", default="events,causation,entities",
+                        help=f"Comma-separated subset of: {', '.join(ANALYZERS)}")
+    parser.add_argument("--text-file", action="append", default=None,
+                        help="Document to analyze (repeatable; default: built-in samples)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    texts = SAMPLE_TEXTS
+    if args.text_file:
+        texts = []
+        for path in args.text_file:
+            with open(path, encoding="utf-8") as handle:
+                texts.append(handle.read())
+
+    results = []
+    if not args.json:
+        print(f"tokenizer: {tokenizer_name()}")
+    for analysis in args.analyses.split(","):
+        for version in args.versions.split(","):
+            result = run(analysis, version, texts, args.repeat)
+            results.append(result)
+            if not args.json:
+                cost = result["cost_per_call_usd"]
+                print(f"{analysis:<10} {version:<3} static={result['static_tokens']:>5}  "
+                      f"prompt/call={result['prompt_tokens_per_call']:>8.1f}  "
+                      f"completion/call={result['completion_tokens_per_call']:>8.1f}  "
+                      f"cost/call={'n/a' if cost is None else f'${cost:.5f}'}  "
+                      f"p50={result['latency_p50']:.2f}s  parse_ok={result['parse_success']:.0%}  "
+                      f"clean={result['clean_parse']:.0%}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmark_validation.py
+"""
+Measures what schema validation (schemas.py) adds to each model response.
+
+For every analysis shape and a range of document sizes, a realistic answer
+is generated with the mock server's templates and timed through:
+
+  parse      json.loads of the raw answer
+  validate   schemas.validate() of the parsed value
+  dump       .model_dump() back to the plain dict the pipeline returns
+
+and the overhead is reported relative to json.loads and per response.
+
+    python benchmark_validation.py
+    python benchmark_validation.py --sentences 5,50,500 --repeat 200 --json
+"""
+import argparse
+import json
+import time
+
+import mock_llm_server as mock
+import schemas
+
+SENTENCES = [
+    "On January 15, 2023, President Biden announced a new economic policy.",
+    "The policy aims to reduce inflation and create jobs.",
+    "As a result of this announcement, the stock market rose by 2%.",
+    "Ayer me encontré con Migue en el trabajo en Lima.",
+    "The storm reached the coast on Monday and the Council declared an emergency.",
+]
+
+
+def sample_answers(sentences):
+    text = " ".join(SENTENCES[i % len(SENTENCES)] for i in range(sentences))
+    combined = mock.answer_events(text)
+    combined["event_relations"] = mock.answer_causation(text)
+    combined["entity_relations"] = mock.answer_entities(text)["entity_relations"]
+    return {
+        "events": json.dumps(mock.answer_events(text)),
+        "causation": json.dumps(mock.answer_causation(text)),
+        "entities": json.dumps(mock.answer_entities(text)),
+        "combined": json.dumps(combined),
+        "pos": json.dumps({"tokens": mock.answer_pos(text)}),
+    }
+
+
+def _mean_seconds(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(analysis, raw, repeat):
+    parsed = json.loads(raw)
+    validated = schemas.validate(analysis, parsed)
+    parse = _mean_seconds(lambda: json.loads(raw), repeat)
+    validate = _mean_seconds(lambda: schemas.validate(analysis, parsed), repeat)
+    dump = _mean_seconds(validated.model_dump, repeat)
+    return {
+        "analysis": analysis,
+        "bytes": len(raw),
+        "parse_us": round(parse * 1e6, 1),
+        "validate_us": round(validate * 1e6, 1),
+        "dump_us": round(dump * 1e6, 1),
+        "overhead_vs_parse": round((validate + dump) / parse, 2) if parse else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark schema validation of model answers.")
+    parser.add_argument("--sentences", default="5,50,500", help="Comma-separated document sizes in sentences")
+    parser.add_argument("--repeat", type=int, default=300, help="Iterations per measurement")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in (int(s) for s in args.sentences.split(",")):
+        for analysis, raw in sample_answers(size).items():
+            result = benchmark(analysis, raw, args.repeat)
+            result["sentences"] = size
+            results.append(result)
+            if not args.json:
+                print(f"{analysis:<10} {size:>5} sentences {result['bytes']:>8} B  "
+                      f"parse={result['parse_us']:>9.1f}us  validate={result['validate_us']:>9.1f}us  "
+                      f"dump={result['dump_us']:>9.1f}us  x{result['overhead_vs_parse']} of parse")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
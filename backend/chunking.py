@@ -0,0 +1,283 @@
+# chunking.py
+"""
+Long-document pipeline: split the text at sentence boundaries into chunks
+sized by a token budget, analyze the chunks in parallel and merge the results
+deterministically (in chunk order, whatever order the calls finish in).
+
+The *_chunked functions have the same signatures and return shapes as their
+temporal_reasoning counterparts; a text that fits in one chunk is passed
+straight through, so short documents behave exactly as before.
+
+Tunables (environment variables):
+  ANANSI_CHUNK_TOKENS    input-token budget per chunk          (default 3000)
+  ANANSI_CHUNK_WORKERS   concurrent chunk calls per process    (default 8)
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import temporal_reasoning as tr
+from artifacts import submit_in_context
+from sentences import renumber_events, sentence_spans
+
+CHUNK_TOKENS = int(os.environ.get("ANANSI_CHUNK_TOKENS", "3000"))
+CHUNK_WORKERS = int(os.environ.get("ANANSI_CHUNK_WORKERS", "8"))
+_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="chunk")
+
+ENTITY_CATEGORIES = ("persons", "organizations", "locations", "institutions", "dates", "legal_terms")
+
+
+# -------------------- Splitting --------------------
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate (~4 characters per token for English/Spanish prose).
+    """
+    return (len(text) + 3) // 4
+
+
+def split_sentences(text):
+    return [text[start:end] for start, end in sentence_spans(text)]
+
+
+def _split_oversized(sentence, max_tokens):
+    # A single "sentence" over budget (e.g. a table or a run-on list) is cut
+    # at word boundaries instead.
+    pieces, current, current_chars = [], [], 0
+    for word in sentence.split():
+        if current and estimate_tokens("x" * (current_chars + len(word))) > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_chars = [], 0
+        current.append(word)
+        current_chars += len(word) + 1
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_sentences(text, max_tokens=CHUNK_TOKENS):
+    """
+    Greedily packs consecutive sentences into chunks of at most *max_tokens*.
+
+    Sentences are joined by blank lines, so segmenting a chunk again finds
+    exactly its pieces (an oversized sentence is several pieces).
+
+    :return: list of (chunk text, document sentence id of each piece)
+    """
+    chunks, current, current_ids, current_tokens = [], [], [], 0
+    for number, sentence in enumerate(split_sentences(text), start=1):
+        for piece in ([sentence] if estimate_tokens(sentence) <= max_tokens
+                      else _split_oversized(sentence, max_tokens)):
+            piece_tokens = estimate_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(("\n\n".join(current), current_ids))
+                current, current_ids, current_tokens = [], [], 0
+            current.append(piece)
+            current_ids.append(f"s{number}")
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(("\n\n".join(current), current_ids))
+    return chunks
+
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS):
+    return [chunk for chunk, _ in chunk_sentences(text, max_tokens)]
+
+
+def _map_chunks(func, chunks, *args):
+    """
+    Runs func(chunk, *args) for every chunk in parallel.
+
+    :return: list of (result or None, error string or None), in chunk order.
+    """
+    futures = [submit_in_context(_executor, func, chunk, *args) for chunk in chunks]
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append((future.result(), None))
+        except Exception as exc:
+            outcomes.append((None, f"{type(exc).__name__}: {exc}"))
+    return outcomes
+
+
+def _collect_errors(outcomes):
+    """
+    Returns the successful results and a list of per-chunk error strings, both
+    for raised exceptions and for chunks whose JSON could not be parsed.
+    """
+    results, errors = [], []
+    for index, (result, error) in enumerate(outcomes, start=1):
+        if error:
+            errors.append(f"chunk {index}: {error}")
+            continue
+        if isinstance(result, dict) and result.get("error"):
+            errors.append(f"chunk {index}: {result['error'][:200]}")
+        results.append(result)
+    if not results:
+        raise RuntimeError("All chunks failed: " + "; ".join(errors))
+    return results, errors
+
+
+def _renumber_sentences(outcomes, chunks):
+    # Each chunk's prompt numbered its own sentences from s1.
+    for (result, _), (_, sentence_ids) in zip(outcomes, chunks):
+        if isinstance(result, dict):
+            renumber_events(result.get("events") or [], sentence_ids)
+    return outcomes
+
+
+def _with_errors(merged, results, errors, total):
+    if errors:
+        # The "error" key also keeps partial merges out of the result cache.
+        merged["error"] = f"{len(errors)} of {total} chunks failed: " + "; ".join(errors)
+    salvaged = sum(1 for result in results if isinstance(result, dict) and result.get("warning"))
+    if salvaged:
+        merged["warning"] = f"{salvaged} of {total} chunks were salvaged from incomplete model output"
+    return merged
+
+
+# -------------------- Merging --------------------
+
+def _norm(value):
+    return " ".join(str(value or "").split()).casefold()
+
+
+def normalize_date(value):
+    """
+    Normalizes a timeline date to YYYY-MM-DD / YYYY-MM / YYYY where it can be
+    parsed, otherwise to a whitespace- and case-normalized string.
+    """
+    text = " ".join(str(value or "").split())
+    iso = re.match(r"^(\d{4})(?:-(\d{2}))?(?:-(\d{2}))?", text)
+    if iso:
+        return "-".join(part for part in iso.groups() if part)
+    for fmt in ("%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y", "%m/%d/%Y", "%B %Y"):
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return parsed.strftime("%Y-%m" if fmt == "%B %Y" else "%Y-%m-%d")
+    return text.casefold()
+
+
+def _dedupe(items, key):
+    seen, unique = set(), []
+    for item in items:
+        k = key(item)
+        if k in seen:
+            continue
+        seen.add(k)
+        unique.append(item)
+    return unique
+
+
+def merge_event_results(results):
+    """
+    Merges analyze_text_events results: events are concatenated, entities and
+    temporal references deduplicated, timeline entries merged by normalized date.
+    """
+    merged = {
+        "events": [],
+        "named_entities": {category: [] for category in ENTITY_CATEGORIES},
+        "temporal_references": [],
+        "important_notes": [],
+        "timeline_of_events": [],
+        "summary": "",
+    }
+    summaries = []
+    timeline = {}
+    for result in results:
+        merged["events"].extend(result.get("events", []))
+        for category, entities in (result.get("named_entities") or {}).items():
+            merged["named_entities"].setdefault(category, []).extend(entities or [])
+        merged["temporal_references"].extend(result.get("temporal_references", []))
+        merged["important_notes"].extend(result.get("important_notes", []))
+        for entry in result.get("timeline_of_events", []):
+            key = normalize_date(entry.get("date"))
+            if key not in timeline:
+                timeline[key] = {"date": entry.get("date", ""), "events": []}
+                merged["timeline_of_events"].append(timeline[key])
+            timeline[key]["events"].extend(entry.get("events", []))
+        if result.get("summary"):
+            summaries.append(result["summary"].strip())
+
+    for category, entities in merged["named_entities"].items():
+        merged["named_entities"][category] = _dedupe(
+            entities, lambda e: _norm(e.get("entity")) if isinstance(e, dict) else _norm(e))
+    merged["temporal_references"] = _dedupe(
+        merged["temporal_references"], lambda r: _norm(r.get("reference")) if isinstance(r, dict) else _norm(r))
+    merged["important_notes"] = _dedupe(merged["important_notes"], _norm)
+    for entry in merged["timeline_of_events"]:
+        entry["events"] = _dedupe(entry["events"], lambda e: _norm(e.get("event_summary")) if isinstance(e, dict) else _norm(e))
+    merged["summary"] = " ".join(summaries)
+    return merged
+
+
+def merge_causation_results(results):
+    """
+    Merges analyze_text_causation results, renumbering each chunk's e1..eK
+    into one global e1..eN sequence and remapping the relations accordingly.
+    """
+    events, relations = {}, []
+    for result in results:
+        id_map = {}
+        for local_id, description in (result.get("events") or {}).items():
+            global_id = f"e{len(events) + 1}"
+            id_map[local_id] = global_id
+            events[global_id] = description
+        for relation in result.get("relations", []):
+            source, target = id_map.get(relation.get("source")), id_map.get(relation.get("target"))
+            if source and target:
+                relations.append(dict(relation, source=source, target=target))
+    return {"events": events, "relations": relations}
+
+
+def merge_entity_results(results):
+    """
+    Merges analyze_text_entities results, dropping duplicate relations.
+    """
+    relations = []
+    for result in results:
+        relations.extend(result.get("entity_relations", []))
+    return {"entity_relations": _dedupe(relations, lambda r: (
+        _norm(r.get("source_entity")), _norm(r.get("target_entity")), _norm(r.get("relation"))))}
+
+
+# -------------------- Chunked analyzers --------------------
+
+def analyze_text_events_chunked(input_text, doc_date_, language):
+    chunks = chunk_sentences(input_text)
+    if len(chunks) <= 1:
+        return tr.analyze_text_events(input_text, doc_date_, language)
+    outcomes = _map_chunks(tr.analyze_text_events, [chunk for chunk, _ in chunks], doc_date_, language)
+    results, errors = _collect_errors(_renumber_sentences(outcomes, chunks))
+    return _with_errors(merge_event_results(results), results, errors, len(chunks))
+
+
+def analyze_text_causation_chunked(input_text, language):
+    chunks = chunk_text(input_text)
+    if len(chunks) <= 1:
+        return tr.analyze_text_causation(input_text, language)
+    results, errors = _collect_errors(_map_chunks(tr.analyze_text_causation, chunks, language))
+    return _with_errors(merge_causation_results(results), results, errors, len(chunks))
+
+
+def analyze_text_entities_chunked(input_text, language):
+    chunks = chunk_text(input_text)
+    if len(chunks) <= 1:
+        return tr.analyze_text_entities(input_text, language)
+    results, errors = _collect_errors(_map_chunks(tr.analyze_text_entities, chunks, language))
+    return _with_errors(merge_entity_results(results), results, errors, len(chunks))
+
+
+def analyze_text_combined_chunked(input_text, doc_date_, language):
+    chunks = chunk_sentences(input_text)
+    if len(chunks) <= 1:
+        return tr.analyze_text_combined(input_text, doc_date_, language)
+    outcomes = _map_chunks(tr.analyze_text_combined, [chunk for chunk, _ in chunks], doc_date_, language)
+    results, errors = _collect_errors(_renumber_sentences(outcomes, chunks))
+    merged = merge_event_results(results)
+    merged["event_relations"] = merge_causation_results([r.get("event_relations") or {} for r in results])
+    merged["entity_relations"] = merge_entity_results(results)["entity_relations"]
+    return _with_errors(merged, results, errors, len(chunks))
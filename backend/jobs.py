@@ -0,0 +1,311 @@
+# jobs.py
+"""
+Asynchronous /analyze jobs.
+
+POST /analyze/jobs stores the request in a SQLite job table and returns a job
+id immediately; a pool of background worker threads claims queued jobs, runs
+pipeline.run_analyses and records per-analysis progress and the final
+unified JSON in the same table.
+
+Because the table is persistent, a restart does not lose queued work: queued
+jobs are simply picked up again, and jobs that were "running" in a worker
+process that no longer exists are put back in the queue. Worker names carry
+a per-process boot id besides the pid, so a restarted container whose new
+worker got the old pid (often 1) still recognizes its predecessor's jobs.
+
+Tunables (environment variables):
+  ANANSI_JOB_DB             SQLite file (default data/jobs.sqlite3 next to this module)
+  ANANSI_JOB_WORKERS        background worker threads per process  (default 2)
+  ANANSI_JOB_POLL_SECONDS   how often idle workers re-check the table (default 2)
+  ANANSI_JOB_STALE_SECONDS  a running job not updated for this long is
+                            requeued, covering workers on other hosts (default 3600)
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from artifacts import bind_request, unbind_request
+from logging_config import get_logger
+from pipeline import run_analyses, ANALYSES
+
+logger = get_logger("jobs")
+
+DEFAULT_DB_PATH = os.environ.get(
+    "ANANSI_JOB_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "jobs.sqlite3"),
+)
+WORKERS = int(os.environ.get("ANANSI_JOB_WORKERS", "2"))
+POLL_SECONDS = float(os.environ.get("ANANSI_JOB_POLL_SECONDS", "2"))
+STALE_SECONDS = float(os.environ.get("ANANSI_JOB_STALE_SECONDS", "3600"))
+
+HOSTNAME = socket.gethostname()
+# Distinguishes this process from an earlier one that had the same pid.
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def _worker_name():
+    return f"{HOSTNAME}:{os.getpid()}:{BOOT_ID}"
+
+
+def _orphaned(worker):
+    """
+    Whether the worker named *worker* ("host:pid:boot id") is known to be
+    gone: it ran on this host and its process has exited, or its pid is now
+    this process but from another boot.
+    """
+    host, _, rest = (worker or "").partition(":")
+    pid, _, boot_id = rest.partition(":")
+    if host != HOSTNAME or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return boot_id != BOOT_ID
+    return not _pid_alive(int(pid))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """
+    SQLite-backed job table. One connection guarded by a lock.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " progress TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " worker TEXT,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._conn.commit()
+
+    def create(self, params):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        progress = {name: "pending" for name in _progress_names(params.get("mode"))}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, progress, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, json.dumps(params), json.dumps(progress), now, now),
+            )
+            self._conn.commit()
+        return job_id
+
+    def claim(self):
+        """
+        Atomically moves the oldest queued job to "running" for this worker.
+
+        :return: (job id, params dict) or None if the queue is empty.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, params FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                    (_worker_name(), now, now, row["id"]),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                # Otherwise the shared connection stays inside the transaction
+                # and every later BEGIN fails.
+                self._conn.execute("ROLLBACK")
+                raise
+        return row["id"], json.loads(row["params"])
+
+    def set_progress(self, job_id, name, state):
+        with self._lock:
+            row = self._conn.execute("SELECT progress FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            progress = json.loads(row["progress"])
+            progress[name] = state
+            self._conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(progress), time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def finish(self, job_id, result=None, error=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+                ("failed" if error else "done",
+                 json.dumps(result) if result is not None else None,
+                 error, now, now, job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "progress": json.loads(row["progress"]),
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+            "error": row["error"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+        }
+
+    def requeue_orphans(self):
+        """
+        Puts "running" jobs whose worker is gone back into the queue: workers on
+        this host whose process has exited or whose pid this process now has
+        (see _orphaned()), and any job not updated for STALE_SECONDS (e.g. a
+        worker on another host that died).
+
+        :return: Number of requeued jobs.
+        """
+        requeued = 0
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, worker, updated_at FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            for row in rows:
+                stale = now - row["updated_at"] > STALE_SECONDS
+                if _orphaned(row["worker"]) or stale:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'queued', worker = NULL, updated_at = ? WHERE id = ?",
+                        (now, row["id"]),
+                    )
+                    requeued += 1
+            self._conn.commit()
+        return requeued
+
+
+def _progress_names(mode):
+    return ["combined"] if mode == "combined" else list(ANALYSES)
+
+
+class JobQueue:
+    """
+    Background worker threads draining a JobStore.
+    """
+
+    def __init__(self, store=None, workers=WORKERS):
+        self._store = store
+        self.workers = workers
+        self._wakeup = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    def ensure_started(self):
+        """
+        Starts the worker threads once per process. Called lazily so that the
+        Flask reloader's watcher process never runs jobs itself.
+        """
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            requeued = self.store.requeue_orphans()
+            if requeued:
+                logger.info("Requeued %d orphaned analysis job(s)", requeued)
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+            self._started = True
+
+    def submit(self, input_text, doc_date, language, mode, use_cache=True, expand_sentences=False):
+        job_id = self.store.create({
+            "input_text": input_text,
+            "doc_date": doc_date,
+            "language": language,
+            "mode": mode,
+            "use_cache": use_cache,
+            "expand_sentences": expand_sentences,
+        })
+        self.ensure_started()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _work(self):
+        last_sweep = time.time()
+        while True:
+            # A database error (e.g. "database is locked") must not end the
+            # thread: nothing would start it again.
+            try:
+                claimed = self.store.claim()
+                if claimed is None:
+                    self._wakeup.wait(POLL_SECONDS)
+                    self._wakeup.clear()
+                    if time.time() - last_sweep > POLL_SECONDS * 30:
+                        self.store.requeue_orphans()
+                        last_sweep = time.time()
+                    continue
+                self._run(*claimed)
+            except Exception:
+                logger.exception("Job worker error")
+                time.sleep(POLL_SECONDS)
+
+    def _run(self, job_id, params):
+        def on_progress(name, error):
+            self.store.set_progress(job_id, name, "failed" if error else "done")
+
+        # The job's model output is stored under its job id (see artifacts.py).
+        token = bind_request(job_id)
+        try:
+            for name in _progress_names(params["mode"]):
+                self.store.set_progress(job_id, name, "running")
+            result = run_analyses(
+                params["input_text"], params["doc_date"], params["language"],
+                params["mode"], params.get("use_cache", True), on_progress=on_progress,
+                expand_sentences=params.get("expand_sentences", False),
+            )
+        except Exception as exc:
+            self.store.finish(job_id, error=f"{type(exc).__name__}: {exc}")
+            return
+        finally:
+            unbind_request(token)
+        self.store.finish(job_id, result=result)
+
+
+job_queue = JobQueue()
@@ -0,0 +1,298 @@
+# json_repair.py
+"""
+Tolerant recovery of JSON from model output.
+
+json.loads() gives up on the first flaw, and the analyzers used to throw the
+whole (already paid for) answer away with it. recover_json() tries, in order:
+
+  1. the text as-is, after dropping a "</think>" preamble and ``` fences
+  2. a local repair: prose around the JSON is ignored and trailing commas are
+     removed                                                     -> "repaired"
+  3. a local salvage of truncated output: the unfinished tail is cut at the
+     last complete element and the open arrays/objects are closed -> "salvaged"
+  4. optionally, one call to a cheap model asked to fix the JSON  -> "model_repaired"
+
+Outcomes are counted per analysis (repair_stats(), and
+anansi_json_parse_total on /metrics).
+
+Tunables (environment variables):
+  ANANSI_JSON_REPAIR_MODEL       model for step 4, empty disables it   (default "")
+  ANANSI_JSON_REPAIR_MAX_CHARS   longest output sent to that model     (default 40000)
+"""
+import json
+import os
+import threading
+
+import metrics
+from llm_client import chat_completion
+
+REPAIR_MODEL = os.environ.get("ANANSI_JSON_REPAIR_MODEL", "")
+REPAIR_MAX_CHARS = int(os.environ.get("ANANSI_JSON_REPAIR_MAX_CHARS", "40000"))
+
+OUTCOMES = ("parsed", "repaired", "salvaged", "model_repaired", "failed")
+
+SALVAGE_WARNING = "Model output was incomplete; the unfinished tail was dropped."
+
+_REPAIR_PROMPT = """
+The following text was meant to be a single valid JSON value but it is malformed
+(it may be truncated, or contain stray text, comments or trailing commas).
+Return ONLY the corrected JSON, keeping every complete element and dropping
+incomplete ones. Do not add commentary or markdown fences.
+
+Text:
+"""
+
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\r\n"
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(analysis, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(analysis, dict.fromkeys(OUTCOMES, 0))
+        counts[outcome] += 1
+    metrics.inc(metrics.JSON_PARSE, (analysis, outcome))
+
+
+def repair_stats():
+    """
+    Returns a snapshot of parse outcomes per analysis.
+    """
+    with _stats_lock:
+        return {analysis: dict(counts) for analysis, counts in _stats.items()}
+
+
+# -------------------- Local recovery --------------------
+
+def strip_wrappers(raw):
+    """
+    Drops a reasoning preamble ending in "</think>" and markdown code fences,
+    balanced or not.
+    """
+    text = (raw or "").split("</think>")[-1]
+    return text.replace("```json", "").replace("```", "").strip()
+
+
+def _complete_so_far(stack):
+    # Inside an element of an array the element itself is still unfinished,
+    # so only the innermost container may be an array.
+    return "[" not in stack[:-1]
+
+
+def _scan(text, start):
+    """
+    Scans the JSON value starting at text[start] with a bracket stack that
+    knows about strings, recording what a repair needs.
+
+    :return: (end, drop, cut, cut_stack) where end is the index just past the
+             value (None if it never closes), drop the indices of trailing
+             commas, and cut/cut_stack the last position at which everything
+             before is complete and the brackets open there.
+    """
+    stack = []
+    # Per open object: True while a key (not a value) is expected.
+    expect_key = []
+    drop = []
+    last_comma = None
+    cut, cut_stack = None, None
+    in_string = escape = False
+    i, n = start, len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not (stack[-1] == "{" and expect_key[-1]) and _complete_so_far(stack):
+                    cut, cut_stack = i + 1, tuple(stack)
+            i += 1
+            continue
+        if ch in _WHITESPACE:
+            i += 1
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            # An emptied container is a complete value for a key, but not a
+            # complete element of an array.
+            keyed = not stack or stack[-1] == "{"
+            stack.append(ch)
+            expect_key.append(ch == "{")
+            if keyed and _complete_so_far(stack):
+                cut, cut_stack = i + 1, tuple(stack)
+        elif ch == "}" or ch == "]":
+            if last_comma is not None:
+                drop.append(last_comma)
+            stack.pop()
+            expect_key.pop()
+            if not stack:
+                return i + 1, drop, cut, cut_stack
+            if _complete_so_far(stack):
+                cut, cut_stack = i + 1, tuple(stack)
+        elif ch == ":":
+            expect_key[-1] = False
+        elif ch == ",":
+            if stack[-1] == "{":
+                expect_key[-1] = True
+            last_comma = i
+            i += 1
+            continue
+        elif stack:
+            # number, true, false or null: complete once the next token starts
+            j = i
+            while j < n and text[j] not in _WHITESPACE and text[j] not in ",]}":
+                j += 1
+            if j < n and _complete_so_far(stack):
+                cut, cut_stack = j, tuple(stack)
+            i = j
+            last_comma = None
+            continue
+        last_comma = None
+        i += 1
+    return None, drop, cut, cut_stack
+
+
+def _without(text, start, end, drop):
+    parts, previous = [], start
+    for index in drop:
+        parts.append(text[previous:index])
+        previous = index + 1
+    parts.append(text[previous:end])
+    return "".join(parts)
+
+
+def _candidates(text):
+    """
+    Yields the index of every "{" and "[" in *text*, in order.
+    """
+    for i, ch in enumerate(text):
+        if ch in _CLOSERS:
+            yield i
+
+
+def _looks_like_json(text, start):
+    # "{this}" in prose is not an attempt at JSON; '{"a": ...' is.
+    rest = text[start + 1:].lstrip(_WHITESPACE)[:1]
+    return rest in ('"', "}") if text[start] == "{" else rest != "" and rest in '"{[]-0123456789tfn'
+
+
+def _recover_at(text, start):
+    """
+    Recovers the value starting at text[start].
+
+    :return: (value or None, outcome, end of the text it covers; a value
+             that never closes covers the rest of the text)
+    """
+    end, drop, cut, cut_stack = _scan(text, start)
+    if end is not None:
+        try:
+            return json.loads(_without(text, start, end, drop)), "repaired", end
+        except json.JSONDecodeError:
+            return None, "failed", end
+    if cut is None:
+        return None, "failed", len(text)
+    closing = "".join(_CLOSERS[ch] for ch in reversed(cut_stack))
+    try:
+        return json.loads(_without(text, start, cut, [d for d in drop if d < cut]) + closing), "salvaged", len(text)
+    except json.JSONDecodeError:
+        return None, "failed", len(text)
+
+
+def recover_local(raw, expect=None):
+    """
+    Recovers a JSON value from *raw* without calling a model.
+
+    Each "{" or "[" is tried in turn, so a stray bracket in prose before the
+    JSON does not hide it. A value nested in an earlier JSON-like container
+    (an element of an array when *expect* is dict, or a fragment of a
+    malformed object) is never returned as if it were the whole answer.
+
+    :param expect: dict or list, the type of the top-level value
+    :return: (value or None, outcome) with outcome "parsed", "repaired",
+             "salvaged" or "failed"
+    """
+    text = strip_wrappers(raw)
+    try:
+        return json.loads(text), "parsed"
+    except json.JSONDecodeError:
+        pass
+
+    covered = 0
+    for start in _candidates(text):
+        if start < covered:
+            continue
+        value, outcome, end = _recover_at(text, start)
+        if value is not None:
+            if expect is None or isinstance(value, expect):
+                return value, outcome
+            covered = end
+        elif _looks_like_json(text, start):
+            covered = end
+    return None, "failed"
+
+
+# -------------------- Entry points --------------------
+
+def _model_repair(text, expect):
+    if not REPAIR_MODEL or not text or len(text) > REPAIR_MAX_CHARS:
+        return None
+    try:
+        response = chat_completion(
+            "json_repair",
+            model=REPAIR_MODEL,
+            messages=[{"role": "user", "content": _REPAIR_PROMPT + text}]
+        )
+    except Exception:
+        return None
+    value, outcome = recover_local(response.choices[0].message.content or "", expect)
+    return value if outcome in ("parsed", "repaired") else None
+
+
+def recover_json(raw, analysis, expect=None):
+    """
+    Recovers a JSON value from model output, falling back to the repair model
+    when local recovery fails and one is configured. The outcome is counted
+    under *analysis*.
+
+    :return: (value or None, outcome)
+    """
+    value, outcome = recover_local(raw, expect)
+    if outcome != "failed" and (expect is None or isinstance(value, expect)):
+        _count(analysis, outcome)
+        return value, outcome
+    value = _model_repair(strip_wrappers(raw), expect)
+    if value is not None and (expect is None or isinstance(value, expect)):
+        _count(analysis, "model_repaired")
+        return value, "model_repaired"
+    _count(analysis, "failed")
+    return None, "failed"
+
+
+def parse_model_json(raw, analysis, empty_result):
+    """
+    Parses an analyzer's answer into a dict shaped like *empty_result*.
+
+    Keys missing from salvaged output are filled from *empty_result* and a
+    "warning" is added; when nothing can be recovered the result is
+    *empty_result* plus the usual "error" with the raw output.
+
+    :param raw: The model's answer
+    :param analysis: Analysis name for the counters
+    :param empty_result: The analyzer's default (empty) result
+    """
+    value, outcome = recover_json(raw, analysis, dict)
+    if value is None:
+        result = dict(empty_result)
+        result["error"] = "JSON parsing failed. Raw output was:\n" + strip_wrappers(raw)
+        return result
+    if outcome == "salvaged":
+        result = dict(empty_result)
+        result.update(value)
+        result["warning"] = SALVAGE_WARNING
+        return result
+    return value
@@ -0,0 +1,180 @@
+# json_stream.py
+"""
+Incremental JSON parsing for streamed model output.
+
+IncrementalJSONParser is fed the model's text as it arrives and returns every
+element of the watched arrays (e.g. "events", "relations",
+"entity_relations") as soon as that element's closing bracket, brace or quote
+has been received, long before the whole document is complete.
+
+Text before the first top-level "{" (markdown fences, stray prose, a
+"</think>" preamble) is skipped.
+"""
+import json
+
+# Arrays watched by default, as key paths from the top-level object.
+DEFAULT_PATHS = (
+    ("events",),
+    ("relations",),
+    ("entity_relations",),
+    ("event_relations", "relations"),
+)
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    Character-level scanner that tracks nesting, strings and object keys so it
+    can cut complete array elements out of a growing buffer.
+
+    Usage:
+        parser = IncrementalJSONParser()
+        for delta in stream:
+            for path, element in parser.feed(delta):
+                ...
+        document = parser.result()
+    """
+
+    def __init__(self, paths=DEFAULT_PATHS):
+        self.paths = {tuple(p) for p in paths}
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.finished = False
+        self.skipped_elements = 0
+        # Each frame: {"type": "{" or "[", "path": tuple, "expect_key": bool,
+        #              "key": pending key, "elem_start": index or None}
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._root_start = None
+        self._root_end = None
+
+    # -------------------- helpers --------------------
+
+    def _watched(self, frame):
+        return frame["type"] == "[" and frame["path"] in self.paths
+
+    def _emit(self, frame, end, out):
+        text = self.buffer[frame["elem_start"]:end].strip()
+        frame["elem_start"] = None
+        if not text:
+            return
+        try:
+            out.append((frame["path"], json.loads(text)))
+        except json.JSONDecodeError:
+            self.skipped_elements += 1
+
+    def _child_path(self):
+        parent = self._stack[-1] if self._stack else None
+        if parent is None:
+            return ()
+        if parent["type"] == "{":
+            return parent["path"] + (parent["key"],)
+        # Elements of arrays are not addressable by key; mark them so nested
+        # arrays never match a watched path by accident.
+        return parent["path"] + ("[]",)
+
+    def _value_starts(self, index):
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None and self._watched(parent) and parent["elem_start"] is None:
+            parent["elem_start"] = index
+
+    def _value_ends(self, end, out):
+        # Called after a container or string value closes at index end-1.
+        parent = self._stack[-1] if self._stack else None
+        if parent is not None and self._watched(parent) and parent["elem_start"] is not None:
+            self._emit(parent, end, out)
+
+    # -------------------- scanning --------------------
+
+    def feed(self, text):
+        """
+        Appends *text* and returns the list of (path, element) pairs completed by it.
+        """
+        self.buffer += text
+        out = []
+        buffer = self.buffer
+        i = self.pos
+        n = len(buffer)
+        while i < n and not self.finished:
+            ch = buffer[i]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if frame["type"] == "{" and frame["expect_key"]:
+                        try:
+                            frame["key"] = json.loads(buffer[self._string_start:i + 1])
+                        except json.JSONDecodeError:
+                            frame["key"] = buffer[self._string_start + 1:i]
+                    else:
+                        self._value_ends(i + 1, out)
+                i += 1
+                continue
+
+            if not self.started:
+                if ch == "{":
+                    self.started = True
+                    self._root_start = i
+                    self._stack.append({"type": "{", "path": (), "expect_key": True,
+                                        "key": None, "elem_start": None})
+                i += 1
+                continue
+
+            if ch in _WHITESPACE:
+                i += 1
+                continue
+
+            frame = self._stack[-1]
+            if ch == '"':
+                if not (frame["type"] == "{" and frame["expect_key"]):
+                    self._value_starts(i)
+                self._in_string = True
+                self._string_start = i
+            elif ch == "{" or ch == "[":
+                self._value_starts(i)
+                self._stack.append({"type": ch, "path": self._child_path(), "expect_key": ch == "{",
+                                    "key": None, "elem_start": None})
+            elif ch == "}" or ch == "]":
+                if self._watched(frame) and frame["elem_start"] is not None:
+                    # A trailing scalar element ends at the closing bracket.
+                    self._emit(frame, i, out)
+                self._stack.pop()
+                if not self._stack:
+                    self.finished = True
+                    self._root_end = i + 1
+                else:
+                    self._value_ends(i + 1, out)
+            elif ch == ":":
+                frame["expect_key"] = False
+            elif ch == ",":
+                if self._watched(frame) and frame["elem_start"] is not None:
+                    self._emit(frame, i, out)
+                if frame["type"] == "{":
+                    frame["expect_key"] = True
+            else:
+                # Start of a number, true, false or null.
+                self._value_starts(i)
+            i += 1
+
+        self.pos = i
+        return out
+
+    def result(self):
+        """
+        Parses the complete top-level object once the stream has ended.
+
+        :raises json.JSONDecodeError: if the document is incomplete or invalid.
+        """
+        if self._root_start is None:
+            raise json.JSONDecodeError("No JSON object found", self.buffer, 0)
+        end = self._root_end if self._root_end is not None else len(self.buffer)
+        return json.loads(self.buffer[self._root_start:end])
@@ -0,0 +1,297 @@
+# llm_client.py
+"""
+Process-wide OpenAI client shared by every analyzer.
+
+Building OpenAI() per call creates a fresh httpx client, connection pool and
+TLS handshake every time. Instead get_client() lazily builds one client whose
+httpx connection pool is reused by all analyzers and worker threads (httpx
+clients are thread-safe).
+
+Analyzers call chat_completion(analysis, ...) or stream_chat_completion()
+rather than the client directly, so token usage can be accounted per
+analysis (usage_stats()) and every call gets the retries, deadline and
+circuit breaker of resilience.py. The SDK's own retries are disabled so the
+two do not multiply. Callers pass a routing.Route instead of a model, which
+selects the model and reasoning_effort and has its latency and tokens
+recorded (routing.route_stats()). Every call's latency and tokens also go to
+the Prometheus metrics (metrics.py), and its prompt and raw answer to the
+current request's artifacts (artifacts.py).
+
+Tunables (environment variables):
+  ANANSI_OPENAI_MAX_CONNECTIONS    total pooled connections       (default 50)
+  ANANSI_OPENAI_MAX_KEEPALIVE      idle keep-alive connections    (default 20)
+  ANANSI_OPENAI_KEEPALIVE_EXPIRY   idle keep-alive seconds        (default 90)
+  ANANSI_OPENAI_HTTP2              "1" to negotiate HTTP/2 (needs the h2 package)
+  ANANSI_OPENAI_CONNECT_TIMEOUT    seconds                        (default 10)
+  ANANSI_OPENAI_READ_TIMEOUT       seconds, reasoning calls are slow (default 600)
+  ANANSI_OPENAI_WRITE_TIMEOUT      seconds                        (default 30)
+  ANANSI_OPENAI_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+"""
+import importlib.util
+import os
+import threading
+import time
+
+import httpx
+from openai import OpenAI
+
+import artifacts
+import metrics
+import routing
+from logging_config import get_logger
+from resilience import call_with_retries
+
+logger = get_logger("llm_client")
+
+_client = None
+_client_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "new_connections": 0,
+    "tls_handshakes": 0,
+}
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _bump(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _trace(event_name, info):
+    # httpcore reports connection lifecycle events through the "trace"
+    # request extension; a TCP connect only happens when no pooled
+    # connection could be reused.
+    if event_name == "connection.connect_tcp.complete":
+        _bump("new_connections")
+    elif event_name == "connection.start_tls.complete":
+        _bump("tls_handshakes")
+
+
+def _on_request(request):
+    _bump("requests")
+    request.extensions["trace"] = _trace
+
+
+def _http2_enabled():
+    if os.environ.get("ANANSI_OPENAI_HTTP2", "0") != "1":
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("ANANSI_OPENAI_HTTP2=1 but the 'h2' package is not installed; using HTTP/1.1")
+        return False
+    return True
+
+
+def _build_client():
+    limits = httpx.Limits(
+        max_connections=_env_int("ANANSI_OPENAI_MAX_CONNECTIONS", 50),
+        max_keepalive_connections=_env_int("ANANSI_OPENAI_MAX_KEEPALIVE", 20),
+        keepalive_expiry=_env_float("ANANSI_OPENAI_KEEPALIVE_EXPIRY", 90),
+    )
+    timeout = httpx.Timeout(
+        connect=_env_float("ANANSI_OPENAI_CONNECT_TIMEOUT", 10),
+        read=_env_float("ANANSI_OPENAI_READ_TIMEOUT", 600),
+        write=_env_float("ANANSI_OPENAI_WRITE_TIMEOUT", 30),
+        pool=_env_float("ANANSI_OPENAI_POOL_TIMEOUT", 30),
+    )
+    http_client = httpx.Client(
+        limits=limits,
+        timeout=timeout,
+        http2=_http2_enabled(),
+        event_hooks={"request": [_on_request]},
+    )
+    return OpenAI(
+        api_key=os.environ.get("OPENAI_API_KEY"),
+        http_client=http_client,
+        timeout=timeout,
+        max_retries=0,
+    )
+
+
+def get_client():
+    """
+    Returns the shared OpenAI client, building it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+_usage_lock = threading.Lock()
+_usage = {}
+
+
+_USAGE_KEYS = ("calls", "prompt_tokens", "cached_tokens", "completion_tokens", "reasoning_tokens", "total_tokens")
+
+
+def _record_usage(analysis, usage):
+    details = getattr(usage, "completion_tokens_details", None)
+    reasoning = getattr(details, "reasoning_tokens", None) or 0
+    # Prompt tokens served from the provider's prefix cache (billed at a discount).
+    prompt_details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(prompt_details, "cached_tokens", None) or 0
+    with _usage_lock:
+        totals = _usage.setdefault(analysis, dict.fromkeys(_USAGE_KEYS, 0))
+        totals["calls"] += 1
+        if usage is None:
+            return
+        totals["prompt_tokens"] += usage.prompt_tokens or 0
+        totals["cached_tokens"] += cached
+        totals["completion_tokens"] += usage.completion_tokens or 0
+        totals["reasoning_tokens"] += reasoning
+        totals["total_tokens"] += usage.total_tokens or 0
+
+
+def _with_cache_ratio(totals):
+    totals["cache_hit_ratio"] = (
+        round(totals["cached_tokens"] / totals["prompt_tokens"], 4) if totals["prompt_tokens"] else 0.0
+    )
+    return totals
+
+
+def _attempt_timeout(client, remaining):
+    # Each attempt may use the configured timeouts, but none past the deadline.
+    base = client.timeout
+    return httpx.Timeout(
+        connect=min(base.connect, remaining),
+        read=min(base.read, remaining),
+        write=min(base.write, remaining),
+        pool=min(base.pool, remaining),
+    )
+
+
+def _create(analysis, route=None, **kwargs):
+    if route is not None:
+        kwargs = dict(route.kwargs(), **kwargs)
+    client = get_client()
+    return call_with_retries(
+        analysis,
+        kwargs.get("model", ""),
+        lambda remaining: client.chat.completions.create(timeout=_attempt_timeout(client, remaining), **kwargs),
+    )
+
+
+def _record_call(analysis, route, model, start, usage=None, failed=False):
+    elapsed = time.perf_counter() - start
+    metrics.record_upstream(analysis, route.model if route is not None else model, elapsed, usage, failed)
+    if route is not None:
+        routing.record(route, elapsed, usage, failed)
+
+
+def chat_completion(analysis, route=None, **kwargs):
+    """
+    Creates a chat completion on the shared client and records its token usage.
+
+    :param analysis: Name of the calling analysis ("events", "pos", ...)
+    :param route: routing.Route selecting model and reasoning_effort, or None
+                  to pass model= in kwargs
+    :param kwargs: Passed through to client.chat.completions.create
+    :return: The ChatCompletion response
+    :raises resilience.UpstreamUnavailable: while the model's circuit is open
+    """
+    start = time.perf_counter()
+    try:
+        response = _create(analysis, route, **kwargs)
+    except Exception:
+        _record_call(analysis, route, kwargs.get("model"), start, failed=True)
+        raise
+    usage = getattr(response, "usage", None)
+    _record_usage(analysis, usage)
+    _record_call(analysis, route, kwargs.get("model"), start, usage)
+    choices = getattr(response, "choices", None) or []
+    artifacts.save(analysis, route.model if route is not None else kwargs.get("model"), kwargs.get("messages"),
+                   choices[0].message.content if choices else None)
+    return response
+
+
+def stream_chat_completion(analysis, route=None, **kwargs):
+    """
+    Streams a chat completion on the shared client, yielding content deltas
+    (strings) as they arrive. Usage is requested in the final stream chunk
+    and recorded like chat_completion() does. Only opening the stream is
+    retried; once content has been yielded a failure is raised to the caller.
+
+    :param analysis: Name of the calling analysis
+    :param route: routing.Route selecting model and reasoning_effort, or None
+    :param kwargs: Passed through to client.chat.completions.create
+    """
+    start = time.perf_counter()
+    try:
+        stream = _create(
+            analysis,
+            route,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs
+        )
+    except Exception:
+        _record_call(analysis, route, kwargs.get("model"), start, failed=True)
+        raise
+    usage = None
+    completed = False
+    received = []
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            for choice in chunk.choices or []:
+                content = getattr(choice.delta, "content", None)
+                if content:
+                    received.append(content)
+                    yield content
+        completed = True
+    finally:
+        stream.close()
+        _record_usage(analysis, usage)
+        _record_call(analysis, route, kwargs.get("model"), start, usage, failed=not completed)
+        artifacts.save(analysis, route.model if route is not None else kwargs.get("model"), kwargs.get("messages"),
+                       "".join(received))
+
+
+def usage_stats():
+    """
+    Returns cumulative token usage per analysis since the process started,
+    with cache_hit_ratio: the share of prompt tokens served from the
+    provider's prompt cache.
+    """
+    with _usage_lock:
+        return {analysis: _with_cache_ratio(dict(totals)) for analysis, totals in _usage.items()}
+
+
+def usage_totals():
+    """
+    Returns cumulative token usage summed over all analyses.
+    """
+    totals = dict.fromkeys(_USAGE_KEYS, 0)
+    for per_analysis in usage_stats().values():
+        for key in totals:
+            totals[key] += per_analysis[key]
+    return _with_cache_ratio(totals)
+
+
+def connection_stats():
+    """
+    Returns counters for the shared client's connection pool.
+
+    "reused_connections" is the number of requests that were sent over an
+    already-open pooled connection instead of opening a new one.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["reused_connections"] = max(stats["requests"] - stats["new_connections"], 0)
+    stats["reuse_ratio"] = (
+        round(stats["reused_connections"] / stats["requests"], 3) if stats["requests"] else 0.0
+    )
+    return stats
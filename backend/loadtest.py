@@ -0,0 +1,145 @@
+# loadtest.py
+"""
+End-to-end load test for the Flask backend.
+
+Drives /analyze, /analyze_pos and /analyze_morphology at increasing
+concurrency levels and reports throughput and p50/p95/p99 latency per
+endpoint and level. Intended to run against the app backed by
+mock_llm_server.py, so serving and concurrency changes can be measured
+offline:
+
+    python mock_llm_server.py --port 8001 --latency lognormal:1500:0.4 &
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock ANANSI_CACHE_ENABLED=0 python app.py &
+    python loadtest.py --base-url http://127.0.0.1:5001 --concurrency 1,4,16 --requests 40
+
+Use --analyze-field mode=sequential (etc.) to compare /analyze variants, and
+--json to get machine-readable results.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+SAMPLE_TEXTS = [
+    "On January 15, 2023, President Biden announced a new economic policy. "
+    "The policy aims to reduce inflation and create jobs. "
+    "As a result of this announcement, the stock market rose by 2%.",
+    "Ayer me encontré con Migue en el trabajo, hace rato no hablábamos. "
+    "Hoy vamos a almorzar juntos porque tenemos que planear el viaje a Lima.",
+    "The storm reached the coast on Monday. Thousands of residents were evacuated "
+    "before the bridge collapsed, and the city council declared an emergency on Tuesday.",
+]
+SAMPLE_WORDS = ["announced", "policy", "encontré", "hablábamos", "evacuated", "collapsed"]
+
+ENDPOINTS = {
+    "analyze": lambda text, extra: ("/analyze", dict({"input_text": text, "doc_date": "2023-01-20",
+                                                       "language": "English"}, **extra)),
+    "analyze_pos": lambda text, extra: ("/analyze_pos", {"input_text": text}),
+    "analyze_morphology": lambda text, extra: ("/analyze_morphology", {
+        "word": random.choice(SAMPLE_WORDS), "language": "English"}),
+}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(pct / 100.0 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_level(client, endpoint, concurrency, requests, texts, extra):
+    """
+    Sends *requests* requests to *endpoint* with *concurrency* in flight.
+
+    :return: dict with throughput, latency percentiles (seconds) and errors.
+    """
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+
+    def one(i):
+        path, data = ENDPOINTS[endpoint](texts[i % len(texts)], extra)
+        start = time.perf_counter()
+        try:
+            response = client.post(path, data=data)
+            ok = response.status_code < 400
+            key = None if ok else f"http_{response.status_code}"
+        except httpx.HTTPError as exc:
+            key = type(exc).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            if key is None:
+                latencies.append(elapsed)
+            else:
+                errors[key] = errors.get(key, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test /analyze, /analyze_pos and /analyze_morphology.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:5001")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help=f"Comma-separated subset of: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per endpoint per level")
+    parser.add_argument("--text-file", default=None, help="Use this file's text instead of the built-in samples")
+    parser.add_argument("--analyze-field", action="append", default=[],
+                        help="Extra form field for /analyze, e.g. mode=combined or cache=0 (repeatable)")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    extra = dict(field.split("=", 1) for field in args.analyze_field)
+    texts = SAMPLE_TEXTS
+    if args.text_file:
+        with open(args.text_file, encoding="utf-8") as handle:
+            texts = [handle.read()]
+
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    results = []
+    with httpx.Client(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        for endpoint in endpoints:
+            for level in levels:
+                result = run_level(client, endpoint, level, args.requests, texts, extra)
+                results.append(result)
+                if not args.json:
+                    print(f"{endpoint:<20} c={level:<4} {result['throughput_rps']:>8.2f} req/s  "
+                          f"p50={result['p50'] * 1000:>8.1f}ms  p95={result['p95'] * 1000:>8.1f}ms  "
+                          f"p99={result['p99'] * 1000:>8.1f}ms  ok={result['ok']}/{result['requests']}"
+                          + (f"  errors={result['errors']}" if result["errors"] else ""))
+                    sys.stdout.flush()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# logging_config.py
+"""
+Structured, asynchronous logging for the backend.
+
+Request threads only put log records on a bounded queue; one listener thread
+formats them and does all the file I/O, so a slow disk never holds up a
+request and lines from concurrent requests never interleave. When the queue
+is full records are dropped (and counted) rather than blocking.
+
+Two kinds of output:
+  - operational logs (get_logger()): JSON lines in <log dir>/anansi.log and,
+    at ANANSI_LOG_LEVEL and above, on stderr
+  - prompt/response bodies (log_to_file()): JSON lines in
+    <log dir>/<function name>.log, sampled (ANANSI_LOG_BODY_SAMPLE) and
+    truncated (ANANSI_LOG_BODY_MAX_CHARS) because they run to many kilobytes
+
+Every file rotates at ANANSI_LOG_MAX_BYTES keeping ANANSI_LOG_BACKUPS old
+copies.
+
+Tunables (environment variables):
+  ANANSI_LOG_DIR             directory of the log files (default logs/ next to this module)
+  ANANSI_LOG_LEVEL           level of the operational logs        (default INFO)
+  ANANSI_LOG_BODY_SAMPLE     fraction of bodies written, 0..1     (default 0.05)
+  ANANSI_LOG_BODY_MAX_CHARS  longest body written, in characters  (default 4000)
+  ANANSI_LOG_MAX_BYTES       size at which a file rotates         (default 10 MiB)
+  ANANSI_LOG_BACKUPS         rotated copies kept per file         (default 5)
+  ANANSI_LOG_QUEUE_SIZE      records buffered before dropping     (default 10000)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+LOG_DIR = os.environ.get(
+    "ANANSI_LOG_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"),
+)
+LOG_LEVEL = os.environ.get("ANANSI_LOG_LEVEL", "INFO").upper()
+# getLevelName() maps a known name to its number and anything else to "Level X".
+LEVEL = logging.getLevelName(LOG_LEVEL)
+if not isinstance(LEVEL, int):
+    raise ValueError(f"ANANSI_LOG_LEVEL must be one of DEBUG, INFO, WARNING, ERROR or CRITICAL, not {LOG_LEVEL!r}")
+BODY_SAMPLE = float(os.environ.get("ANANSI_LOG_BODY_SAMPLE", "0.05"))
+BODY_MAX_CHARS = int(os.environ.get("ANANSI_LOG_BODY_MAX_CHARS", "4000"))
+MAX_BYTES = int(os.environ.get("ANANSI_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+BACKUPS = int(os.environ.get("ANANSI_LOG_BACKUPS", "5"))
+QUEUE_SIZE = int(os.environ.get("ANANSI_LOG_QUEUE_SIZE", "10000"))
+
+ROOT_LOGGER = "anansi"
+BODY_LOGGER = "anansi.bodies"
+
+# Attributes every LogRecord has; anything else was passed in extra=.
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+_stats_lock = threading.Lock()
+_stats = {"dropped": 0, "bodies_logged": 0, "bodies_skipped": 0, "bodies_truncated": 0}
+
+
+def _bump(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def logging_stats():
+    """
+    Returns counters of dropped records and sampled/truncated bodies.
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+# -------------------- Formatting and handlers --------------------
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message and any extra= fields.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        _ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _bump("dropped")
+
+
+class _PerFunctionHandler(logging.Handler):
+    """
+    Writes each body record to <log dir>/<function>.log. Only the listener
+    thread calls it, so the lazily opened handlers need no extra locking.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._handlers = {}
+
+    def emit(self, record):
+        name = _UNSAFE_FILENAME.sub("_", getattr(record, "function", "") or "bodies")
+        handler = self._handlers.get(name)
+        if handler is None:
+            handler = _rotating(f"{name}.log")
+            self._handlers[name] = handler
+        handler.handle(record)
+
+    def close(self):
+        for handler in self._handlers.values():
+            handler.close()
+        super().close()
+
+
+def _rotating(filename):
+    handler = logging.handlers.RotatingFileHandler(
+        os.path.join(LOG_DIR, filename), maxBytes=MAX_BYTES, backupCount=BACKUPS,
+        encoding="utf-8", delay=True,
+    )
+    handler.setFormatter(JSONFormatter())
+    return handler
+
+
+# -------------------- Setup --------------------
+
+_queue = queue.Queue(maxsize=QUEUE_SIZE)
+_listener = None
+_listener_pid = None
+_setup_lock = threading.Lock()
+_configured = False
+
+
+def _build_listener():
+    os.makedirs(LOG_DIR, exist_ok=True)
+    console = logging.StreamHandler(sys.stderr)
+    console.setLevel(LEVEL)
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    operational = _rotating("anansi.log")
+    operational.setLevel(LEVEL)
+    bodies = _PerFunctionHandler()
+
+    class _Router(logging.Handler):
+        def handle(self, record):
+            if record.name == BODY_LOGGER or record.name.startswith(BODY_LOGGER + "."):
+                bodies.handle(record)
+            else:
+                for handler in (console, operational):
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            return True
+
+    return logging.handlers.QueueListener(_queue, _Router(), respect_handler_level=False)
+
+
+def _ensure_listener():
+    global _listener, _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _setup_lock:
+        # Keyed on the pid: a listener thread started before a fork (e.g. a
+        # preloading server) does not run in the worker processes.
+        if _listener_pid != os.getpid():
+            _listener = _build_listener()
+            _listener.start()
+            _listener_pid = os.getpid()
+
+
+def _stop_listener():
+    if _listener is not None and _listener_pid == os.getpid():
+        # Drains the queue before returning.
+        _listener.stop()
+
+
+def configure():
+    """
+    Routes the "anansi" loggers through the queue. Idempotent; called on the
+    first get_logger()/log_to_file().
+    """
+    global _configured
+    if _configured:
+        return
+    with _setup_lock:
+        if _configured:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        # Bodies are logged at INFO whatever ANANSI_LOG_LEVEL is; anything
+        # below both is discarded before reaching the queue.
+        root.setLevel(min(LEVEL, logging.INFO))
+        root.addHandler(_DroppingQueueHandler(_queue))
+        root.propagate = False
+        atexit.register(_stop_listener)
+        _configured = True
+
+
+def get_logger(name):
+    """
+    Returns the logger "anansi.<name>", e.g. get_logger("jobs").
+    """
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+# -------------------- Prompt/response bodies --------------------
+
+def body_sampled():
+    """
+    Decides whether one call's bodies are logged; pass the result to every
+    log_to_file() of that call so its prompt and response are kept together.
+    """
+    return BODY_SAMPLE >= 1 or random.random() < BODY_SAMPLE
+
+
+def log_to_file(function_name, content, log_type, sampled=None, **fields):
+    """
+    Logs a prompt or response body to <log dir>/<function_name>.log.
+
+    :param function_name: Name of the logging function, selects the file
+    :param content: The body (converted with str() if it is not a string)
+    :param log_type: What the body is, e.g. "PROMPT" or "RESPONSE"
+    :param sampled: The body_sampled() decision of this call; None samples
+                    this body on its own
+    :param fields: Extra fields for the log line (analysis, model, ...)
+    """
+    if sampled is None:
+        sampled = body_sampled()
+    if not sampled:
+        _bump("bodies_skipped")
+        return
+    configure()
+    text = content if isinstance(content, str) else str(content)
+    chars = len(text)
+    truncated = chars > BODY_MAX_CHARS
+    if truncated:
+        _bump("bodies_truncated")
+        text = text[:BODY_MAX_CHARS]
+    _bump("bodies_logged")
+    logging.getLogger(BODY_LOGGER).info(
+        text,
+        extra=dict(fields, function=function_name, type=log_type, chars=chars, truncated=truncated),
+    )
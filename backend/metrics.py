@@ -0,0 +1,382 @@
+# metrics.py
+"""
+Prometheus metrics for the Flask app, rendered in the text exposition format
+by GET /metrics.
+
+  anansi_http_requests_total{endpoint,method,status}            counter
+  anansi_http_request_duration_seconds{endpoint}                histogram
+  anansi_http_requests_in_flight{endpoint}                      gauge
+  anansi_upstream_requests_total{analysis,model,outcome}        counter
+  anansi_upstream_request_duration_seconds{analysis,model}      histogram
+  anansi_llm_tokens_total{analysis,model,kind}                  counter
+      kind: prompt, cached, completion, reasoning (from response.usage)
+  anansi_json_parse_total{analysis,outcome}                     counter
+      outcome: parsed, repaired, salvaged, model_repaired, failed
+
+Each process keeps its metrics in memory. With several worker processes
+(gunicorn -w N) set ANANSI_METRICS_DIR to a directory shared by the workers:
+every process then also writes a snapshot of its metrics there, and /metrics
+in any worker adds up the snapshots of all of them. Snapshots are named by
+pid and a per-process boot id, so a new worker that reuses a dead worker's
+pid does not overwrite its snapshot (the totals would drop, which Prometheus
+reads as a counter reset). Counters and histograms of exited workers are
+folded into retained-metrics.json and keep counting towards the totals;
+their in-flight gauges are dropped. Empty the directory before (re)starting
+the workers, as with prometheus_client's multiprocess mode.
+
+Tunables (environment variables):
+  ANANSI_METRICS_DIR     directory for per-process snapshots, empty for
+                         single-process metrics                  (default "")
+  ANANSI_METRICS_FLUSH   seconds between snapshots of a process  (default 5)
+"""
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from logging_config import get_logger
+
+logger = get_logger("metrics")
+
+METRICS_DIR = os.environ.get("ANANSI_METRICS_DIR", "")
+FLUSH_INTERVAL = float(os.environ.get("ANANSI_METRICS_FLUSH", "5"))
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+_lock = threading.Lock()
+# name -> {labels tuple: value}; a histogram's value is
+# [count per bucket (non-cumulative, +Inf last), sum].
+_values = {}
+_metrics = {}
+
+
+class _Metric:
+    def __init__(self, name, kind, help_text, labelnames, buckets=None):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        _metrics[name] = self
+        _values[name] = {}
+
+
+HTTP_REQUESTS = _Metric("anansi_http_requests_total", "counter",
+                        "HTTP requests handled.", ("endpoint", "method", "status"))
+HTTP_DURATION = _Metric("anansi_http_request_duration_seconds", "histogram",
+                        "HTTP request latency, until the response body was sent.", ("endpoint",),
+                        HTTP_BUCKETS)
+HTTP_IN_FLIGHT = _Metric("anansi_http_requests_in_flight", "gauge",
+                         "HTTP requests being handled.", ("endpoint",))
+UPSTREAM_REQUESTS = _Metric("anansi_upstream_requests_total", "counter",
+                            "Model calls, retries included, by outcome (ok or error).",
+                            ("analysis", "model", "outcome"))
+UPSTREAM_DURATION = _Metric("anansi_upstream_request_duration_seconds", "histogram",
+                            "Model call latency, retries included.", ("analysis", "model"),
+                            UPSTREAM_BUCKETS)
+TOKENS = _Metric("anansi_llm_tokens_total", "counter",
+                 "Tokens reported in response.usage.", ("analysis", "model", "kind"))
+JSON_PARSE = _Metric("anansi_json_parse_total", "counter",
+                     "Model answers by JSON parse outcome.", ("analysis", "outcome"))
+
+
+# -------------------- Recording --------------------
+
+def inc(metric, labels, amount=1):
+    """
+    Adds *amount* to a counter or gauge. *labels* is a tuple of label values
+    in the order of the metric's labelnames.
+    """
+    _ensure_flusher()
+    with _lock:
+        values = _values[metric.name]
+        values[labels] = values.get(labels, 0) + amount
+
+
+def observe(metric, labels, value):
+    """
+    Records one observation of *value* in a histogram.
+    """
+    _ensure_flusher()
+    index = len(metric.buckets)
+    for position, bound in enumerate(metric.buckets):
+        if value <= bound:
+            index = position
+            break
+    with _lock:
+        values = _values[metric.name]
+        slot = values.get(labels)
+        if slot is None:
+            slot = values[labels] = [[0] * (len(metric.buckets) + 1), 0.0]
+        slot[0][index] += 1
+        slot[1] += value
+
+
+def record_upstream(analysis, model, elapsed, usage=None, failed=False):
+    """
+    Records one model call: its latency, outcome and the tokens in *usage*.
+    """
+    model = model or "unknown"
+    inc(UPSTREAM_REQUESTS, (analysis, model, "error" if failed else "ok"))
+    observe(UPSTREAM_DURATION, (analysis, model), elapsed)
+    if usage is None:
+        return
+    prompt_details = getattr(usage, "prompt_tokens_details", None)
+    completion_details = getattr(usage, "completion_tokens_details", None)
+    for kind, count in (
+        ("prompt", usage.prompt_tokens),
+        ("cached", getattr(prompt_details, "cached_tokens", None)),
+        ("completion", usage.completion_tokens),
+        ("reasoning", getattr(completion_details, "reasoning_tokens", None)),
+    ):
+        if count:
+            inc(TOKENS, (analysis, model, kind), count)
+
+
+# -------------------- Multi-process snapshots --------------------
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+_boot = None
+
+
+def _boot_info():
+    """
+    Returns (pid, boot id, start time) of this process, renewed after a fork.
+    """
+    global _boot
+    if _boot is None or _boot[0] != os.getpid():
+        _boot = (os.getpid(), uuid.uuid4().hex[:12], time.time())
+    return _boot
+
+
+def _snapshot_path(pid, boot_id):
+    return os.path.join(METRICS_DIR, f"metrics-{pid}-{boot_id}.json")
+
+
+def _retained_path():
+    return os.path.join(METRICS_DIR, "retained-metrics.json")
+
+
+def _write_json(path, payload):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as handle:
+        json.dump(payload, handle)
+    # Readers never see a half-written file.
+    os.replace(temporary, path)
+
+
+def flush():
+    """
+    Writes this process' metrics to ANANSI_METRICS_DIR (no-op without it).
+    """
+    if not METRICS_DIR:
+        return
+    with _lock:
+        data = {name: [[list(labels), value] for labels, value in values.items()]
+                for name, values in _values.items()}
+    pid, boot_id, started_at = _boot_info()
+    _write_json(_snapshot_path(pid, boot_id),
+                {"pid": pid, "boot_id": boot_id, "started_at": started_at, "metrics": data})
+
+
+def _flush_forever():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush()
+        except OSError as exc:
+            logger.warning("could not write metrics snapshot: %s", exc)
+
+
+def _ensure_flusher():
+    global _flusher
+    if not METRICS_DIR or (_flusher is not None and _flusher[0] == os.getpid()):
+        return
+    with _flusher_lock:
+        # Keyed on the pid: a thread started before a fork does not run in the child.
+        if _flusher is None or _flusher[0] != os.getpid():
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            thread = threading.Thread(target=_flush_forever, name="metrics-flush", daemon=True)
+            thread.start()
+            _flusher = (os.getpid(), thread)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(total, metric, value):
+    if metric.kind != "histogram":
+        return total + value if total is not None else value
+    if total is None:
+        return [list(value[0]), value[1]]
+    total[0] = [a + b for a, b in zip(total[0], value[0])]
+    total[1] += value[1]
+    return total
+
+
+def _add_snapshot(merged, metrics, gauges=True):
+    for name, entries in metrics.items():
+        metric = _metrics.get(name)
+        if metric is None or (metric.kind == "gauge" and not gauges):
+            continue
+        values = merged.setdefault(name, {})
+        for labels, value in entries:
+            labels = tuple(labels)
+            values[labels] = _merge(values.get(labels), metric, value)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _fold(dead):
+    """
+    Adds the counters and histograms of exited workers' snapshots to the
+    retained totals and deletes the snapshots, under a lock on the
+    directory so two workers never fold the same snapshot.
+
+    :param dead: [(path, snapshot)] of exited workers
+    :return: the retained totals, {name: [[labels, value], ...]}
+    """
+    with open(os.path.join(METRICS_DIR, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        retained = _read_json(_retained_path()) or {"folded": [], "metrics": {}}
+        # Names folded before a crash between writing the totals and deleting
+        # the snapshot; they must not be added twice.
+        already = set(retained["folded"])
+        totals = {}
+        _add_snapshot(totals, retained["metrics"])
+        folded = []
+        for path, snapshot in dead:
+            name = os.path.basename(path)
+            if not os.path.exists(path):
+                continue
+            if name not in already:
+                _add_snapshot(totals, snapshot["metrics"], gauges=False)
+            folded.append(name)
+        metrics = {name: [[list(labels), value] for labels, value in values.items()]
+                   for name, values in totals.items()}
+        if folded:
+            _write_json(_retained_path(), {"folded": folded, "metrics": metrics})
+            for name in folded:
+                try:
+                    os.remove(os.path.join(METRICS_DIR, name))
+                except FileNotFoundError:
+                    pass
+        return metrics
+
+
+def _collect():
+    """
+    Returns {name: {labels: value}} for this process, or summed over every
+    process' snapshot in ANANSI_METRICS_DIR plus the retained totals of
+    exited processes.
+    """
+    if not METRICS_DIR:
+        with _lock:
+            return {name: {labels: _merge(None, _metrics[name], value) for labels, value in values.items()}
+                    for name, values in _values.items()}
+    flush()
+    pid, boot_id, _ = _boot_info()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "metrics-*.json")):
+        snapshot = _read_json(path)
+        if snapshot is not None:
+            snapshots.append((path, snapshot))
+    # Only the latest process with a given pid can still be running it.
+    latest = {}
+    for _, snapshot in snapshots:
+        if snapshot.get("started_at", 0) >= latest.get(snapshot["pid"], 0):
+            latest[snapshot["pid"]] = snapshot.get("started_at", 0)
+    live, dead = [], []
+    for path, snapshot in snapshots:
+        if snapshot["pid"] == pid:
+            alive = snapshot.get("boot_id") == boot_id
+        else:
+            alive = snapshot.get("started_at", 0) == latest[snapshot["pid"]] and _alive(snapshot["pid"])
+        (live if alive else dead).append((path, snapshot))
+
+    merged = {name: {} for name in _metrics}
+    if fcntl is not None:
+        _add_snapshot(merged, _fold(dead) if dead else (_read_json(_retained_path()) or {}).get("metrics", {}))
+    else:
+        # Without file locks the exited workers' snapshots are summed in place.
+        for _, snapshot in dead:
+            _add_snapshot(merged, snapshot["metrics"], gauges=False)
+    for _, snapshot in live:
+        _add_snapshot(merged, snapshot["metrics"])
+    return merged
+
+
+# -------------------- Exposition --------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+def render():
+    """
+    Returns every metric in the Prometheus text exposition format (0.0.4).
+    """
+    collected = _collect()
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for labels, value in sorted(collected.get(name, {}).items()):
+            if metric.kind != "histogram":
+                lines.append(f"{name}{_label_text(metric.labelnames, labels)} {_number(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric.buckets) + [float("inf")], counts):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{name}_bucket{_label_text(metric.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(metric.labelnames, labels)} {_number(float(total))}")
+            lines.append(f"{name}_count{_label_text(metric.labelnames, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+atexit.register(flush)
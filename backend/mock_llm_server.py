@@ -0,0 +1,390 @@
+# mock_llm_server.py
+"""
+Local OpenAI-compatible stand-in for benchmarking without spending tokens.
+
+Serves POST /v1/chat/completions and answers the events, causation, entity,
+combined, part-of-speech and (single and batched) morphology prompts of
+temporal_reasoning.py with JSON generated from the input text, after a
+configurable artificial latency.
+A configurable fraction of requests fail with 429/500/503 so retry and error
+paths can be exercised too. Requests with "stream": true are answered as a
+text/event-stream of chat.completion.chunk objects, ending with a usage chunk
+and "data: [DONE]", like the real API with stream_options.include_usage.
+
+Point the backend at it with:
+    python mock_llm_server.py --port 8001 --latency lognormal:2000:0.5 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock python app.py
+
+Latency distributions (milliseconds):
+    fixed:MS                   always MS
+    uniform:LOW:HIGH           uniformly distributed
+    lognormal:MEDIAN:SIGMA     long-tailed, like real reasoning-model calls
+A distribution may be set per prompt kind, e.g. --kind-latency pos=fixed:300.
+
+Prompt caching is imitated too: once a prompt prefix of at least 1024
+(estimated) tokens has been seen, later prompts sharing it report those
+tokens as usage.prompt_tokens_details.cached_tokens, in 128-token steps.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TEXT_MARKERS = ("Here is the text to analyze:", "Here is the input text:", "Text:")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_NUMBERED_SENTENCE = re.compile(r"^\[(s\d+)\] (.+)$", re.MULTILINE)
+_CAPITALIZED = re.compile(r"\b([A-ZÁÉÍÓÚÑ][\wáéíóúñü]+(?:\s+[A-ZÁÉÍÓÚÑ][\wáéíóúñü]+)*)")
+_WORD = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Prompt caching, in characters at ~4 per token.
+_CACHE_MIN_CHARS = 1024 * 4
+_CACHE_STEP_CHARS = 128 * 4
+
+
+# -------------------- Latency and errors --------------------
+
+def parse_latency(spec):
+    """
+    Parses a latency spec into a zero-argument function returning seconds.
+    """
+    kind, _, rest = spec.partition(":")
+    values = [float(v) for v in rest.split(":")] if rest else []
+    if kind == "fixed":
+        return lambda: values[0] / 1000.0
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000.0
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1]) / 1000.0
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+# -------------------- Prompt classification --------------------
+
+def classify(prompt):
+    if '"event_relations"' in prompt:
+        return "combined"
+    if "timeline_of_events" in prompt:
+        return "events"
+    if '"entity_relations"' in prompt:
+        return "entities"
+    if '"relations"' in prompt:
+        return "causation"
+    if '"analyses"' in prompt:
+        return "morphology_batch"
+    if "morphological analysis" in prompt.lower():
+        return "morphology"
+    if "POS" in prompt or "part-of-speech" in prompt.lower():
+        return "pos"
+    return "unknown"
+
+
+def extract_text(prompt):
+    """
+    Returns the user text embedded after the last known marker in the prompt.
+    """
+    for marker in _TEXT_MARKERS:
+        index = prompt.rfind(marker)
+        if index != -1:
+            text = prompt[index + len(marker):]
+            text = text.split("\nIMPORTANT:", 1)[0]
+            return text.strip()
+    return prompt[-2000:].strip()
+
+
+# -------------------- Template answers --------------------
+
+def _sentences(text):
+    numbered = _NUMBERED_SENTENCE.findall(text)
+    if numbered:
+        return [sentence.strip() for _, sentence in numbered][:50]
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s.strip()][:50]
+
+
+def _entities(text):
+    seen = []
+    for match in _CAPITALIZED.finditer(text):
+        name = match.group(1)
+        if name not in seen:
+            seen.append(name)
+    return seen[:20]
+
+
+def _short(sentence, words=6):
+    return " ".join(sentence.split()[:words])
+
+
+def answer_events(text):
+    sentences = _sentences(text)
+    # Prompts with sentence ids ("[s1] ...") get the id instead of the text.
+    ids = [sentence_id for sentence_id, _ in _NUMBERED_SENTENCE.findall(text)]
+    return {
+        "events": [
+            {
+                **({"sentence_id": ids[index]} if ids else {"sentence": sentence}),
+                "event_type": "statement",
+                "agent": (_entities(sentence) or [""])[0],
+                "patients": "",
+                "temporal_reference": "",
+                "cause": "",
+                "purpose_context": "",
+            }
+            for index, sentence in enumerate(sentences)
+        ],
+        "named_entities": {
+            "persons": [{"entity": name, "type": "person", "description": ""} for name in _entities(text)],
+            "organizations": [],
+            "locations": [],
+            "institutions": [],
+            "dates": [],
+            "legal_terms": [],
+        },
+        "temporal_references": [],
+        "important_notes": [],
+        "timeline_of_events": [
+            {"date": "unknown", "events": [
+                {"event_summary": _short(s), "event_verb": "", "temporal_reference_connection": ""}
+                for s in sentences
+            ]}
+        ],
+        "summary": _short(text, 40),
+    }
+
+
+def answer_causation(text):
+    sentences = _sentences(text)
+    events = {f"e{i}": _short(s) for i, s in enumerate(sentences, start=1)}
+    relations = [
+        {"source": f"e{i}", "target": f"e{i + 1}", "type": "BEFORE"}
+        for i in range(1, len(sentences))
+    ]
+    return {"events": events, "relations": relations}
+
+
+def answer_entities(text):
+    names = _entities(text)
+    return {"entity_relations": [
+        {"source_entity": a, "target_entity": b, "relation": "relates"}
+        for a, b in zip(names, names[1:])
+    ]}
+
+
+def answer_pos(text):
+    return [{"token": token, "pos": "PUNCT" if not token[0].isalnum() else "NOUN"}
+            for token in _WORD.findall(text)]
+
+
+def answer(kind, prompt, structured=False):
+    text = extract_text(prompt)
+    if kind == "events":
+        return json.dumps(answer_events(text), ensure_ascii=False)
+    if kind == "causation":
+        return json.dumps(answer_causation(text), ensure_ascii=False)
+    if kind == "entities":
+        return json.dumps(answer_entities(text), ensure_ascii=False)
+    if kind == "combined":
+        combined = answer_events(text)
+        combined["event_relations"] = answer_causation(text)
+        combined["entity_relations"] = answer_entities(text)["entity_relations"]
+        return json.dumps(combined, ensure_ascii=False)
+    if kind == "pos":
+        # Structured outputs need an object at the top level.
+        tags = answer_pos(text)
+        return json.dumps({"tokens": tags} if structured else tags, ensure_ascii=False)
+    if kind == "morphology":
+        word = prompt.split("word:", 1)[-1].strip().split("\n", 1)[0].strip() or "word"
+        return f"This is a mock morphological analysis of \"{word}\": a noun, singular."
+    if kind == "morphology_batch":
+        words = [line.strip() for line in prompt.rsplit("Words:", 1)[-1].splitlines() if line.strip()]
+        return json.dumps({"analyses": [
+            {"word": word, "analysis": f"This is a mock morphological analysis of \"{word}\": a noun, singular."}
+            for word in words
+        ]}, ensure_ascii=False)
+    return "{}"
+
+
+# -------------------- HTTP server --------------------
+
+class MockState:
+    def __init__(self, latency, kind_latency, error_rate, retry_after, stream_chunk=16, stream_delay=0.005):
+        self.latency = latency
+        self.kind_latency = kind_latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stream_chunk = stream_chunk
+        self.stream_delay = stream_delay
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.prefixes = set()
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def cached_tokens(self, prompt):
+        """
+        Returns how many tokens of *prompt* a provider prefix cache would have
+        served, and remembers the prompt's prefixes for later requests.
+        """
+        cached = 0
+        with self.lock:
+            for end in range(_CACHE_MIN_CHARS, len(prompt) + 1, _CACHE_STEP_CHARS):
+                digest = hashlib.sha1(prompt[:end].encode("utf-8")).digest()
+                if digest in self.prefixes:
+                    cached = end // 4
+                else:
+                    self.prefixes.add(digest)
+        return cached
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 so the backend's pooled client can keep connections alive.
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with state.lock:
+                    self._send_json(200, dict(state.counts))
+                return
+            self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+            kind = classify(prompt)
+            state.count(kind)
+            time.sleep(state.kind_latency.get(kind, state.latency)())
+
+            if random.random() < state.error_rate:
+                status = random.choice((429, 500, 503))
+                state.count(f"error_{status}")
+                headers = {"Retry-After": str(state.retry_after)} if status == 429 else None
+                self._send_json(status, {"error": {
+                    "message": f"Mock upstream error {status}",
+                    "type": "rate_limit_error" if status == 429 else "server_error",
+                }}, headers)
+                return
+
+            content = answer(kind, prompt, structured=bool(body.get("response_format")))
+            prompt_tokens = max(len(prompt) // 4, 1)
+            completion_tokens = max(len(content) // 4, 1)
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": min(state.cached_tokens(prompt), prompt_tokens)},
+                "completion_tokens_details": {"reasoning_tokens": 0},
+            }
+            if body.get("stream"):
+                self._send_stream(body, content, usage)
+                return
+            self._send_json(200, {
+                "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": content},
+                }],
+                "usage": usage,
+            })
+
+        def _send_stream(self, body, content, usage):
+            """
+            Sends *content* as server-sent chat.completion.chunk events, a few
+            characters at a time with a small delay in between, so incremental
+            consumers see a realistic trickle. The response has no length, so
+            the connection is closed afterwards.
+            """
+            completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+            base = {"id": completion_id, "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": body.get("model", "mock")}
+
+            def event(payload):
+                data = json.dumps(dict(base, **payload), ensure_ascii=False)
+                self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            event({"choices": [{"index": 0, "delta": {"role": "assistant", "content": ""},
+                                "finish_reason": None}]})
+            for start in range(0, len(content), state.stream_chunk):
+                event({"choices": [{"index": 0, "delta": {"content": content[start:start + state.stream_chunk]},
+                                    "finish_reason": None}]})
+                time.sleep(state.stream_delay)
+            event({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            if (body.get("stream_options") or {}).get("include_usage"):
+                event({"choices": [], "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="fixed:200", help="Default latency distribution (ms)")
+    parser.add_argument("--kind-latency", action="append", default=[],
+                        help="Per prompt kind latency, e.g. events=lognormal:3000:0.4 (repeatable)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--stream-chunk", type=int, default=16, help="Characters per streamed delta")
+    parser.add_argument("--stream-delay", type=float, default=5.0, help="Milliseconds between streamed deltas")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    kind_latency = {}
+    for item in args.kind_latency:
+        kind, _, spec = item.partition("=")
+        kind_latency[kind] = parse_latency(spec)
+
+    state = MockState(parse_latency(args.latency), kind_latency, args.error_rate, args.retry_after,
+                      max(args.stream_chunk, 1), args.stream_delay / 1000.0)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    server.daemon_threads = True
+    print(f"Mock LLM server on http://{args.host}:{args.port}/v1 (latency {args.latency}, "
+          f"error rate {args.error_rate})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# morphology_cache.py
+"""
+Persistent lexicon of word analyses for the Dictionary+ lookups.
+
+Every text selection used to cost a model round trip, even for words looked
+up thousands of times before. Analyses are now stored keyed on the
+normalized surface form, the language and the version (hash) of the
+morphology prompt, so editing the prompt invalidates the old entries:
+
+  - " casas " and "casas," share one entry (NFC, stripped of surrounding
+    whitespace and punctuation)
+  - case is kept: "Turkey" and "turkey", or "Polish" and "polish", are
+    different words
+  - the same form in another language is a separate entry
+
+It reuses the two tiers of analysis_cache.TieredCache (an in-process LRU in
+front of SQLite) in its own database file and table. A memory hit is a dict
+lookup plus json.loads() of one short answer (microseconds); a disk hit is
+one indexed SQLite read and is promoted to memory.
+
+Words missing from the store are analyzed in batches
+(temporal_reasoning.analyze_morphology_batch()): pack_words() packs them into
+as few model calls as fit a token budget, estimated from each word and the
+length of an answer. A request may ask for at most BATCH_MAX_WORDS distinct
+words, and the calls share one pool of BATCH_WORKERS threads per process.
+
+The store can be pre-warmed from a frequency list, most frequent word first,
+one per line ("word" or "word<TAB/space>count"):
+
+    python morphology_cache.py warm es_50k.txt --language Spanish --top 5000 --workers 8
+    python morphology_cache.py stats
+
+Tunables (environment variables):
+  ANANSI_MORPHOLOGY_CACHE             "0" disables the store
+                                      (default: follows ANANSI_CACHE_ENABLED)
+  ANANSI_MORPHOLOGY_CACHE_MAX_BYTES   memory tier budget in bytes (default 16 MiB)
+  ANANSI_MORPHOLOGY_DB                SQLite file (default cache/morphology.sqlite3
+                                      next to this module)
+  ANANSI_MORPHOLOGY_BATCH_TOKENS      token budget of one batched call (default 4000)
+  ANANSI_MORPHOLOGY_ANSWER_TOKENS     estimated tokens of one word's answer (default 80)
+  ANANSI_MORPHOLOGY_BATCH_MAX_WORDS   distinct words one batch request may ask for (default 200)
+  ANANSI_MORPHOLOGY_BATCH_WORKERS     batched calls run at the same time, per process (default 4)
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis_cache import CACHE_ENABLED, TieredCache, prompt_hash
+from tokens import count_tokens
+
+MORPHOLOGY_CACHE_ENABLED = os.environ.get("ANANSI_MORPHOLOGY_CACHE", "1" if CACHE_ENABLED else "0") != "0"
+DEFAULT_MAX_BYTES = int(os.environ.get("ANANSI_MORPHOLOGY_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+DEFAULT_DB_PATH = os.environ.get(
+    "ANANSI_MORPHOLOGY_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "morphology.sqlite3"),
+)
+TABLE = "morphology"
+BATCH_TOKENS = int(os.environ.get("ANANSI_MORPHOLOGY_BATCH_TOKENS", "4000"))
+ANSWER_TOKENS = int(os.environ.get("ANANSI_MORPHOLOGY_ANSWER_TOKENS", "80"))
+BATCH_MAX_WORDS = int(os.environ.get("ANANSI_MORPHOLOGY_BATCH_MAX_WORDS", "200"))
+BATCH_WORKERS = int(os.environ.get("ANANSI_MORPHOLOGY_BATCH_WORKERS", "4"))
+
+# Punctuation a selection drags along ("casas,", "¿Dónde", "(word)").
+_EDGE_PUNCTUATION = "\"'“”‘’«»()[]{}¿?¡!.,;:…-–—"
+# Words of a selected phrase, keeping hyphenated words and elisions whole.
+_WORD = re.compile(r"\w+(?:[-'’]\w+)*")
+
+
+def normalize_word(word):
+    """
+    Normalizes a selected word for keying: Unicode NFC, surrounding
+    whitespace and punctuation removed, collapsed inner whitespace. Case is
+    kept, since it can change the word ("Turkey", "turkey").
+    """
+    word = unicodedata.normalize("NFC", word or "")
+    return " ".join(word.split()).strip(_EDGE_PUNCTUATION).strip()
+
+
+def words_of(text):
+    """
+    Returns the words of a selected phrase, in order.
+    """
+    return [match.group(0) for match in _WORD.finditer(text or "") if not match.group(0).isdigit()]
+
+
+def morphology_key(word, language, template):
+    """
+    Builds the key of one word's analysis.
+
+    :param template: The morphology prompt template; its hash is the prompt version
+    """
+    parts = [normalize_word(word), (language or "").strip().lower(), prompt_hash(template)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Returns the process-wide morphology store, or None when it is disabled.
+    """
+    global _store
+    if not MORPHOLOGY_CACHE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TieredCache(DEFAULT_MAX_BYTES, DEFAULT_DB_PATH, TABLE)
+    return _store
+
+
+def lookup(word, language, template):
+    """
+    Looks up the stored analysis of *word*.
+
+    :return: (analysis text or None, status: "memory", "disk", "miss" or "disabled")
+    """
+    store = get_store()
+    if store is None:
+        return None, "disabled"
+    value, status = store.get(morphology_key(word, language, template))
+    if value is None:
+        return None, status
+    return value["analysis"], status
+
+
+def remember(word, language, template, analysis):
+    """
+    Stores the analysis of *word*, unless the store is disabled or it is empty.
+    """
+    store = get_store()
+    if store is not None and analysis:
+        store.set(morphology_key(word, language, template), TABLE,
+                  {"word": normalize_word(word), "analysis": analysis})
+
+
+def morphology_stats():
+    store = get_store()
+    return store.stats() if store else None
+
+
+# -------------------- Batching --------------------
+
+def pack_words(words, budget=None):
+    """
+    Splits *words* into batches, in order, each within the token budget of
+    one call (the word plus ANSWER_TOKENS per word). A batch holds at least
+    one word.
+
+    :param budget: Tokens per batch (default BATCH_TOKENS)
+    """
+    budget = budget or BATCH_TOKENS
+    batches = []
+    batch, used = [], 0
+    for word in words:
+        cost = count_tokens(word) + ANSWER_TOKENS
+        if batch and used + cost > budget:
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(word)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# -------------------- Pre-warming --------------------
+
+def read_frequency_list(path, top=None):
+    """
+    Returns the distinct normalized words of a frequency list in file order.
+    Lines are "word" or "word <count>"; blank lines and "#" comments are skipped.
+    """
+    words = []
+    seen = set()
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            word = normalize_word(line.split()[0])
+            if word and word not in seen:
+                seen.add(word)
+                words.append(word)
+                if top and len(words) >= top:
+                    break
+    return words
+
+
+def warm(words, language, workers=4, progress=None):
+    """
+    Analyzes the words of *words* that are not stored yet, in batched calls.
+
+    :param progress: Called with (done, total, failed) words after each batch
+    :return: dict with total, cached, analyzed and failed counts
+    """
+    from temporal_reasoning import MORPHOLOGY_PROMPTS, analyze_words_morphology
+
+    pending = [word for word in words if lookup(word, language, MORPHOLOGY_PROMPTS)[0] is None]
+    counts = {"total": len(words), "cached": len(words) - len(pending), "analyzed": 0, "failed": 0}
+
+    def analyze(batch):
+        try:
+            return batch, analyze_words_morphology(batch, language)
+        except Exception:
+            return batch, {}
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for batch, analyses in pool.map(analyze, pack_words(pending)):
+            analyzed = sum(1 for word in batch if analyses.get(normalize_word(word)))
+            counts["analyzed"] += analyzed
+            counts["failed"] += len(batch) - analyzed
+            if progress:
+                progress(counts["analyzed"] + counts["failed"], len(pending), counts["failed"])
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the persistent morphology store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm_parser = commands.add_parser("warm", help="Analyze the words of a frequency list that are not stored yet")
+    warm_parser.add_argument("frequency_list", help="One word per line, most frequent first (\"word [count]\")")
+    warm_parser.add_argument("--language", default="English")
+    warm_parser.add_argument("--top", type=int, default=None, help="Only the first N words")
+    warm_parser.add_argument("--workers", type=int, default=4, help="Batches analyzed concurrently")
+    warm_parser.add_argument("--progress-every", type=float, default=5.0, help="Seconds between progress lines")
+    commands.add_parser("stats", help="Print the store's entry counts")
+    args = parser.parse_args(argv)
+
+    if get_store() is None:
+        parser.error("the morphology store is disabled (ANANSI_MORPHOLOGY_CACHE=0)")
+    if args.command == "stats":
+        print(morphology_stats())
+        return 0
+
+    words = read_frequency_list(args.frequency_list, args.top)
+    started = last_report = time.time()
+
+    def progress(done, total, failed):
+        nonlocal last_report
+        if time.time() - last_report >= args.progress_every or done == total:
+            print(f"[{done}/{total}] failed {failed} | {time.time() - started:.0f}s", file=sys.stderr)
+            last_report = time.time()
+
+    counts = warm(words, args.language, args.workers, progress)
+    print(f"{counts['total']} words: {counts['cached']} already stored, {counts['analyzed']} analyzed, "
+          f"{counts['failed']} failed", file=sys.stderr)
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
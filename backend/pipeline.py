@@ -0,0 +1,409 @@
+# pipeline.py
+"""
+Runs the three /analyze sub-analyses (events, causation, entities) and merges
+them into the unified JSON structure the frontend expects.
+
+Three execution modes are supported:
+  - "fanout"     (default) the three analyses run concurrently on a bounded
+                 thread pool, so latency is roughly that of the slowest call.
+  - "sequential" the original back-to-back behaviour, kept for comparison.
+  - "combined"   a single prompt/call (analyze_text_combined) returns every
+                 section at once and is split into the same unified shape.
+
+A failure in one analysis never cancels the others: the failed section is
+filled with its empty default and the error (an exception, or model output
+that could not be parsed) is reported under meta.errors.
+
+Each analysis is looked up in the result cache (analysis_cache) before the
+model is called; the per-analysis hit/miss status is reported under meta.cache.
+
+The events section is then annotated with the temporal expressions found
+locally in the text (timex.annotate_events()), for cached and fresh results
+alike: they are returned under "timexes" and used to normalize relative
+timeline dates and to fill temporal_references / timeline_of_events when the
+model left them empty. It also carries the text's sentence index
+("sentences", see sentences.py); events reference their sentence by id and
+are only expanded to the sentence text when the caller asks for it.
+"""
+import os
+import queue
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import temporal_reasoning as tr
+import chunking
+import routing
+import sentences
+import timex
+from analysis_cache import cached_call, lookup, store
+from artifacts import submit_in_context
+from schemas import schema_fingerprint
+
+MODES = ("fanout", "sequential", "combined")
+DEFAULT_MODE = "fanout"
+
+# One worker per sub-analysis per in-flight request; the pool is shared by all
+# Flask threads so the number of concurrent upstream calls stays bounded.
+MAX_WORKERS = int(os.environ.get("ANANSI_ANALYSIS_WORKERS", "12"))
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="analysis")
+
+
+def _empty_events():
+    return {
+        "events": [],
+        "named_entities": {
+            "persons": [],
+            "organizations": [],
+            "locations": [],
+            "institutions": [],
+            "dates": [],
+            "legal_terms": []
+        },
+        "temporal_references": [],
+        "important_notes": [],
+        "timeline_of_events": [],
+        "summary": ""
+    }
+
+
+def _empty_causation():
+    return {"events": {}, "relations": []}
+
+
+def _empty_entities():
+    return {"entity_relations": []}
+
+
+# Long documents are split into chunks analyzed in parallel (see chunking.py);
+# short ones go straight to the temporal_reasoning analyzers.
+# func: the analyzer; uses_doc_date: whether doc_date is part of its input;
+# empty: default result on failure; model (routing.fingerprint() of its route
+# table) and template: cache fingerprint (the prompts with doc_date also carry
+# the timex hints, so their rules version is part of it);
+# stream: streaming variant yielding array elements as they complete;
+# sentence_ids: whether its results reference sentence ids (see sentences.py).
+Analysis = namedtuple("Analysis", "func uses_doc_date empty model template stream sentence_ids")
+
+_TIMEX_FINGERPRINT = f"timex:{timex.RULES_VERSION}:{int(timex.HINTS_ENABLED)}"
+
+ANALYSES = {
+    "events": Analysis(chunking.analyze_text_events_chunked, True, _empty_events,
+                       routing.fingerprint("events"),
+                       tr.instructions("events") + schema_fingerprint("events") + _TIMEX_FINGERPRINT,
+                       tr.stream_text_events, True),
+    "causation": Analysis(chunking.analyze_text_causation_chunked, False, _empty_causation,
+                          routing.fingerprint("causation"), tr.instructions("causation") + schema_fingerprint("causation"),
+                          tr.stream_text_causation, False),
+    "entities": Analysis(chunking.analyze_text_entities_chunked, False, _empty_entities,
+                         routing.fingerprint("entities"), tr.instructions("entities") + schema_fingerprint("entities"),
+                         tr.stream_text_entities, False),
+}
+
+COMBINED = Analysis(chunking.analyze_text_combined_chunked, True, dict,
+                    routing.fingerprint("combined"),
+                    tr.instructions("combined") + schema_fingerprint("combined") + _TIMEX_FINGERPRINT, None, True)
+
+
+def _args_and_key(analysis, input_text, doc_date, language):
+    """
+    :return: (positional args for the analyzer, cache key fields)
+    """
+    if analysis.uses_doc_date:
+        args = (input_text, doc_date, language)
+    else:
+        args = (input_text, language)
+        # doc_date does not influence this analysis, so keep it out of the key.
+        doc_date = ""
+    key_fields = {
+        "input_text": input_text,
+        "doc_date": doc_date,
+        "language": language,
+        "model": analysis.model,
+        "template": analysis.template,
+    }
+    if analysis.sentence_ids and sentences.SENTENCE_IDS:
+        # The ids depend on where sentences break, which the normalized text
+        # does not show.
+        key_fields["sentences"] = sentences.fingerprint(input_text)
+    return args, key_fields
+
+
+def _call_analysis(name, analysis, input_text, doc_date, language, use_cache):
+    """
+    Calls one analyzer, through the result cache unless use_cache is False.
+
+    :return: (result dict, cache status)
+    """
+    args, key_fields = _args_and_key(analysis, input_text, doc_date, language)
+    if not use_cache:
+        return analysis.func(*args), "bypass"
+    return cached_call(name, analysis.func, args, key_fields)
+
+
+def _result_error(result):
+    # Analyzers report unparseable model output as an "error" string inside an
+    # otherwise empty result; surface its first line as the section's error.
+    if isinstance(result, dict) and result.get("error"):
+        return str(result["error"]).split("\n", 1)[0]
+    return None
+
+
+def _annotate(name, result, input_text, doc_date, language):
+    # Only the events section carries dates and sentences.
+    if name != "events":
+        return result
+    annotated = timex.annotate_events(result, input_text, doc_date, language)
+    annotated["sentences"] = sentences.segment(input_text)
+    return annotated
+
+
+def _timed_combined_call(input_text, doc_date, language, use_cache=True):
+    """
+    Runs analyze_text_combined and splits its answer into the three per-analysis
+    results, so the rest of the pipeline does not care which mode produced them.
+
+    :return: dict of name -> (result dict, elapsed seconds, error string or None,
+             cache status)
+    """
+    start = time.perf_counter()
+    try:
+        combined, cache_status = _call_analysis("combined", COMBINED, input_text, doc_date, language, use_cache)
+        error = _result_error(combined)
+    except Exception as exc:
+        combined, cache_status = {}, "miss"
+        error = f"{type(exc).__name__}: {exc}"
+    elapsed = time.perf_counter() - start
+
+    results = _empty_events()
+    results.update({k: v for k, v in combined.items() if k not in ("event_relations", "entity_relations", "error", "warning")})
+    causation_analysis = combined.get("event_relations") or _empty_causation()
+    entity_relations = {"entity_relations": combined.get("entity_relations", [])}
+    if combined.get("warning"):
+        # A truncated combined answer affects every section it produced.
+        for result in (results, causation_analysis, entity_relations):
+            result["warning"] = combined["warning"]
+    results = _annotate("events", results, input_text, doc_date, language)
+    return {
+        "events": (results, elapsed, error, cache_status),
+        "causation": (causation_analysis, elapsed, error, cache_status),
+        "entities": (entity_relations, elapsed, error, cache_status),
+    }
+
+
+def _timed_call(name, input_text, doc_date, language, use_cache=True):
+    """
+    Runs a single analysis and never raises.
+
+    :return: (result dict, elapsed seconds, error string or None, cache status)
+    """
+    analysis = ANALYSES[name]
+    start = time.perf_counter()
+    try:
+        result, cache_status = _call_analysis(name, analysis, input_text, doc_date, language, use_cache)
+        error = _result_error(result)
+    except Exception as exc:
+        result, cache_status = analysis.empty(), "miss"
+        error = f"{type(exc).__name__}: {exc}"
+    result = _annotate(name, result, input_text, doc_date, language)
+    return result, time.perf_counter() - start, error, cache_status
+
+
+def section_payload(name, result, expand_text=None):
+    """
+    Returns the slice of the unified JSON that analysis *name* contributes.
+
+    :param expand_text: The analyzed text, to write each event's sentence out
+                        next to its sentence_id; None leaves only the ids
+    """
+    if name == "events":
+        events = result.get("events", [])
+        if expand_text is not None:
+            events = sentences.expand_events(events, expand_text, result.get("sentences"))
+        return {
+            "events": events,
+            "named_entities": result.get("named_entities", {}),
+            "temporal_references": result.get("temporal_references", []),
+            "important_notes": result.get("important_notes", []),
+            "timeline_of_events": result.get("timeline_of_events", []),
+            "summary": result.get("summary", ""),
+            "timexes": result.get("timexes", []),
+            "sentences": result.get("sentences", []),
+        }
+    if name == "causation":
+        # Structured event-to-event relations (causation, temporal ordering, etc.)
+        # The analyze_text_causation() format returns {
+        #   "events": { "e1": "…", ... },
+        #   "relations": [ { "source": "e1", "target": "e2", "type": "CAUSES" }, ... ]
+        # }
+        # We expose this unaltered under the key `event_relations` for the frontend.
+        return {"event_relations": result}
+    if name == "entities":
+        # Entity-to-entity relations extracted by analyze_text_entities()
+        return {"entity_relations": result.get("entity_relations", [])}
+    raise KeyError(name)
+
+
+def _check_names(names):
+    unknown = [name for name in names if name not in ANALYSES]
+    if unknown:
+        raise ValueError(f"Unknown analysis: {', '.join(unknown)} (expected some of {', '.join(ANALYSES)})")
+
+
+def iter_outcomes(input_text, doc_date, language, mode=DEFAULT_MODE, use_cache=True, names=None):
+    """
+    Runs the analyses and yields (name, outcome) pairs in completion order,
+    where outcome is (result dict, elapsed seconds, error or None, cache status).
+
+    In fanout mode the fastest analysis is yielded first; in combined mode all
+    three are yielded together once the single call returns.
+
+    :param names: Optional subset of ANALYSES to run (ignored in combined mode,
+                  where one call always produces every section).
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown analysis mode: {mode!r} (expected one of {', '.join(MODES)})")
+    names = list(names or ANALYSES)
+    _check_names(names)
+
+    if mode == "combined":
+        yield from _timed_combined_call(input_text, doc_date, language, use_cache).items()
+    elif mode == "sequential":
+        for name in names:
+            yield name, _timed_call(name, input_text, doc_date, language, use_cache)
+    else:
+        futures = {
+            submit_in_context(_executor, _timed_call, name, input_text, doc_date, language, use_cache): name
+            for name in names
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def iter_stream_outcomes(input_text, doc_date, language, use_cache=True, names=None):
+    """
+    Fanout variant that streams the model output. Yields, as they happen:
+
+      ("item", name, key, element)   an element of an array (key is e.g.
+                                     "events" or "relations") has completed
+      ("section", name, outcome)     analysis *name* has finished; outcome is
+                                     the same tuple iter_outcomes() yields
+
+    Cache hits and documents long enough to be chunked produce no items, only
+    their section.
+    """
+    names = list(names or ANALYSES)
+    _check_names(names)
+    messages = queue.Queue()
+    chunked = len(chunking.chunk_text(input_text)) > 1
+
+    def run(name):
+        analysis = ANALYSES[name]
+        start = time.perf_counter()
+        cache_status = "bypass"
+        try:
+            args, key_fields = _args_and_key(analysis, input_text, doc_date, language)
+            result = None
+            if use_cache:
+                result, cache_status = lookup(name, key_fields)
+            if result is None:
+                if chunked:
+                    result = analysis.func(*args)
+                else:
+                    for key, element in analysis.stream(*args):
+                        if key is None:
+                            result = element
+                        else:
+                            messages.put(("item", name, key, element))
+                if use_cache:
+                    store(name, key_fields, result)
+            error = _result_error(result)
+        except Exception as exc:
+            result = analysis.empty()
+            error = f"{type(exc).__name__}: {exc}"
+        result = _annotate(name, result, input_text, doc_date, language)
+        messages.put(("section", name, (result, time.perf_counter() - start, error, cache_status)))
+
+    for name in names:
+        submit_in_context(_executor, run, name)
+    remaining = len(names)
+    while remaining:
+        message = messages.get()
+        if message[0] == "section":
+            remaining -= 1
+        yield message
+
+
+def _section_status(outcome):
+    result, _, error, _ = outcome
+    if error:
+        return "error"
+    if isinstance(result, dict) and result.get("warning"):
+        return "salvaged"
+    return "ok"
+
+
+def build_meta(mode, outcomes, total_time):
+    """
+    Builds the "meta" entry (timings, errors, cache status) from the outcomes.
+
+    "sections" flags each analysis "ok", "error" (its sections are empty or
+    incomplete because of the error in "errors") or "salvaged" (the model's
+    answer was truncated and only its complete part is included); "partial"
+    is true unless every analysis is "ok".
+    """
+    sections = {name: _section_status(outcome) for name, outcome in outcomes.items()}
+    meta = {
+        "mode": mode,
+        "timings": {name: round(outcome[1], 3) for name, outcome in outcomes.items()},
+        "total_time": round(total_time, 3),
+        "errors": {name: outcome[2] for name, outcome in outcomes.items() if outcome[2]},
+        "cache": {name: outcome[3] for name, outcome in outcomes.items()},
+        "sections": sections,
+        "partial": any(status != "ok" for status in sections.values()),
+    }
+    if mode == "combined":
+        # One call produced every section, so a single timing is the honest figure.
+        meta["timings"] = {"combined": round(outcomes["events"][1], 3)}
+        meta["cache"] = {"combined": outcomes["events"][3]}
+    return meta
+
+
+def run_analyses(input_text, doc_date, language, mode=DEFAULT_MODE, use_cache=True, on_progress=None,
+                 names=None, expand_sentences=False):
+    """
+    Runs the events, causation and entity analyses and returns the unified JSON.
+
+    :param input_text: The text to analyze
+    :param doc_date: The document date string (may be empty)
+    :param language: Language the analysis should be written in
+    :param mode: "fanout", "sequential" or "combined"
+    :param use_cache: Whether to consult and fill the result cache
+    :param on_progress: Optional callback(name, error) invoked as each analysis
+                        finishes ("combined" in combined mode); error is None
+                        on success.
+    :param names: Optional subset of ANALYSES to run; only their sections
+                  appear in the result.
+    :param expand_sentences: Whether events carry their sentence's text and
+                             offsets, not only its id
+    :return: The unified JSON dict, with a "meta" entry holding the mode,
+             per-analysis timings (seconds), errors and cache status.
+    """
+    start = time.perf_counter()
+    outcomes = {}
+    for name, outcome in iter_outcomes(input_text, doc_date, language, mode, use_cache, names):
+        outcomes[name] = outcome
+        if on_progress is not None and mode != "combined":
+            on_progress(name, outcome[2])
+    if on_progress is not None and mode == "combined":
+        on_progress("combined", outcomes["events"][2])
+
+    # Merge the per-analysis results into the unified structure, in a stable
+    # key order whatever order the analyses finished in.
+    unified_json = {}
+    for name in ANALYSES:
+        if name in outcomes:
+            unified_json.update(section_payload(name, outcomes[name][0],
+                                                input_text if expand_sentences else None))
+    unified_json["meta"] = build_meta(mode, outcomes, time.perf_counter() - start)
+    return unified_json
@@ -0,0 +1,446 @@
+# pos_tagger.py
+"""
+Local part-of-speech tagger (Universal POS tags) for English and Spanish: an
+averaged perceptron with greedy left-to-right decoding, in the style of the
+classic "200 lines of Python" tagger.
+
+/analyze_pos asks the model by default; this tagger is opt-in (engine=local)
+and answers when the model call fails. The bundled seed model is rough: on a
+small hand-tagged held-out set it tags about 86% of English and 90% of
+Spanish tokens correctly, mostly missing words it has not seen. Train a model
+on a treebank (below) before relying on it.
+
+Models, per language code ("en", "es"):
+  - <model dir>/<code>.json, if present: a model trained with
+        python pos_tagger.py train en_ewt-ud-train.conllu --language en -o pos_models/en.json
+    on a Universal Dependencies treebank (CoNLL-U: the FORM and UPOS columns)
+  - otherwise the bundled seed corpus pos_models/<code>.seed, a few hundred
+    hand-tagged tokens plus the closed-class lexicons below, trained in
+    memory on first use (well under a second)
+
+Frequent words whose tag never varies in training (and the closed-class
+words) are looked up in a tag dictionary instead of being scored, which is
+also what makes the tagger fast.
+
+    python pos_tagger.py tag --language es "Ayer me encontré con Migue."
+    python pos_tagger.py evaluate es_ancora-ud-test.conllu --language es
+    python pos_tagger.py benchmark --language en
+
+Tunables (environment variables):
+  ANANSI_POS_ENGINE      default engine of /analyze_pos, "llm" or "local" (default "llm")
+  ANANSI_POS_MODEL_DIR   directory of trained <code>.json models (default pos_models/ next to this module)
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sentences import sentence_spans
+
+ENGINES = ("local", "llm")
+DEFAULT_ENGINE = os.environ.get("ANANSI_POS_ENGINE", "llm")
+if DEFAULT_ENGINE not in ENGINES:
+    raise ValueError(f"ANANSI_POS_ENGINE must be one of {', '.join(ENGINES)}, not {DEFAULT_ENGINE!r}")
+
+SEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pos_models")
+MODEL_DIR = os.environ.get("ANANSI_POS_MODEL_DIR", SEED_DIR)
+
+LANGUAGE_CODES = {"english": "en", "en": "en", "spanish": "es", "español": "es", "espanol": "es", "es": "es"}
+
+# Closed-class words with a single tag, added to the tag dictionary of every
+# model of the language.
+LEXICONS = {
+    "en": {
+        "DET": "the a an every each",
+        "ADP": "of at by with from into during without within among between through under against "
+               "despite towards toward upon via",
+        "PRON": "i you he she we they me him her us them my your his its our their myself yourself "
+                "himself herself itself ourselves themselves mine yours someone anyone everyone nobody "
+                "nothing something everything",
+        "CCONJ": "and or but nor",
+        "SCONJ": "because although though whether unless",
+        "AUX": "is are was were am be been being will would can could should might must 'll 'm 're 've 'd ca wo",
+        "PART": "not n't",
+        "NUM": "two three four five six seven eight nine ten eleven twelve twenty thirty hundred thousand",
+        "INTJ": "oh wow hello",
+    },
+    "es": {
+        "DET": "el un una unos unas mi mis tu tus su sus nuestro nuestra nuestros nuestras cada",
+        "ADP": "de en con por para sin sobre desde hasta entre hacia tras durante según contra ante bajo "
+               "mediante del al a",
+        "PRON": "yo tú él ella nosotros nosotras vosotros ellos ellas usted ustedes me te se nos os le les "
+                "nadie alguien nada algo",
+        "CCONJ": "y e o u pero ni sino",
+        "SCONJ": "porque aunque si cuando",
+        "ADV": "no muy también ya siempre nunca ayer hoy aquí allí ahora después antes luego",
+        "AUX": "he has ha hemos han había habían habría hubiera es son era eran será sido",
+        "NUM": "dos tres cuatro cinco seis siete ocho nueve diez once doce veinte treinta cien mil",
+        "INTJ": "ay oh hola vaya",
+    },
+}
+
+_TOKEN = re.compile(r"""
+    (?:[A-Za-z]\.){2,}                                          # a.m., U.S.
+  | (?:Mr|Mrs|Ms|Dr|Dra|Prof|Sr|Sra|Srta|Jr|St)\.(?=\s)         # titles
+  | \d+(?:[.,:]\d+)*                                            # numbers and times
+  | \w+(?=n['’]t\b)                                             # do|n't, ca|n't
+  | n['’]t\b
+  | ['’](?:s|re|ve|ll|d|m)\b                                    # English clitics
+  | \w+(?:-\w+)*                                                # words
+  | [^\w\s]                                                     # punctuation and symbols
+""", re.IGNORECASE | re.VERBOSE)
+
+_START = ("-START-", "-START2-")
+_END = ("-END-", "-END2-")
+
+
+def language_code(language):
+    """
+    Returns the model code of *language* ("English" -> "en"); languages
+    without a model use the English one.
+    """
+    return LANGUAGE_CODES.get(str(language or "").strip().lower(), "en")
+
+
+def tokenize(text):
+    """
+    Splits *text* into sentences of tokens: [[token, ...], ...].
+    """
+    return [tokens for tokens in (_TOKEN.findall(text[start:end]) for start, end in sentence_spans(text or ""))
+            if tokens]
+
+
+# -------------------- Averaged perceptron --------------------
+
+class AveragedPerceptron:
+    """
+    Multi-class perceptron whose final weights are averaged over every
+    training step, which makes it much less sensitive to the order of the
+    training examples.
+    """
+
+    def __init__(self):
+        self.weights = {}
+        self.classes = set()
+        self._totals = defaultdict(float)
+        self._timestamps = defaultdict(int)
+        self.instances = 0
+
+    def predict(self, features):
+        scores = defaultdict(float)
+        weights = self.weights
+        for feature in features:
+            feature_weights = weights.get(feature)
+            if feature_weights is None:
+                continue
+            for label, weight in feature_weights.items():
+                scores[label] += weight
+        # Ties are broken by label so that predictions are deterministic.
+        return max(self.classes, key=lambda label: (scores[label], label))
+
+    def update(self, truth, guess, features):
+        self.instances += 1
+        if truth == guess:
+            return
+        for feature in features:
+            feature_weights = self.weights.setdefault(feature, {})
+            for label, change in ((truth, 1.0), (guess, -1.0)):
+                key = (feature, label)
+                weight = feature_weights.get(label, 0.0)
+                self._totals[key] += (self.instances - self._timestamps[key]) * weight
+                self._timestamps[key] = self.instances
+                feature_weights[label] = weight + change
+
+    def average(self):
+        for feature, feature_weights in self.weights.items():
+            averaged = {}
+            for label, weight in feature_weights.items():
+                key = (feature, label)
+                total = self._totals[key] + (self.instances - self._timestamps[key]) * weight
+                value = round(total / self.instances, 3)
+                if value:
+                    averaged[label] = value
+            self.weights[feature] = averaged
+        self.weights = {feature: weights for feature, weights in self.weights.items() if weights}
+        self._totals.clear()
+        self._timestamps.clear()
+
+
+# -------------------- Tagger --------------------
+
+def _normalize(word):
+    if word[0].isdigit():
+        return "!YEAR" if len(word) == 4 and word.isdigit() else "!DIGITS"
+    if "-" in word[1:]:
+        return "!HYPHEN"
+    return word.lower()
+
+
+def _shape(word):
+    if word[0].isdigit():
+        return "d"
+    if not word[0].isalpha():
+        return "p"
+    if word.isupper() and len(word) > 1:
+        return "X"
+    return "Xx" if word[0].isupper() else "x"
+
+
+def _features(i, word, context, shapes, prev, prev2):
+    """
+    Features of token *i* (*context* is padded with two start and end
+    markers, so context[i + 2] is the token itself).
+    """
+    position = i + 2
+    first = "first" if i == 0 else "inner"
+    return (
+        "bias",
+        "i suffix " + word[-3:],
+        "i suffix2 " + word[-2:],
+        "i suffix4 " + word[-4:],
+        "i pref1 " + word[0],
+        "i shape " + shapes[i] + " " + first,
+        "i-1 tag " + prev,
+        "i-2 tag " + prev2,
+        "i tag+i-2 tag " + prev + " " + prev2,
+        "i word " + word,
+        "i-1 tag+i word " + prev + " " + word,
+        "i-1 word " + context[position - 1],
+        "i-1 suffix " + context[position - 1][-3:],
+        "i-2 word " + context[position - 2],
+        "i+1 word " + context[position + 1],
+        "i+1 suffix " + context[position + 1][-3:],
+        "i+2 word " + context[position + 2],
+    )
+
+
+class PerceptronTagger:
+    """
+    Greedy averaged-perceptron tagger. tag() takes one tokenized sentence.
+    """
+
+    def __init__(self, language="en"):
+        self.language = language
+        self.model = AveragedPerceptron()
+        self.tagdict = {}
+
+    def tag(self, tokens):
+        """
+        :return: list of UPOS tags, one per token
+        """
+        context = _START + tuple(_normalize(token) for token in tokens) + _END
+        shapes = [_shape(token) for token in tokens]
+        prev, prev2 = _START
+        tags = []
+        tagdict, predict = self.tagdict, self.model.predict
+        for i, token in enumerate(tokens):
+            word = context[i + 2]
+            tag = tagdict.get(word)
+            if tag is None:
+                tag = predict(_features(i, word, context, shapes, prev, prev2))
+            tags.append(tag)
+            prev2, prev = prev, tag
+        return tags
+
+    def train(self, sentences, iterations=10, min_freq=20, ambiguity=0.97, seed=0):
+        """
+        Trains on [([token, ...], [tag, ...]), ...].
+
+        :param min_freq: Occurrences for a word to enter the tag dictionary
+        :param ambiguity: Share of its most common tag it needs
+        """
+        self._build_tagdict(sentences, min_freq, ambiguity)
+        self.model.classes = {tag for _, tags in sentences for tag in tags}
+        sentences = list(sentences)
+        shuffle = random.Random(seed).shuffle
+        for _ in range(iterations):
+            for tokens, tags in sentences:
+                context = _START + tuple(_normalize(token) for token in tokens) + _END
+                shapes = [_shape(token) for token in tokens]
+                prev, prev2 = _START
+                for i, truth in enumerate(tags):
+                    # Every token is learned from, tag dictionary words
+                    # included: their suffixes and contexts are what unseen
+                    # words are tagged by.
+                    features = _features(i, context[i + 2], context, shapes, prev, prev2)
+                    guess = self.model.predict(features)
+                    self.model.update(truth, guess, features)
+                    prev2, prev = prev, self.tagdict.get(context[i + 2], guess)
+            shuffle(sentences)
+        self.model.average()
+
+    def _build_tagdict(self, sentences, min_freq, ambiguity):
+        counts = defaultdict(lambda: defaultdict(int))
+        for tokens, tags in sentences:
+            for token, tag in zip(tokens, tags):
+                counts[_normalize(token)][tag] += 1
+        self.tagdict = {}
+        for word, tag_counts in counts.items():
+            tag, mode = max(tag_counts.items(), key=lambda item: (item[1], item[0]))
+            total = sum(tag_counts.values())
+            if total >= min_freq and mode / total >= ambiguity:
+                self.tagdict[word] = tag
+        for tag, words in LEXICONS.get(self.language, {}).items():
+            for word in words.split():
+                self.tagdict[word] = tag
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump({"language": self.language, "classes": sorted(self.model.classes),
+                       "tagdict": self.tagdict, "weights": self.model.weights}, handle, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        tagger = cls(data["language"])
+        tagger.model.weights = data["weights"]
+        tagger.model.classes = set(data["classes"])
+        tagger.tagdict = data["tagdict"]
+        return tagger
+
+
+# -------------------- Corpora --------------------
+
+def read_seed(path):
+    """
+    Reads a seed corpus: one sentence per line of word/TAG tokens.
+    """
+    sentences = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            pairs = [token.rsplit("/", 1) for token in line.split()]
+            sentences.append(([word for word, _ in pairs], [tag for _, tag in pairs]))
+    return sentences
+
+
+def read_conllu(path):
+    """
+    Reads the FORM and UPOS columns of a CoNLL-U file, skipping multiword
+    token ranges and empty nodes.
+    """
+    sentences, tokens, tags = [], [], []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.rstrip("\n")
+            if not line:
+                if tokens:
+                    sentences.append((tokens, tags))
+                tokens, tags = [], []
+                continue
+            if line.startswith("#"):
+                continue
+            columns = line.split("\t")
+            if len(columns) < 4 or not columns[0].isdigit():
+                continue
+            tokens.append(columns[1])
+            tags.append(columns[3])
+    if tokens:
+        sentences.append((tokens, tags))
+    return sentences
+
+
+# -------------------- Loading and tagging --------------------
+
+_taggers = {}
+_taggers_lock = threading.Lock()
+
+
+def get_tagger(language):
+    """
+    Returns the tagger of *language*, loading or training it on first use.
+    """
+    code = language_code(language)
+    tagger = _taggers.get(code)
+    if tagger is not None:
+        return tagger
+    with _taggers_lock:
+        tagger = _taggers.get(code)
+        if tagger is None:
+            path = os.path.join(MODEL_DIR, f"{code}.json")
+            if os.path.exists(path):
+                tagger = PerceptronTagger.load(path)
+            else:
+                tagger = PerceptronTagger(code)
+                tagger.train(read_seed(os.path.join(SEED_DIR, f"{code}.seed")), min_freq=1)
+            _taggers[code] = tagger
+    return tagger
+
+
+def tag_text(text, language="English"):
+    """
+    Tags *text* in the /analyze_pos answer format.
+
+    :return: [{"token": ..., "pos": ...}, ...]
+    """
+    tagger = get_tagger(language)
+    return [{"token": token, "pos": tag}
+            for tokens in tokenize(text) for token, tag in zip(tokens, tagger.tag(tokens))]
+
+
+# -------------------- Command line --------------------
+
+def _accuracy(tagger, sentences):
+    correct = total = 0
+    for tokens, tags in sentences:
+        correct += sum(guess == truth for guess, truth in zip(tagger.tag(tokens), tags))
+        total += len(tags)
+    return correct / total if total else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train, evaluate and run the local part-of-speech tagger.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="Train a model on CoNLL-U files")
+    train.add_argument("corpus", nargs="+", help="CoNLL-U training files")
+    train.add_argument("--language", required=True, help="Language code or name")
+    train.add_argument("-o", "--output", required=True, help="Model file to write (<model dir>/<code>.json to use it)")
+    train.add_argument("--iterations", type=int, default=10)
+    train.add_argument("--min-freq", type=int, default=20, help="Occurrences for the tag dictionary")
+    evaluate = commands.add_parser("evaluate", help="Report the accuracy of the current model on CoNLL-U files")
+    evaluate.add_argument("corpus", nargs="+")
+    evaluate.add_argument("--language", required=True)
+    tag = commands.add_parser("tag", help="Tag a text")
+    tag.add_argument("text")
+    tag.add_argument("--language", default="English")
+    benchmark = commands.add_parser("benchmark", help="Measure tagging throughput")
+    benchmark.add_argument("--language", default="English")
+    benchmark.add_argument("--tokens", type=int, default=200000)
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        sentences = [sentence for path in args.corpus for sentence in read_conllu(path)]
+        tagger = PerceptronTagger(language_code(args.language))
+        start = time.perf_counter()
+        tagger.train(sentences, args.iterations, args.min_freq)
+        tagger.save(args.output)
+        print(f"trained on {sum(len(tags) for _, tags in sentences)} tokens in "
+              f"{time.perf_counter() - start:.1f}s -> {args.output}")
+    elif args.command == "evaluate":
+        sentences = [sentence for path in args.corpus for sentence in read_conllu(path)]
+        print(f"accuracy {_accuracy(get_tagger(args.language), sentences):.4f} "
+              f"on {sum(len(tags) for _, tags in sentences)} tokens")
+    elif args.command == "tag":
+        print(" ".join(f"{item['token']}/{item['pos']}" for item in tag_text(args.text, args.language)))
+    else:
+        sentences = [tokens for tokens, _ in read_seed(os.path.join(SEED_DIR, f"{language_code(args.language)}.seed"))]
+        tagger = get_tagger(args.language)
+        tokens = 0
+        start = time.perf_counter()
+        while tokens < args.tokens:
+            for sentence in sentences:
+                tagger.tag(sentence)
+                tokens += len(sentence)
+        elapsed = time.perf_counter() - start
+        print(f"{tokens} tokens in {elapsed:.3f}s: {tokens / elapsed / 1000:.0f} tokens/ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# resilience.py
+"""
+Retries, deadlines and circuit breaking for upstream model calls.
+
+llm_client routes every chat.completions.create() through
+call_with_retries(), which
+
+  - gives each call a deadline that depends on the analysis making it, and
+    never lets an attempt's timeout or a backoff sleep run past it
+  - retries timeouts, connection errors, 408/409/429 and 5xx responses with
+    exponential backoff and full jitter, waiting at least as long as the
+    upstream's Retry-After / retry-after-ms header asks
+  - keeps one circuit breaker per model: after enough consecutive failures
+    calls fail fast with UpstreamUnavailable for a cooldown period, then a
+    single trial call decides whether to close it again
+
+Errors that retrying cannot fix (400, 401, 404, ...) are raised at once.
+
+Tunables (environment variables):
+  ANANSI_LLM_MAX_ATTEMPTS         attempts per call, first included     (default 4)
+  ANANSI_LLM_BACKOFF_BASE         backoff before the first retry, s     (default 1)
+  ANANSI_LLM_BACKOFF_MAX          longest backoff, s                    (default 30)
+  ANANSI_LLM_DEADLINE             default deadline per call, s          (default 600)
+  ANANSI_LLM_DEADLINE_<ANALYSIS>  deadline for one analysis, e.g. ANANSI_LLM_DEADLINE_POS=60
+  ANANSI_BREAKER_THRESHOLD        consecutive failures that open it     (default 5)
+  ANANSI_BREAKER_COOLDOWN         seconds before a trial call           (default 30)
+"""
+import email.utils
+import os
+import random
+import threading
+import time
+
+import openai
+
+MAX_ATTEMPTS = int(os.environ.get("ANANSI_LLM_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE = float(os.environ.get("ANANSI_LLM_BACKOFF_BASE", "1"))
+BACKOFF_MAX = float(os.environ.get("ANANSI_LLM_BACKOFF_MAX", "30"))
+DEFAULT_DEADLINE = float(os.environ.get("ANANSI_LLM_DEADLINE", "600"))
+BREAKER_THRESHOLD = int(os.environ.get("ANANSI_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.environ.get("ANANSI_BREAKER_COOLDOWN", "30"))
+
+# Interactive, single-word or auxiliary calls should not hang as long as a
+# full reasoning-model analysis may.
+DEADLINES = {
+    "pos": 60.0,
+    "morphology": 30.0,
+    "json_repair": 60.0,
+}
+
+
+class UpstreamUnavailable(RuntimeError):
+    """
+    Raised without calling the upstream while a model's circuit is open.
+    """
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a call's deadline passes before an attempt could be made.
+    """
+
+
+def deadline_for(analysis):
+    override = os.environ.get(f"ANANSI_LLM_DEADLINE_{analysis.upper()}")
+    if override:
+        return float(override)
+    return DEADLINES.get(analysis, DEFAULT_DEADLINE)
+
+
+# -------------------- Circuit breaker --------------------
+
+class CircuitBreaker:
+    """
+    Closed -> open after *threshold* consecutive failures; open -> half-open
+    once *cooldown* seconds have passed, letting one trial call through;
+    the trial's outcome closes it or opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                return True
+            # Open, or half-open with the trial call still in flight.
+            return False
+
+    def retry_in(self):
+        with self._lock:
+            return max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def release(self):
+        """
+        Ends a call that said nothing about the upstream (it failed locally):
+        a half-open trial goes back to open, so the next call is a new trial.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.failures}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+_stats_lock = threading.Lock()
+_stats = {"retries": 0, "gave_up": 0, "rejected": 0}
+
+
+def get_breaker(model):
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = _breakers[model] = CircuitBreaker()
+        return breaker
+
+
+def _bump(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def resilience_stats():
+    """
+    Returns retry counters and the state of each model's circuit breaker.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    stats["breakers"] = {model: breaker.snapshot() for model, breaker in breakers.items()}
+    return stats
+
+
+# -------------------- Retries --------------------
+
+def is_retryable(exc):
+    if isinstance(exc, openai.APIConnectionError):
+        # Includes APITimeoutError.
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code in (408, 409, 429) or exc.status_code >= 500
+    return False
+
+
+def retry_after(exc):
+    """
+    Returns the delay in seconds the upstream asked for, or None.
+    """
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    milliseconds = response.headers.get("retry-after-ms")
+    if milliseconds:
+        try:
+            return float(milliseconds) / 1000.0
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, exc=None):
+    """
+    Full-jitter exponential backoff before retry number *attempt* (1-based),
+    never shorter than the upstream's Retry-After.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+    requested = retry_after(exc) if exc is not None else None
+    if requested is not None:
+        delay = max(delay, requested)
+    return delay
+
+
+def call_with_retries(analysis, model, attempt):
+    """
+    Runs *attempt* until it succeeds, fails with a non-retryable error, runs
+    out of attempts or would overrun the deadline of *analysis*.
+
+    :param analysis: Name of the calling analysis (selects the deadline)
+    :param model: Model name (selects the circuit breaker)
+    :param attempt: function(remaining_seconds) making one upstream call
+    :return: whatever *attempt* returns
+    :raises UpstreamUnavailable: if the model's circuit is open
+    :raises DeadlineExceeded: if the deadline passed before an attempt
+    """
+    deadline = time.monotonic() + deadline_for(analysis)
+    breaker = get_breaker(model)
+    number = 0
+    while True:
+        number += 1
+        if not breaker.allow():
+            _bump("rejected")
+            raise UpstreamUnavailable(
+                f"Upstream for {model} is failing; not retrying for another {breaker.retry_in():.0f}s")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            # allow() may have admitted this as the half-open trial.
+            breaker.record_failure()
+            raise DeadlineExceeded(f"{analysis}: deadline of {deadline_for(analysis):.0f}s exceeded")
+        try:
+            result = attempt(remaining)
+        except Exception as exc:
+            if not is_retryable(exc):
+                if isinstance(exc, openai.APIStatusError):
+                    # The upstream answered, so it is not degraded.
+                    breaker.record_success()
+                else:
+                    # A local error (e.g. a bug in *attempt*) says nothing
+                    # about the upstream.
+                    breaker.release()
+                raise
+            breaker.record_failure()
+            delay = backoff_delay(number, exc)
+            if number >= MAX_ATTEMPTS or time.monotonic() + delay >= deadline:
+                _bump("gave_up")
+                raise
+            _bump("retries")
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
@@ -0,0 +1,177 @@
+# routing.py
+"""
+Per-analysis model and reasoning-effort routing.
+
+Every model call picks a route: an (analysis, tier) pair that resolves to a
+model and an optional reasoning_effort. There are two tiers:
+
+  fast     short inputs in a language the prompts are tuned for
+  strong   everything else (long inputs, other languages)
+
+Each call's route, latency and tokens are recorded (route_stats(), shown in
+/stats) so the thresholds and the route table can be tuned against real
+traffic.
+
+Tunables (environment variables):
+  ANANSI_ROUTE_FAST_MAX_TOKENS   longest input (tokens) sent to the fast tier  (default 600)
+  ANANSI_ROUTE_FAST_LANGUAGES    comma-separated languages eligible for the
+                                 fast tier            (default "English,Spanish,Español")
+  ANANSI_ROUTES                  JSON, or the path of a JSON file, overriding
+                                 entries of DEFAULT_ROUTES, e.g.
+                                 {"events": {"strong": {"model": "o3", "reasoning_effort": "high"}}}
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+
+from tokens import count_tokens
+
+FAST_MAX_TOKENS = int(os.environ.get("ANANSI_ROUTE_FAST_MAX_TOKENS", "600"))
+FAST_LANGUAGES = {
+    language.strip().lower()
+    for language in os.environ.get("ANANSI_ROUTE_FAST_LANGUAGES", "English,Spanish,Español").split(",")
+    if language.strip()
+}
+TIERS = ("fast", "strong")
+
+# analysis -> tier -> {"model", "reasoning_effort"}; reasoning_effort None
+# leaves it to the provider (and must be None for non-reasoning models).
+DEFAULT_ROUTES = {
+    "events": {
+        "fast": {"model": "o4-mini", "reasoning_effort": "low"},
+        "strong": {"model": "o4-mini", "reasoning_effort": "medium"},
+    },
+    "causation": {
+        "fast": {"model": "o4-mini", "reasoning_effort": "low"},
+        "strong": {"model": "o4-mini", "reasoning_effort": "medium"},
+    },
+    "entities": {
+        "fast": {"model": "o4-mini", "reasoning_effort": "low"},
+        "strong": {"model": "o4-mini", "reasoning_effort": "medium"},
+    },
+    "combined": {
+        "fast": {"model": "o4-mini", "reasoning_effort": "low"},
+        "strong": {"model": "o4-mini", "reasoning_effort": "medium"},
+    },
+    "pos": {
+        "fast": {"model": "o3-mini", "reasoning_effort": "low"},
+        "strong": {"model": "o3-mini", "reasoning_effort": "medium"},
+    },
+    "morphology": {
+        "fast": {"model": "gpt-4o-mini", "reasoning_effort": None},
+        "strong": {"model": "gpt-4o-mini", "reasoning_effort": None},
+    },
+    "morphology_batch": {
+        "fast": {"model": "gpt-4o-mini", "reasoning_effort": None},
+        "strong": {"model": "gpt-4o-mini", "reasoning_effort": None},
+    },
+}
+
+
+class Route(namedtuple("Route", "analysis tier model reasoning_effort")):
+    def kwargs(self):
+        """
+        Arguments for chat.completions.create() selecting this route.
+        """
+        if self.reasoning_effort:
+            return {"model": self.model, "reasoning_effort": self.reasoning_effort}
+        return {"model": self.model}
+
+    @property
+    def key(self):
+        return "/".join([self.analysis, self.tier, self.model, self.reasoning_effort or "default"])
+
+
+def _load_overrides():
+    raw = os.environ.get("ANANSI_ROUTES", "").strip()
+    if not raw:
+        return {}
+    if not raw.startswith("{"):
+        with open(raw, encoding="utf-8") as handle:
+            raw = handle.read()
+    return json.loads(raw)
+
+
+def _build_routes():
+    routes = {analysis: {tier: dict(route) for tier, route in tiers.items()}
+              for analysis, tiers in DEFAULT_ROUTES.items()}
+    for analysis, tiers in _load_overrides().items():
+        for tier, route in tiers.items():
+            if tier not in TIERS:
+                raise ValueError(f"ANANSI_ROUTES: unknown tier {tier!r} for {analysis!r}")
+            routes.setdefault(analysis, {}).setdefault(tier, {"model": "", "reasoning_effort": None}).update(route)
+    return routes
+
+
+ROUTES = _build_routes()
+
+
+def choose_tier(input_text, language):
+    if (language or "").strip().lower() not in FAST_LANGUAGES:
+        return "strong"
+    return "fast" if count_tokens(input_text) <= FAST_MAX_TOKENS else "strong"
+
+
+def choose_route(analysis, input_text, language):
+    """
+    Picks the route for one call of *analysis* on *input_text*.
+    """
+    tier = choose_tier(input_text, language)
+    route = ROUTES[analysis][tier]
+    return Route(analysis, tier, route["model"], route.get("reasoning_effort"))
+
+
+def fingerprint(analysis):
+    """
+    Short hash of everything that decides the route of *analysis*, for cache
+    keys: changing a model, an effort or a threshold invalidates its results.
+    """
+    payload = json.dumps([ROUTES[analysis], FAST_MAX_TOKENS, sorted(FAST_LANGUAGES)], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# -------------------- Per-route accounting --------------------
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def record(route, elapsed, usage=None, failed=False):
+    """
+    Records one call on *route*: its latency (seconds, retries included) and,
+    when it succeeded, the token usage the provider reported.
+    """
+    details = getattr(usage, "completion_tokens_details", None)
+    with _stats_lock:
+        totals = _stats.setdefault(route.key, {
+            "calls": 0,
+            "failures": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "reasoning_tokens": 0,
+        })
+        totals["calls"] += 1
+        totals["failures"] += bool(failed)
+        totals["latency_total"] += elapsed
+        totals["latency_max"] = max(totals["latency_max"], elapsed)
+        if usage is not None:
+            totals["prompt_tokens"] += usage.prompt_tokens or 0
+            totals["completion_tokens"] += usage.completion_tokens or 0
+            totals["reasoning_tokens"] += getattr(details, "reasoning_tokens", None) or 0
+
+
+def route_stats():
+    """
+    Returns per-route call counts, latency (mean and max, seconds) and tokens,
+    keyed "analysis/tier/model/reasoning_effort".
+    """
+    with _stats_lock:
+        snapshot = {key: dict(totals) for key, totals in _stats.items()}
+    for totals in snapshot.values():
+        totals["latency_mean"] = round(totals.pop("latency_total") / totals["calls"], 3)
+        totals["latency_max"] = round(totals["latency_max"], 3)
+    return snapshot
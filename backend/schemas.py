@@ -0,0 +1,359 @@
+# schemas.py
+"""
+Typed shapes of the analyzers' answers.
+
+Each analysis has a compact pydantic model that is used twice:
+
+  - as a JSON schema sent with the request (response_format), so models that
+    support structured outputs are constrained to the shape up front
+  - to validate whatever came back, at the boundary, before it reaches the
+    pipeline, the cache or the frontend
+
+Validation is lenient where it is cheap to be: missing keys get their
+defaults, unknown keys are dropped, null/number/list values of text fields
+become strings, bare strings in entity lists become {"entity": ...}, and
+array elements that are not objects are dropped (and counted) rather than
+failing the whole answer. Only an answer whose top level has the wrong type
+is rejected.
+
+Events, entity relations, POS and batched morphology use strict schemas. Causation (and the
+combined analysis, which embeds it) maps free-form event ids to phrases,
+which strict mode cannot express, so those schemas are sent non-strict.
+
+Tunables (environment variables):
+  ANANSI_STRUCTURED_OUTPUTS   "0" stops sending response_format       (default "1")
+
+Run `python benchmark_validation.py` to measure the validation overhead.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Annotated, Dict, List
+
+from pydantic import AliasChoices, BaseModel, BeforeValidator, ConfigDict, Field, ValidationError, ValidationInfo
+
+from sentences import SENTENCE_IDS
+
+STRUCTURED_OUTPUTS = os.environ.get("ANANSI_STRUCTURED_OUTPUTS", "1") != "0"
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _count(analysis, key, amount=1):
+    with _stats_lock:
+        counts = _stats.setdefault(analysis, {"validated": 0, "rejected": 0, "dropped_items": 0})
+        counts[key] += amount
+
+
+def validation_stats():
+    """
+    Returns a snapshot of validation outcomes per analysis.
+    """
+    with _stats_lock:
+        return {analysis: dict(counts) for analysis, counts in _stats.items()}
+
+
+# -------------------- Coercions --------------------
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return ", ".join(_text(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def _objects(value, info: ValidationInfo):
+    # Keeps the object elements of a list; anything else is counted and dropped.
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    kept = [item for item in value if isinstance(item, dict)]
+    if len(kept) != len(value) and info.context is not None:
+        info.context["dropped_items"] += len(value) - len(kept)
+    return kept
+
+
+def _entities(value, info: ValidationInfo):
+    # Models often list bare names for "dates" and "legal_terms".
+    if isinstance(value, list):
+        value = [{"entity": item} if isinstance(item, str) else item for item in value]
+    return _objects(value, info)
+
+
+def _texts(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [_text(item) for item in value]
+
+
+def _text_map(value):
+    if not isinstance(value, dict):
+        return {}
+    return {str(key): _text(item) for key, item in value.items()}
+
+
+Text = Annotated[str, BeforeValidator(_text)]
+TextList = Annotated[List[str], BeforeValidator(_texts)]
+TextMap = Annotated[Dict[str, str], BeforeValidator(_text_map)]
+
+
+def _list_of(model):
+    return Annotated[List[model], BeforeValidator(_objects)]
+
+
+def _object(model):
+    # A nested object that may be missing or null.
+    return Annotated[model, BeforeValidator(lambda value: value if isinstance(value, dict) else {})]
+
+
+class _Shape(BaseModel):
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
+
+
+# -------------------- Events --------------------
+
+class Event(_Shape):
+    sentence: Text = ""
+    event_type: Text = ""
+    agent: Text = ""
+    patients: Text = ""
+    temporal_reference: Text = ""
+    cause: Text = ""
+    purpose_context: Text = ""
+
+
+class SentenceRefEvent(_Shape):
+    # With sentence ids (sentences.py) the model names the sentence instead
+    # of copying it.
+    sentence_id: Text = ""
+    event_type: Text = ""
+    agent: Text = ""
+    patients: Text = ""
+    temporal_reference: Text = ""
+    cause: Text = ""
+    purpose_context: Text = ""
+
+
+class NamedEntity(_Shape):
+    entity: Text = ""
+    type: Text = ""
+    description: Text = ""
+
+
+Entities = Annotated[List[NamedEntity], BeforeValidator(_entities)]
+
+
+class NamedEntities(_Shape):
+    persons: Entities = []
+    organizations: Entities = []
+    locations: Entities = []
+    institutions: Entities = []
+    dates: Entities = []
+    legal_terms: Entities = []
+
+
+class TemporalReference(_Shape):
+    reference: Text = ""
+    description: Text = ""
+
+
+class TimelineEvent(_Shape):
+    event_summary: Text = ""
+    event_verb: Text = ""
+    temporal_reference_connection: Text = ""
+
+
+class TimelineEntry(_Shape):
+    date: Text = ""
+    events: _list_of(TimelineEvent) = []
+
+
+class EventsResult(_Shape):
+    events: _list_of(SentenceRefEvent if SENTENCE_IDS else Event) = []
+    named_entities: _object(NamedEntities) = Field(default_factory=NamedEntities)
+    temporal_references: _list_of(TemporalReference) = []
+    important_notes: TextList = []
+    timeline_of_events: _list_of(TimelineEntry) = []
+    summary: Text = ""
+
+
+# -------------------- Causation and entity relations --------------------
+
+class EventRelation(_Shape):
+    source: Text = ""
+    target: Text = ""
+    type: Text = ""
+
+
+class CausationResult(_Shape):
+    events: TextMap = {}
+    relations: _list_of(EventRelation) = []
+
+
+class EntityRelation(_Shape):
+    # Older prompts showed "source_relation" in their example; accept it.
+    source_entity: Text = Field("", validation_alias=AliasChoices("source_entity", "source_relation"))
+    target_entity: Text = ""
+    relation: Text = ""
+
+
+class EntitiesResult(_Shape):
+    entity_relations: _list_of(EntityRelation) = []
+
+
+class CombinedResult(EventsResult):
+    event_relations: _object(CausationResult) = Field(default_factory=CausationResult)
+    entity_relations: _list_of(EntityRelation) = []
+
+
+# -------------------- Part of speech --------------------
+
+class PosToken(_Shape):
+    token: Text = ""
+    pos: Text = ""
+
+
+class PosResult(_Shape):
+    # Structured outputs need an object at the top level, so the tags are
+    # wrapped; plain arrays from unconstrained models are accepted too.
+    tokens: _list_of(PosToken) = []
+
+
+# -------------------- Morphology --------------------
+
+class WordAnalysis(_Shape):
+    word: Text = ""
+    analysis: Text = ""
+
+
+class MorphologyBatchResult(_Shape):
+    analyses: _list_of(WordAnalysis) = []
+
+
+# -------------------- Registry --------------------
+
+# analysis name -> (model, strict)
+SHAPES = {
+    "events": (EventsResult, True),
+    "causation": (CausationResult, False),
+    "entities": (EntitiesResult, True),
+    "combined": (CombinedResult, False),
+    "pos": (PosResult, True),
+    "morphology_batch": (MorphologyBatchResult, True),
+}
+
+
+def _strict(node):
+    """
+    Rewrites a pydantic JSON schema into the subset strict structured outputs
+    accept: every property required, no additional properties, no defaults.
+    """
+    if isinstance(node, dict):
+        properties = node.get("properties")
+        node = {key: _strict(value) for key, value in node.items()
+                if key not in ("default", "title", "properties")}
+        if properties is not None:
+            # Property names are not keywords, so they are kept as they are.
+            node["properties"] = {key: _strict(value) for key, value in properties.items()}
+        if node.get("type") == "object" and properties is not None:
+            node["required"] = list(node["properties"])
+            node["additionalProperties"] = False
+        return node
+    if isinstance(node, list):
+        return [_strict(item) for item in node]
+    return node
+
+
+_schemas = {}
+
+
+def json_schema(analysis):
+    """
+    Returns the JSON schema sent for *analysis*, built once.
+    """
+    schema = _schemas.get(analysis)
+    if schema is None:
+        model, strict = SHAPES[analysis]
+        schema = model.model_json_schema(mode="serialization")
+        if strict:
+            schema = _strict(schema)
+        _schemas[analysis] = schema
+    return schema
+
+
+def response_format_kwargs(analysis):
+    """
+    Extra chat.completions.create() arguments that request structured output
+    for *analysis*, or {} when structured outputs are disabled.
+    """
+    if not STRUCTURED_OUTPUTS or analysis not in SHAPES:
+        return {}
+    return {"response_format": {
+        "type": "json_schema",
+        "json_schema": {
+            "name": f"{analysis}_analysis",
+            "schema": json_schema(analysis),
+            "strict": SHAPES[analysis][1],
+        },
+    }}
+
+
+def schema_fingerprint(analysis):
+    """
+    Short hash of what the output of *analysis* is validated against, for
+    cache keys: changing a shape invalidates that analysis' cached results.
+    """
+    payload = json.dumps([json_schema(analysis), STRUCTURED_OUTPUTS], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def validate(analysis, data):
+    """
+    Validates a parsed answer into its typed shape.
+
+    :param analysis: Key of SHAPES
+    :param data: The parsed JSON (for "pos", either a list or {"tokens": [...]})
+    :return: the validated model
+    :raises ValidationError: if the top level has the wrong type
+    """
+    model, _ = SHAPES[analysis]
+    if analysis == "pos" and isinstance(data, list):
+        data = {"tokens": data}
+    context = {"dropped_items": 0}
+    try:
+        validated = model.model_validate(data, context=context)
+    except ValidationError:
+        _count(analysis, "rejected")
+        raise
+    _count(analysis, "validated")
+    if context["dropped_items"]:
+        _count(analysis, "dropped_items", context["dropped_items"])
+    return validated
+
+
+def validate_result(analysis, result):
+    """
+    Validates an analyzer's result dict, keeping its "error"/"warning" notes.
+    A result that cannot be validated becomes *result* plus an "error".
+
+    :return: a plain dict in the analysis' shape
+    """
+    notes = {key: result[key] for key in ("error", "warning") if key in result}
+    try:
+        shaped = validate(analysis, result).model_dump()
+    except ValidationError as exc:
+        shaped = dict(result)
+        shaped["error"] = f"Schema validation failed: {exc.error_count()} errors"
+        return shaped
+    shaped.update(notes)
+    return shaped
@@ -0,0 +1,131 @@
+# sentences.py
+"""
+Sentence segmentation with stable ids and character offsets.
+
+Events used to repeat the full text of their sentence, once per event, so a
+sentence with five events was written out five times by the model. Instead
+the text is segmented locally before prompting, each sentence is numbered
+("[s1] ...", "[s2] ...") in the prompt, and the model answers with the
+sentence's id:
+
+  {"sentence_id": "s2", "event_type": ..., ...}
+
+The events section carries the index of the document's sentences,
+[{"id": "s1", "start": 0, "end": 27}, ...], with offsets into the submitted
+text for exact highlighting. The sentence text itself is only written back
+into the events (expand_events()) when the client asks for it
+(expand_sentences=1).
+
+Ids number the sentences of the whole document: chunked analyses renumber
+their chunk-local ids (see chunking.py). Because the ids depend on where the
+sentences break, cached results that carry them are keyed on fingerprint()
+as well as the normalized text.
+
+Tunables (environment variables):
+  ANANSI_SENTENCE_IDS   "0" goes back to the model copying each sentence (default "1")
+"""
+import hashlib
+import os
+import re
+
+SENTENCE_IDS = os.environ.get("ANANSI_SENTENCE_IDS", "1") != "0"
+
+# A sentence ends at . ! ? or … (plus closing quotes/brackets) followed by
+# whitespace and something that can open a sentence, including Spanish ¿ ¡.
+_SENTENCE_END = re.compile(r"""[.!?…]+["'”’)\]]*\s+(?=["'“‘(\[¿¡]?[A-ZÁÉÍÓÚÑÜ0-9])""")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+# Titles and abbreviations whose trailing period does not end a sentence.
+_ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "sra", "srta", "dra", "jr", "st",
+    "vs", "etc", "e.g", "i.e", "u.s", "u.k", "no", "núm", "gen", "gob", "lic", "ing",
+}
+
+
+def sentence_spans(text):
+    """
+    Returns (start, end) character offsets of each sentence in *text*, with
+    surrounding whitespace excluded. Paragraph breaks always end a sentence.
+    """
+    spans = []
+    ends = set()
+    for match in _SENTENCE_END.finditer(text):
+        preceding = text[max(match.start() - 12, 0):match.start()].rsplit(None, 1)
+        word = preceding[-1].lstrip("(\"'“‘¿¡").casefold() if preceding else ""
+        if text[match.start()] == "." and word in _ABBREVIATIONS:
+            continue
+        ends.add(match.end())
+    boundaries = sorted(ends | {m.end() for m in _PARAGRAPH_BREAK.finditer(text)})
+    start = 0
+    for end in boundaries + [len(text)]:
+        segment = text[start:end]
+        stripped = segment.strip()
+        if stripped:
+            offset = start + (len(segment) - len(segment.lstrip()))
+            spans.append((offset, offset + len(stripped)))
+        start = end
+    return spans
+
+
+def segment(text):
+    """
+    Returns the sentence index of *text*: [{"id": "s1", "start", "end"}, ...].
+    """
+    return [{"id": f"s{number}", "start": start, "end": end}
+            for number, (start, end) in enumerate(sentence_spans(text or ""), start=1)]
+
+
+def fingerprint(text):
+    """
+    Short hash of how *text* splits into sentences. Texts that normalize to
+    the same string but break differently (e.g. a paragraph break versus a
+    space) get different fingerprints.
+    """
+    pieces = [" ".join(text[start:end].split()) for start, end in sentence_spans(text or "")]
+    return hashlib.sha256("\x1f".join(pieces).encode("utf-8")).hexdigest()[:16]
+
+
+def numbered(text):
+    """
+    Returns *text* as the prompt shows it, one "[sN] sentence" per line.
+    """
+    return "\n".join(f"[{sentence['id']}] {text[sentence['start']:sentence['end']]}"
+                     for sentence in segment(text))
+
+
+def expand_events(events, text, index=None):
+    """
+    Returns copies of *events* with the referenced sentence written out:
+    "sentence" (its text, "" for an unknown id), "sentence_start" and
+    "sentence_end". Events without a "sentence_id" are returned as they are.
+
+    :param text: The text the ids refer to
+    :param index: segment(text), if the caller already has it
+    """
+    by_id = {sentence["id"]: sentence for sentence in (index if index is not None else segment(text))}
+    expanded = []
+    for event in events:
+        if not isinstance(event, dict) or "sentence_id" not in event:
+            expanded.append(event)
+            continue
+        sentence = by_id.get(str(event["sentence_id"]).strip().strip("[]"))
+        if sentence is None:
+            expanded.append(dict(event, sentence="", sentence_start=None, sentence_end=None))
+            continue
+        expanded.append(dict(event, sentence=text[sentence["start"]:sentence["end"]],
+                             sentence_start=sentence["start"], sentence_end=sentence["end"]))
+    return expanded
+
+
+def renumber_events(events, sentence_ids):
+    """
+    Maps chunk-local ids ("s1" = the chunk's first sentence) in *events* to
+    document ids, in place.
+
+    :param sentence_ids: The document id of each of the chunk's sentences
+    """
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        local = str(event.get("sentence_id", "")).strip().strip("[]")
+        if local[:1] == "s" and local[1:].isdigit() and 1 <= int(local[1:]) <= len(sentence_ids):
+            event["sentence_id"] = sentence_ids[int(local[1:]) - 1]
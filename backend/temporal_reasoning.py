@@ -1,10 +1,34 @@
 # temporal_reasoning.py
 import json
 import os
-from openai import OpenAI
-def analyze_text_entities(input_text : str, language : str):
-    instructions = """ 
-    You are an expert text analyst. You are given a text passage (one or more sentences). Your task is to perform a structured, in-depth analysis of the text and return the results in JSON format.
+from concurrent.futures import ThreadPoolExecutor
+from llm_client import chat_completion, stream_chat_completion
+from json_stream import IncrementalJSONParser
+from json_repair import parse_model_json, recover_json
+from logging_config import body_sampled, get_logger, log_to_file
+from routing import choose_route
+from schemas import response_format_kwargs, validate, validate_result
+from tokens import record as record_tokens
+from artifacts import submit_in_context
+import morphology_cache
+import pos_tagger
+import sentences
+import timex
+
+logger = get_logger("temporal_reasoning")
+
+# The model and reasoning effort of each call are chosen per input by
+# routing.choose_route() (see routing.DEFAULT_ROUTES).
+
+# -------------------- Static instruction blocks --------------------
+# Kept at module level so callers (e.g. the result cache) can fingerprint the
+# exact prompt an analysis uses.
+
+# Every analysis starts with the same sentence, byte for byte, so the
+# provider's prompt cache can share that prefix between them.
+ANALYST_PREAMBLE = "You are an expert text analyst. You are given a text passage (one or more sentences). Your task is to perform a structured, in-depth analysis of the text and return the results in JSON format."
+
+ENTITIES_INSTRUCTIONS = ANALYST_PREAMBLE + """
 In this specific case, you are tasked with understanding the causation relations between the entities mentioned in the text which include. Your answer should be presented, ONLY AND SPECIFICALLY, as a json with the following contents:
 
 The relationships we want to capture should illustrate how the entities are related to each other, for example, in the sentence:
@@ -20,44 +44,20 @@ Deliver a response like this
    "entity_relations":[
         {
              "source_entity":"",
-             "target_entity":""
+             "target_entity":"",
              "relation":""
         },
         {
-             "source_relation":"",
-             "target_entity":""
+             "source_entity":"",
+             "target_entity":"",
              "relation":""
         }
     ]
 }
-    Here is the input text: 
-    """
-    
-    instructions = instructions + f"\nHere is the input text:\n{input_text}\nIMPORTANT: MAKE SURE THE OUTPUT/ANALYSIS WRITTEN TO THE JSON IS WRITTEN IN THIS LANGUAGE: {language}\n"
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    response = client.chat.completions.create(
-        model="o4-mini",
-        messages=[{"role": "user", "content": instructions}]
-    )
-    print(response.choices[0].message.content.strip())
-    raw_answer = response.choices[0].message.content.strip()
-    raw_answer = raw_answer.replace("```json", "").replace("```", "")
-    final_json_str = raw_answer.strip()
-    print(final_json_str)
-    try:
-        analysis_json = json.loads(final_json_str)
-    except json.JSONDecodeError:
-        analysis_json = {
-            "entity_relations": [],
-            "error": "JSON parsing failed. Raw output was:\n" + final_json_str
-        }
-    return analysis_json
-    
-    
-def analyze_text_causation(input_text : str, language : str):
-    instructions = """ 
-    You are an expert text analyst. You are given a text passage (one or more sentences). Your task is to perform a structured, in-depth analysis of the text and return the results in JSON format. 
-  In this specific case, you are tasked with understanding the relations between the events using event-to-event relation types that researchers, information-extraction shared tasks (TimeML / TempEval, Rich ERE, MUC, PropBank, Causal-TimeBank, etc.), and cognitive-linguistic accounts commonly use. 
+""".rstrip()
+
+CAUSATION_INSTRUCTIONS = ANALYST_PREAMBLE + """
+In this specific case, you are tasked with understanding the relations between the events using event-to-event relation types that researchers, information-extraction shared tasks (TimeML / TempEval, Rich ERE, MUC, PropBank, Causal-TimeBank, etc.), and cognitive-linguistic accounts commonly use.
 Your answer should be presented, ONLY AND SPECIFICALLY, as a json with the following contents:
 
 {
@@ -72,57 +72,10 @@ Your answer should be presented, ONLY AND SPECIFICALLY, as a json with the follo
     { "source": "e3", "target": "e2", "type": "AFTER" }
   ]
 }
-    Ensure that the event names are short phrases not longer than 6-7 words.
-    Here is the input text: 
-    """
-    
-    instructions = instructions + f"\nHere is the input text:\n{input_text}\nIMPORTANT: MAKE SURE THE OUTPUT/ANALYSIS WRITTEN TO THE JSON IS WRITTEN IN THIS LANGUAGE: {language}\n"
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    response = client.chat.completions.create(
-        model="o4-mini",
-        messages=[{"role": "user", "content": instructions}]
-    )
-    print(response.choices[0].message.content.strip())
-    raw_answer = response.choices[0].message.content.strip()
-    raw_answer = raw_answer.replace("```json", "").replace("```", "")
-    final_json_str = raw_answer.strip()
-    print(final_json_str)
-    try:
-        analysis_json = json.loads(final_json_str)
-    except json.JSONDecodeError:
-        analysis_json = {
-            "events": {},
-            "relations": [],
-            "error": "JSON parsing failed. Raw output was:\n" + final_json_str
-        }
-    return analysis_json
-
-def analyze_text_events(input_text: str, doc_date_: str, language : str):
-    print("hello")
-    """
-    Analyzes the input text using a large language model to produce
-    structured event, entity, and temporal data in JSON format.
-
-    Steps:
-    1) Optionally parse a line "Document Date: <date>" from input_text.
-    2) Construct the prompt with your new instructions, appending the
-       user's text and the extracted doc_date if found.
-    3) Call the ChatGPT o3-mini endpoint.
-    4) Parse the chain-of-thought or "thinking" text out (stop at </think>).
-    5) Return the final JSON (or an error if parse fails).
-
-    :param input_text: The user-provided text, which may include an optional
-                       "Document Date: <something>" line.
-    :return: A Python dict containing the LLM's parsed JSON structure.
-    """
-
-    # 1) Optionally parse out the document date from a line like:
-    #    "Document Date: Jan 16, 2025"
-    doc_date = doc_date_
+Ensure that the event names are short phrases not longer than 6-7 words.
+""".rstrip()
 
-    # 2) Construct the prompt:
-    base_instructions = """
-You are an expert text analyst. You are given a text passage (one or more sentences). Your task is to perform a structured, in-depth analysis of the text and return the results in JSON format.
+EVENTS_INSTRUCTIONS = ANALYST_PREAMBLE + """
 Please follow these steps:
 Break down the analysis by sentences, and note every temporal reference, event, and named entity, indicating the sentence from which you extracted it.
 Identify every major event :
@@ -233,77 +186,423 @@ Temporal Reference Connection: Temporal Reference the event is connected to
 For events that the date is not clearly defined try to infer their temporal placement using inference.
 Add a one paragraph summary of the document.
 Do not add extra commentary or text outside the JSON structure.
-    """.strip()
-    base_instructions = base_instructions + f"\nIMPORTANT: MAKE SURE THE OUTPUT/ANALYSIS WRITTEN TO THE JSON IS WRITTEN IN THIS LANGUAGE: {language}\n"
+""".strip()
+
+COMBINED_INSTRUCTIONS = ANALYST_PREAMBLE + """
+Return them as ONE JSON object and produce all of the following sections in that single object:
 
-    doc_date_str = doc_date
-    # Combine instructions, doc date, and user text
-    full_prompt = f"""{base_instructions}
-Document Date: {doc_date_str}
+1) "events": every major event. For each: sentence (the sentence it appeared in), event_type, agent, patients, temporal_reference, cause, purpose_context. Label assumptions clearly.
+2) "named_entities": named entities grouped by category arrays ("persons", "organizations", "locations", "institutions", "dates", "legal_terms"). Each entry has entity, type, description. Keep empty categories as empty arrays.
+3) "temporal_references": every explicit or implicit time expression, each with reference and description.
+4) "important_notes": additional context, if necessary.
+5) "timeline_of_events": events ordered in time. Normalize each date using the document date when possible; otherwise give a relative date. For ranges give start and end. Each entry has date and events (event_summary, event_verb, temporal_reference_connection).
+6) "summary": a summary of the document of at most 50 words.
+7) "event_relations": event-to-event relations using the relation types common in TimeML / TempEval, Rich ERE and Causal-TimeBank (CAUSES, ENABLES, PREVENTS, BEFORE, AFTER, DURING, ...). "events" maps ids e1, e2, ... to short event phrases of at most 6-7 words; "relations" links them by id.
+8) "entity_relations": how the entities relate to each other, each relation being a single verb (e.g. owner ---[owns]---> cat).
+
+Return exactly this shape:
+{
+  "events": [
+    {"sentence": "", "event_type": "", "agent": "", "patients": "", "temporal_reference": "", "cause": "", "purpose_context": ""}
+  ],
+  "named_entities": {
+    "persons": [{"entity": "", "type": "", "description": ""}],
+    "organizations": [],
+    "locations": [],
+    "institutions": [],
+    "dates": [],
+    "legal_terms": []
+  },
+  "temporal_references": [{"reference": "", "description": ""}],
+  "important_notes": [],
+  "timeline_of_events": [
+    {"date": "", "events": [{"event_summary": "", "event_verb": "", "temporal_reference_connection": ""}]}
+  ],
+  "summary": "",
+  "event_relations": {
+    "events": {"e1": "", "e2": ""},
+    "relations": [{"source": "e1", "target": "e2", "type": "CAUSES"}]
+  },
+  "entity_relations": [
+    {"source_entity": "", "target_entity": "", "relation": ""}
+  ]
+}
 
+Warnings:
+- Do not include any output outside the JSON object.
+- Do not fabricate data. If something is not explicitly stated, leave it out or mark it as an assumption.
+- Every event-denoting verb or nominalization should be reflected in the "events" array.
+""".strip()
+
+
+# -------------------- Compact instruction blocks (prompt version "v2") --------------------
+# Same fields and rules as the blocks above in a fraction of the tokens: the
+# JSON shape is described once, inline, instead of as an indented skeleton,
+# and the duplicated "Here is the input text" lead-ins are gone.
+
+COMPACT_ENTITIES_INSTRUCTIONS = """
+Extract how the entities in the text relate to each other. Each relation is a single verb describing how the source entity acts on or relates to the target entity (e.g. owner ---[owns]---> cat, veterinary ---[treats]---> cat).
+Return ONLY this JSON object: {"entity_relations": [{"source_entity": "", "target_entity": "", "relation": ""}]}
+""".strip()
+
+COMPACT_CAUSATION_INSTRUCTIONS = """
+Extract the events of the text and the relations between them, using the event-to-event relation types of TimeML / TempEval, Rich ERE and Causal-TimeBank (CAUSES, ENABLES, PREVENTS, BEFORE, AFTER, DURING, ...).
+Return ONLY this JSON object: {"events": {"e1": "<event phrase of at most 7 words>", ...}, "relations": [{"source": "e1", "target": "e2", "type": "CAUSES"}]}
+""".strip()
+
+COMPACT_EVENTS_INSTRUCTIONS = """
+Analyze the text sentence by sentence and return ONLY one JSON object with:
+- "events": one object per event-denoting verb or nominalization: {"sentence", "event_type", "agent", "patients", "temporal_reference", "cause", "purpose_context"}
+- "named_entities": {"persons", "organizations", "locations", "institutions", "dates", "legal_terms"}, each a list of {"entity", "type", "description"}; empty lists for empty categories
+- "temporal_references": [{"reference", "description"}] for every explicit or implicit time expression
+- "important_notes": [strings], only if context is needed
+- "timeline_of_events": [{"date", "events": [{"event_summary", "event_verb", "temporal_reference_connection"}]}] in time order; normalize dates with the document date when possible, otherwise give a relative date; give ranges as start and end
+- "summary": at most 50 words
+Do not fabricate; label inferences as assumptions. No text outside the JSON.
+""".strip()
+
+COMPACT_COMBINED_INSTRUCTIONS = COMPACT_EVENTS_INSTRUCTIONS.replace(
+    "\nDo not fabricate", """
+- "event_relations": {"events": {"e1": "<event phrase of at most 7 words>", ...}, "relations": [{"source": "e1", "target": "e2", "type": "CAUSES"}]} using TimeML / Rich ERE / Causal-TimeBank relation types (CAUSES, ENABLES, PREVENTS, BEFORE, AFTER, DURING, ...)
+- "entity_relations": [{"source_entity", "target_entity", "relation"}], each relation a single verb
+Do not fabricate""")
+
+
+# -------------------- Prompt versions --------------------
+# "v1" is the original wording, "v2" the compact one. Select the default with
+# ANANSI_PROMPT_VERSION; the analyzers also take prompt_version= so versions
+# can be compared side by side (benchmark_prompts.py).
+
+PROMPT_VERSIONS = {
+    "v1": {
+        "entities": ENTITIES_INSTRUCTIONS,
+        "causation": CAUSATION_INSTRUCTIONS,
+        "events": EVENTS_INSTRUCTIONS,
+        "combined": COMBINED_INSTRUCTIONS,
+    },
+    "v2": {
+        "entities": COMPACT_ENTITIES_INSTRUCTIONS,
+        "causation": COMPACT_CAUSATION_INSTRUCTIONS,
+        "events": COMPACT_EVENTS_INSTRUCTIONS,
+        "combined": COMPACT_COMBINED_INSTRUCTIONS,
+    },
+}
+
+# With sentence ids (sentences.py) the events of the events and combined
+# analyses name their sentence by id instead of copying it.
+SENTENCE_ID_RULE = ('The sentences of the text are numbered "[s1] ...", "[s2] ...". '
+                    'Refer to a sentence only by its id (e.g. "s3") and never copy its text.')
+_SENTENCE_ID_REWRITES = (
+    ('"sentence": ""', '"sentence_id": ""'),
+    ("sentence: Sentence the word appeared in", 'sentence_id: Id of the sentence the word appeared in (e.g. "s3")'),
+    ("sentence (the sentence it appeared in)", 'sentence_id (the id of the sentence it appeared in, e.g. "s3")'),
+    ('{"sentence", "event_type"', '{"sentence_id", "event_type"'),
+)
+
+
+def _with_sentence_ids(block):
+    for old, new in _SENTENCE_ID_REWRITES:
+        block = block.replace(old, new)
+    return f"{block}\n{SENTENCE_ID_RULE}"
+
+
+if sentences.SENTENCE_IDS:
+    for _blocks in PROMPT_VERSIONS.values():
+        for _analysis in ("events", "combined"):
+            _blocks[_analysis] = _with_sentence_ids(_blocks[_analysis])
+
+PROMPT_VERSION = os.environ.get("ANANSI_PROMPT_VERSION", "v1")
+if PROMPT_VERSION not in PROMPT_VERSIONS:
+    raise ValueError(f"ANANSI_PROMPT_VERSION must be one of {', '.join(PROMPT_VERSIONS)}, not {PROMPT_VERSION!r}")
+
+
+def instructions(analysis: str, version: str = None):
+    """
+    Returns the static instruction block of *analysis* in prompt *version*
+    (default: ANANSI_PROMPT_VERSION).
+    """
+    return PROMPT_VERSIONS[version or PROMPT_VERSION][analysis]
+
+
+# -------------------- Prompt assembly --------------------
+
+def build_prompt(analysis: str, input_text: str, language: str, doc_date: str = None, version: str = None,
+                 hints: str = ""):
+    """
+    Assembles the prompt of *analysis* for provider-side prefix caching: the
+    static instruction block comes first and is byte-identical on every call,
+    and everything that varies per request follows it in a fixed order
+    (language, document date, text), so calls with different documents still
+    share the whole instruction prefix.
+
+    :param doc_date: The document date, or None for analyses that do not use it
+    :param version: Prompt version (default: ANANSI_PROMPT_VERSION)
+    :param hints: Per-document lines placed after the document date (see
+                  timex.prompt_hints())
+    """
+    date_line = f"Document Date: {doc_date}\n" if doc_date is not None else ""
+    return f"""{instructions(analysis, version)}
+
+IMPORTANT: MAKE SURE THE OUTPUT/ANALYSIS WRITTEN TO THE JSON IS WRITTEN IN THIS LANGUAGE: {language}
+{date_line}{hints}
 Here is the text to analyze:
 {input_text}
 """
-    print("here is the prompt i used\n", full_prompt)
-
-    # 3) Call the ChatGPT o3-mini endpoint using the OpenAI library
-    #    (This is just an example; adapt to your own usage)
-    client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-    response = client.chat.completions.create(
-        model="o4-mini",
-        messages=[{"role": "user", "content": full_prompt}]
+
+
+def build_entities_prompt(input_text: str, language: str, version: str = None):
+    return build_prompt("entities", input_text, language, version=version)
+
+
+def build_causation_prompt(input_text: str, language: str, version: str = None):
+    return build_prompt("causation", input_text, language, version=version)
+
+
+def build_events_prompt(input_text: str, doc_date: str, language: str, version: str = None):
+    text = sentences.numbered(input_text) if sentences.SENTENCE_IDS else input_text
+    return build_prompt("events", text, language, doc_date or "", version,
+                        timex.prompt_hints(input_text, doc_date, language))
+
+
+def build_combined_prompt(input_text: str, doc_date: str, language: str, version: str = None):
+    text = sentences.numbered(input_text) if sentences.SENTENCE_IDS else input_text
+    return build_prompt("combined", text, language, doc_date or "", version,
+                        timex.prompt_hints(input_text, doc_date, language))
+
+
+def analyze_text_entities(input_text : str, language : str, prompt_version : str = None):
+    instructions = build_entities_prompt(input_text, language, prompt_version)
+    sampled = body_sampled()
+    log_to_file("analyze_text_entities", instructions, "PROMPT", sampled)
+    response = chat_completion(
+        "entities",
+        route=choose_route("entities", input_text, language),
+        messages=[{"role": "user", "content": instructions}],
+        **response_format_kwargs("entities")
+    )
+    raw_answer = response.choices[0].message.content.strip()
+    log_to_file("analyze_text_entities", raw_answer, "RESPONSE", sampled)
+    record_tokens("entities", instructions, input_text, raw_answer)
+    raw_answer = raw_answer.replace("```json", "").replace("```", "")
+    final_json_str = raw_answer.strip()
+    analysis_json = parse_model_json(final_json_str, "entities", {
+        "entity_relations": []
+    })
+    return validate_result("entities", analysis_json)
+    
+    
+def analyze_text_causation(input_text : str, language : str, prompt_version : str = None):
+    instructions = build_causation_prompt(input_text, language, prompt_version)
+    sampled = body_sampled()
+    log_to_file("analyze_text_causation", instructions, "PROMPT", sampled)
+    response = chat_completion(
+        "causation",
+        route=choose_route("causation", input_text, language),
+        messages=[{"role": "user", "content": instructions}],
+        **response_format_kwargs("causation")
+    )
+    raw_answer = response.choices[0].message.content.strip()
+    log_to_file("analyze_text_causation", raw_answer, "RESPONSE", sampled)
+    record_tokens("causation", instructions, input_text, raw_answer)
+    raw_answer = raw_answer.replace("```json", "").replace("```", "")
+    final_json_str = raw_answer.strip()
+    analysis_json = parse_model_json(final_json_str, "causation", {
+        "events": {},
+        "relations": []
+    })
+    return validate_result("causation", analysis_json)
+
+def analyze_text_events(input_text: str, doc_date_: str, language : str, prompt_version : str = None):
+    """
+    Analyzes the input text using a large language model to produce
+    structured event, entity, and temporal data in JSON format.
+
+    Steps:
+    1) Optionally parse a line "Document Date: <date>" from input_text.
+    2) Construct the prompt with your new instructions, appending the
+       user's text and the extracted doc_date if found.
+    3) Call the model chosen by routing.choose_route().
+    4) Parse the chain-of-thought or "thinking" text out (stop at </think>).
+    5) Return the final JSON (or an error if parse fails).
+
+    :param input_text: The user-provided text, which may include an optional
+                       "Document Date: <something>" line.
+    :return: A Python dict containing the LLM's parsed JSON structure.
+    """
+
+    # 1) Optionally parse out the document date from a line like:
+    #    "Document Date: Jan 16, 2025"
+    doc_date = doc_date_
+
+    # 2) Construct the prompt:
+    full_prompt = build_events_prompt(input_text, doc_date, language, prompt_version)
+    sampled = body_sampled()
+    log_to_file("analyze_text_events", full_prompt, "PROMPT", sampled)
+
+    # 3) Call the model routed for this input
+    response = chat_completion(
+        "events",
+        route=choose_route("events", input_text, language),
+        messages=[{"role": "user", "content": full_prompt}],
+        **response_format_kwargs("events")
     )
 
     # 4) Extract the model's content
     raw_answer = response.choices[0].message.content.strip()
+    log_to_file("analyze_text_events", raw_answer, "RESPONSE", sampled)
+    record_tokens("events", full_prompt, input_text, raw_answer)
     raw_answer = raw_answer.replace("```json", "").replace("```", "")
-    outputFile = open("answer.txt", "w")
-    outputFile.write(raw_answer)
-    print("wrote to file lol")
 
     # If the LLM includes chain-of-thought or "thinking" steps, strip out everything
     splitted = raw_answer.split("</think>")
     if len(splitted) > 1:
         final_json_str = splitted[-1].strip()
-        outputFile.write("\n\n\n\n")
-        outputFile.write(final_json_str)
-        outputFile.close()
-        print("Wrote to file again :) ")
     else:
         # If there's no </think>, use the entire text
         final_json_str = raw_answer.strip()
 
-    # 5) Parse the JSON
+    # 5) Parse the JSON, repairing or salvaging it if needed
+    analysis_json = parse_model_json(final_json_str, "events", {
+        "events": [],
+        "named_entities": {
+            "persons": [],
+            "organizations": [],
+            "locations": [],
+            "institutions": [],
+            "dates": [],
+            "legal_terms": []
+        },
+        "temporal_references": [],
+        "important_notes": [],
+        "timeline_of_events": []
+    })
+    return validate_result("events", analysis_json)
+
+def analyze_text_combined(input_text: str, doc_date_: str, language: str, prompt_version: str = None):
+    """
+    Single-call variant of analyze_text_events + analyze_text_causation +
+    analyze_text_entities: one prompt asks for events, named entities,
+    temporal references, the timeline, the summary, event-to-event relations
+    and entity relations together, so the input text and the shared preamble
+    are only sent (and paid for) once.
+
+    :param input_text: The text to analyze
+    :param doc_date_: The document date, may be empty
+    :param language: Language the analysis should be written in
+    :return: A dict with the keys of analyze_text_events plus "event_relations"
+             (the analyze_text_causation shape) and "entity_relations".
+    """
+    full_prompt = build_combined_prompt(input_text, doc_date_, language, prompt_version)
+    sampled = body_sampled()
+    log_to_file("analyze_text_combined", full_prompt, "PROMPT", sampled)
+    response = chat_completion(
+        "combined",
+        route=choose_route("combined", input_text, language),
+        messages=[{"role": "user", "content": full_prompt}],
+        **response_format_kwargs("combined")
+    )
+
+    raw_answer = response.choices[0].message.content.strip()
+    log_to_file("analyze_text_combined", raw_answer, "RESPONSE", sampled)
+    record_tokens("combined", full_prompt, input_text, raw_answer)
+    analysis_json = parse_model_json(raw_answer, "combined", {
+        "events": [],
+        "named_entities": {
+            "persons": [],
+            "organizations": [],
+            "locations": [],
+            "institutions": [],
+            "dates": [],
+            "legal_terms": []
+        },
+        "temporal_references": [],
+        "important_notes": [],
+        "timeline_of_events": [],
+        "event_relations": {"events": {}, "relations": []},
+        "entity_relations": []
+    })
+    return validate_result("combined", analysis_json)
+
+# -------------------- Streaming variants --------------------
+# Same prompts as the analyzers above, but the answer is streamed and every
+# completed element of "events", "relations" or "entity_relations" is yielded
+# as soon as the model has closed it.
+
+def _stream_json_analysis(analysis: str, language: str, prompt: str, input_text: str, empty_result: dict):
+    """
+    Streams one analysis.
+
+    Yields (key, element) pairs as array elements complete, where key is the
+    dotted path of the array (e.g. "events", "event_relations.relations"),
+    and finally (None, full_result) with the same dict the blocking analyzer
+    would have returned.
+    """
+    sampled = body_sampled()
+    log_to_file(f"stream_text_{analysis}", prompt, "PROMPT", sampled)
+    parser = IncrementalJSONParser()
+    for delta in stream_chat_completion(
+        analysis,
+        route=choose_route(analysis, input_text, language),
+        messages=[{"role": "user", "content": prompt}],
+        **response_format_kwargs(analysis)
+    ):
+        for path, element in parser.feed(delta):
+            yield ".".join(path), element
+    log_to_file(f"stream_text_{analysis}", parser.buffer, "RESPONSE", sampled)
+    record_tokens(analysis, prompt, input_text, parser.buffer)
     try:
-        analysis_json = json.loads(final_json_str)
+        analysis_json = parser.result()
     except json.JSONDecodeError:
-        analysis_json = {
-            "events": [],
-            "named_entities": {
-                "persons": [],
-                "organizations": [],
-                "locations": [],
-                "institutions": [],
-                "dates": [],
-                "legal_terms": []
-            },
-            "temporal_references": [],
-            "important_notes": [],
-            "timeline_of_events": [],
-            "error": "JSON parsing failed. Raw output was:\n" + final_json_str
-        }
-    print(analysis_json)
-    return analysis_json
+        analysis_json = parse_model_json(parser.buffer, analysis, empty_result)
+    yield None, validate_result(analysis, analysis_json)
+
+
+def stream_text_events(input_text: str, doc_date_: str, language: str, prompt_version: str = None):
+    prompt = build_events_prompt(input_text, doc_date_, language, prompt_version)
+    return _stream_json_analysis("events", language, prompt, input_text, {
+        "events": [],
+        "named_entities": {
+            "persons": [],
+            "organizations": [],
+            "locations": [],
+            "institutions": [],
+            "dates": [],
+            "legal_terms": []
+        },
+        "temporal_references": [],
+        "important_notes": [],
+        "timeline_of_events": [],
+    })
+
+
+def stream_text_causation(input_text: str, language: str, prompt_version: str = None):
+    prompt = build_causation_prompt(input_text, language, prompt_version)
+    return _stream_json_analysis("causation", language, prompt, input_text,
+                                 {"events": {}, "relations": []})
+
+
+def stream_text_entities(input_text: str, language: str, prompt_version: str = None):
+    prompt = build_entities_prompt(input_text, language, prompt_version)
+    return _stream_json_analysis("entities", language, prompt, input_text,
+                                 {"entity_relations": []})
 
 # -------------------- New helper analyses (POS & morphology) --------------------
 
-def analyze_parts_of_speech(input_text: str, language: str = "English"):
-    """Return a basic part-of-speech tagging of *input_text*.
+def analyze_parts_of_speech(input_text: str, language: str = "English", engine: str = None):
+    """Return a part-of-speech tagging of *input_text* as [{"token", "pos"}].
 
-    If the OpenAI key is available we ask the model; otherwise we fall back to a
-    very naive whitespace tokenizer that labels everything as "UNK" so that the
-    Flask endpoint does not crash.
+    The default "llm" engine asks the model; if that call fails the local
+    averaged-perceptron tagger in pos_tagger.py answers, so the Flask
+    endpoint does not crash. engine="local" uses that tagger without a
+    model call.
+
+    :param engine: "llm" or "local" (default pos_tagger.DEFAULT_ENGINE)
     """
+    engine = engine or pos_tagger.DEFAULT_ENGINE
+    if engine not in pos_tagger.ENGINES:
+        raise ValueError(f"Unknown part-of-speech engine '{engine}'")
+    if engine == "local":
+        return pos_tagger.tag_text(input_text, language)
     try:
         instructions = f"""
 You are an expert linguist. Given the following text, return a JSON array where
@@ -318,28 +617,27 @@ Text:
 {input_text}
 IMPORTANT: WRITE THE JSON IN {language}
         """.strip()
-        client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
-        response = client.chat.completions.create(
-            model="o3-mini",
-            messages=[{"role": "user", "content": instructions}]
+        sampled = body_sampled()
+        log_to_file("analyze_parts_of_speech", instructions, "PROMPT", sampled)
+        response = chat_completion(
+            "pos",
+            route=choose_route("pos", input_text, language),
+            messages=[{"role": "user", "content": instructions}],
+            **response_format_kwargs("pos")
         )
-        raw = response.choices[0].message.content.strip().replace("```json", "").replace("```", "")
-        return json.loads(raw)
+        log_to_file("analyze_parts_of_speech", response.choices[0].message.content or "", "RESPONSE", sampled)
+        record_tokens("pos", instructions, input_text, response.choices[0].message.content or "")
+        tags, _ = recover_json(response.choices[0].message.content, "pos")
+        if tags is None:
+            raise ValueError("Unparseable part-of-speech output")
+        return validate("pos", tags).model_dump()["tokens"]
     except Exception as exc:
-        # Fallback – naive split, mark as UNK
-        tokens = [t for t in input_text.split() if t]
-        return [{"token": tok, "pos": "UNK"} for tok in tokens]
+        # Fallback – the local tagger
+        logger.warning("LLM part-of-speech tagging failed, using the local tagger: %s", exc)
+        return pos_tagger.tag_text(input_text, language)
 
 
-def analyze_word_morphology(word: str, language: str):
-    """
-    Performs morphological analysis on a specific word.
-    
-    :param word: The word to analyze
-    :param language: The language of the word
-    :return: A Python dict containing the morphological analysis
-    """
-    instructions = f"""
+MORPHOLOGY_INSTRUCTIONS = """
     Can you help me? I would like for you to do morphological analysis in the following {language} word:
     
     {word}
@@ -349,21 +647,176 @@ def analyze_word_morphology(word: str, language: str):
     "This is a noun that means ...." (in some languages, specify if the noun is using the masculine or feminine form)
     """
 
+MORPHOLOGY_BATCH_INSTRUCTIONS = """
+Do morphological analysis of each of the following {language} words. For each word, answer in a sentence like this:
+"This is a verb, in this tense, in this voice, etc...."
+"This is a noun that means ...." (in some languages, specify if the noun is using the masculine or feminine form)
+
+Respond **only** with JSON like:
+{{"analyses": [{{"word": "...", "analysis": "This is a noun that means ...."}}]}}
+with one entry per word, in the order given, writing each word exactly as it is given.
+
+Words:
+{words}
+"""
+
+# Single and batched analyses share the morphology store, so both prompts
+# version its entries.
+MORPHOLOGY_PROMPTS = MORPHOLOGY_INSTRUCTIONS + MORPHOLOGY_BATCH_INSTRUCTIONS
+
+
+def analyze_word_morphology(word: str, language: str, use_cache: bool = True):
+    """
+    Performs morphological analysis on a specific word. Analyses are kept in
+    the persistent morphology store (see morphology_cache.py), so a word that
+    was looked up before costs no model call.
+    
+    :param word: The word to analyze
+    :param language: The language of the word
+    :param use_cache: False skips the morphology store for this call
+    :return: A Python dict containing the morphological analysis and its
+        cache status ("memory", "disk", "miss", "disabled" or "bypass")
+    """
+    if use_cache:
+        cached, cache_status = morphology_cache.lookup(word, language, MORPHOLOGY_PROMPTS)
+        if cached is not None:
+            return {"word": word, "analysis": cached, "cache": cache_status}
+    else:
+        cache_status = "bypass"
+
+    instructions = MORPHOLOGY_INSTRUCTIONS.format(language=language, word=word)
+
     # Log the prompt
-    log_to_file("analyze_word_morphology", instructions, "PROMPT")
+    sampled = body_sampled()
+    log_to_file("analyze_word_morphology", instructions, "PROMPT", sampled)
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",  # Using a cheaper model as suggested
+    response = chat_completion(
+        "morphology",
+        route=choose_route("morphology", word, language),
         messages=[{"role": "user", "content": instructions}]
     )
 
     analysis = response.choices[0].message.content.strip()
 
     # Log the response
-    log_to_file("analyze_word_morphology", analysis, "RESPONSE")
+    log_to_file("analyze_word_morphology", analysis, "RESPONSE", sampled)
+    record_tokens("morphology", instructions, word, analysis)
+
+    if use_cache:
+        morphology_cache.remember(word, language, MORPHOLOGY_PROMPTS, analysis)
 
     return {
         "word": word,
-        "analysis": analysis
-    }
\ No newline at end of file
+        "analysis": analysis,
+        "cache": cache_status
+    }
+
+
+def analyze_words_morphology(words, language: str, use_cache: bool = True):
+    """
+    Analyzes several words in one model call.
+
+    :param words: The words to analyze (one batch of morphology_cache.pack_words())
+    :param language: The language of the words
+    :param use_cache: False does not store the analyses
+    :return: dict normalized word -> analysis, for the words the model answered
+    :raises ValueError: if the answer cannot be parsed
+    """
+    word_list = "\n".join(words)
+    instructions = MORPHOLOGY_BATCH_INSTRUCTIONS.format(language=language, words=word_list)
+
+    sampled = body_sampled()
+    log_to_file("analyze_words_morphology", instructions, "PROMPT", sampled)
+    response = chat_completion(
+        "morphology_batch",
+        route=choose_route("morphology_batch", word_list, language),
+        messages=[{"role": "user", "content": instructions}],
+        **response_format_kwargs("morphology_batch")
+    )
+    content = response.choices[0].message.content or ""
+    log_to_file("analyze_words_morphology", content, "RESPONSE", sampled)
+    record_tokens("morphology_batch", instructions, word_list, content)
+
+    parsed, _ = recover_json(content, "morphology_batch", dict)
+    if parsed is None:
+        raise ValueError("Unparseable morphology output")
+    requested = {morphology_cache.normalize_word(word) for word in words}
+    analyses = {}
+    for entry in validate("morphology_batch", parsed).analyses:
+        key = morphology_cache.normalize_word(entry.word)
+        analysis = entry.analysis.strip()
+        if key in requested and analysis and key not in analyses:
+            analyses[key] = analysis
+            if use_cache:
+                morphology_cache.remember(key, language, MORPHOLOGY_PROMPTS, analysis)
+    return analyses
+
+
+# Batched morphology calls of all requests share this pool, so one large
+# request cannot start threads without bound.
+_morphology_executor = ThreadPoolExecutor(max_workers=morphology_cache.BATCH_WORKERS,
+                                          thread_name_prefix="morphology")
+
+
+def analyze_morphology_batch(words, language: str, use_cache: bool = True):
+    """
+    Analyzes many words with as few model calls as possible: the words are
+    deduplicated, the ones in the morphology store are answered from it and
+    the rest are packed into calls that fit the token budget
+    (morphology_cache.pack_words()), run concurrently on a shared pool.
+
+    :param words: The words, in any form a selection gives them ("casas,")
+    :param language: The language of the words
+    :param use_cache: False skips the morphology store
+    :return: (results, meta). results has one {"word", "analysis", "cache"}
+        per distinct word, in first-seen order, plus "error" (and an empty
+        analysis) for words whose call failed or whose answer lacks them.
+        meta counts the words, store hits and model calls.
+    :raises ValueError: if there are more than morphology_cache.BATCH_MAX_WORDS
+        distinct words
+    """
+    unique = {}
+    for word in words:
+        key = morphology_cache.normalize_word(word)
+        if key and key not in unique:
+            unique[key] = word
+    if len(unique) > morphology_cache.BATCH_MAX_WORDS:
+        raise ValueError(f"{len(unique)} distinct words; at most "
+                         f"{morphology_cache.BATCH_MAX_WORDS} are analyzed per request")
+
+    results = {}
+    pending = []
+    for key, word in unique.items():
+        if use_cache:
+            cached, cache_status = morphology_cache.lookup(key, language, MORPHOLOGY_PROMPTS)
+            if cached is not None:
+                results[key] = {"word": word, "analysis": cached, "cache": cache_status}
+                continue
+        else:
+            cache_status = "bypass"
+        results[key] = {"word": word, "analysis": "", "cache": cache_status}
+        pending.append(key)
+
+    # The model is asked about the normalized forms ("perro", not "perro,").
+    batches = morphology_cache.pack_words(pending)
+    futures = {submit_in_context(_morphology_executor, analyze_words_morphology, batch, language, use_cache): batch
+               for batch in batches}
+    for future, batch in futures.items():
+        try:
+            analyses, error = future.result(), "Missing from the model's answer"
+        except Exception as exc:
+            logger.warning("Batched morphology call for %d words failed: %s", len(batch), exc)
+            analyses, error = {}, f"{type(exc).__name__}: {exc}"
+        for key in batch:
+            if key in analyses:
+                results[key]["analysis"] = analyses[key]
+            else:
+                results[key]["error"] = error
+
+    meta = {
+        "words": len(words),
+        "unique": len(unique),
+        "cache_hits": len(unique) - len(pending),
+        "calls": len(batches),
+    }
+    return [results[key] for key in unique], meta
@@ -1,6 +1,10 @@
 """
 A simple script to test the logging functionality of temporal_reasoning.py
 """
+import os
+
+# Log every prompt and response rather than a sample of them.
+os.environ.setdefault("ANANSI_LOG_BODY_SAMPLE", "1")
 
 from temporal_reasoning import (
     analyze_text_entities,
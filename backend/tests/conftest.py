@@ -0,0 +1,23 @@
+# conftest.py
+"""
+The backend modules are imported flat (`import sentences`), as app.py does,
+so the backend directory goes on sys.path. Run from the backend directory:
+
+    python -m pytest tests
+
+The job table, caches, artifacts and logs go to a temporary directory, set
+before any backend module reads its environment: importing app starts the job
+workers, which must not pick up a developer's queued jobs.
+"""
+import os
+import sys
+import tempfile
+
+_STATE_DIR = tempfile.mkdtemp(prefix="anansi-tests-")
+os.environ["ANANSI_JOB_DB"] = os.path.join(_STATE_DIR, "jobs.sqlite3")
+os.environ["ANANSI_CACHE_DB"] = os.path.join(_STATE_DIR, "analysis_cache.sqlite3")
+os.environ["ANANSI_MORPHOLOGY_DB"] = os.path.join(_STATE_DIR, "morphology.sqlite3")
+os.environ["ANANSI_ARTIFACTS_DIR"] = os.path.join(_STATE_DIR, "artifacts")
+os.environ["ANANSI_LOG_DIR"] = os.path.join(_STATE_DIR, "logs")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
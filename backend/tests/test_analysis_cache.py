@@ -0,0 +1,61 @@
+# test_analysis_cache.py
+from analysis_cache import MemoryLRU, TieredCache, cache_key, normalize_text
+
+FIELDS = {
+    "input_text": "The cat sat.",
+    "doc_date": "2023-01-20",
+    "language": "English",
+    "model": "route",
+    "template": "prompt",
+}
+
+
+def test_normalize_text_collapses_spaces():
+    assert normalize_text("  The  cat\tsat. ") == "The cat sat."
+
+
+def test_cache_key_ignores_insignificant_spacing():
+    assert cache_key("events", **FIELDS) == cache_key("events", **dict(FIELDS, input_text="The  cat sat. "))
+
+
+def test_cache_key_changes_with_each_field():
+    base = cache_key("events", **FIELDS)
+    assert cache_key("causation", **FIELDS) != base
+    for field, value in [("input_text", "The dog sat."), ("doc_date", "2023-01-21"),
+                         ("language", "Spanish"), ("model", "other"), ("template", "edited")]:
+        assert cache_key("events", **dict(FIELDS, **{field: value})) != base, field
+
+
+def test_memory_lru_evicts_least_recently_used():
+    lru = MemoryLRU(max_bytes=10)
+    lru.set("a", "aaaa")
+    lru.set("b", "bbbb")
+    lru.get("a")
+    lru.set("c", "cccc")
+    assert lru.get("b") is None
+    assert lru.get("a") == "aaaa"
+    assert lru.current_bytes == 8
+
+
+def test_tiered_cache_promotes_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    TieredCache(db_path=path).set("key", "events", {"events": [1]})
+    cache = TieredCache(db_path=path)
+    assert cache.get("key") == ({"events": [1]}, "disk")
+    assert cache.get("key") == ({"events": [1]}, "memory")
+    assert cache.get("other") == (None, "miss")
+
+
+def test_events_key_follows_sentence_breaks():
+    import pipeline
+    from analysis_cache import cache_key as key
+
+    paragraphs = "Hello there.\n\nbob went home. He slept."
+    one_line = "Hello there. bob went home. He slept."
+    for name, analysis in [("events", pipeline.ANALYSES["events"]), ("combined", pipeline.COMBINED)]:
+        _, split = pipeline._args_and_key(analysis, paragraphs, "", "English")
+        _, joined = pipeline._args_and_key(analysis, one_line, "", "English")
+        assert key(name, **split) != key(name, **joined), name
+    _, split = pipeline._args_and_key(pipeline.ANALYSES["entities"], paragraphs, "", "English")
+    _, joined = pipeline._args_and_key(pipeline.ANALYSES["entities"], one_line, "", "English")
+    assert key("entities", **split) == key("entities", **joined)
@@ -0,0 +1,13 @@
+# test_app.py
+import pytest
+
+from app import app
+
+
+@pytest.mark.parametrize("method, path", [
+    ("post", "/analyze"), ("post", "/analyze/stream"), ("post", "/analyze/batch"), ("post", "/analyze/jobs")])
+def test_unknown_mode_is_rejected_by_every_endpoint(method, path):
+    client = app.test_client()
+    response = getattr(client, method)(f"{path}?mode=bogus", data={"mode": "bogus", "input_text": "x"})
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("Unknown mode 'bogus'")
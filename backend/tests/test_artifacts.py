@@ -0,0 +1,40 @@
+# test_artifacts.py
+import artifacts
+
+
+def test_saved_under_server_id_with_client_label(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACTS_DIR", str(tmp_path))
+    token = artifacts.bind_request("server-id", "client-id")
+    try:
+        artifacts.save("events", "model", [{"role": "user", "content": "prompt"}], "answer")
+    finally:
+        artifacts.unbind_request(token)
+    artifacts.flush()
+    stored = artifacts.load("server-id")
+    assert stored[0]["output"] == "answer"
+    assert stored[0]["client_request_id"] == "client-id"
+    assert artifacts.load("client-id") is None
+
+
+def test_client_request_id_is_only_a_label():
+    from app import app
+
+    response = app.test_client().get("/", headers={"X-Request-ID": "someone-elses-id"})
+    assert response.headers["X-Request-ID"] != "someone-elses-id"
+    assert response.headers["X-Client-Request-ID"] == "someone-elses-id"
+
+
+def test_artifacts_endpoint_is_off_by_default_and_takes_a_token(tmp_path, monkeypatch):
+    from app import app
+
+    client = app.test_client()
+    monkeypatch.setattr(artifacts, "ENDPOINT_ENABLED", False)
+    assert client.get("/artifacts/abc").status_code == 404
+    monkeypatch.setattr(artifacts, "ENDPOINT_ENABLED", True)
+    monkeypatch.setattr(artifacts, "ENDPOINT_TOKEN", "secret")
+    monkeypatch.setattr(artifacts, "ARTIFACTS_DIR", str(tmp_path))
+    assert client.get("/artifacts/abc").status_code == 401
+    assert client.get("/artifacts/abc", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get("/artifacts/abc", headers={"Authorization": "Bearer é"}).status_code == 401
+    response = client.get("/artifacts/abc", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 404 and "No artifacts" in response.get_json()["error"]
@@ -0,0 +1,57 @@
+# test_chunking.py
+import chunking
+
+TEXT = ("Ana left Lima on Monday. She reached Cusco the next day. "
+        "The strike began soon after. Roads were closed for a week. "
+        "Trains stopped running. Ana flew home instead.")
+
+
+_chunk_sentences = chunking.chunk_sentences
+
+
+def _chunks(text):
+    return _chunk_sentences(text, max_tokens=16)
+
+
+def test_chunks_keep_every_sentence_with_its_document_id():
+    chunks = _chunks(TEXT)
+    assert len(chunks) > 1
+    assert [sentence_id for _, ids in chunks for sentence_id in ids] == [f"s{n}" for n in range(1, 7)]
+    assert "\n\n".join(chunk for chunk, _ in chunks) == "\n\n".join(chunking.split_sentences(TEXT))
+
+
+def _combined(chunk, doc_date, language):
+    # Each chunk numbers its own sentences and events from 1.
+    sentences = chunk.split("\n\n")
+    events = {f"e{n}": sentence for n, sentence in enumerate(sentences, start=1)}
+    relations = [{"source": f"e{n}", "target": f"e{n + 1}", "type": "before"} for n in range(1, len(sentences))]
+    relations.append({"source": "e1", "target": "e99", "type": "before"})
+    return {
+        "events": [{"event": sentence, "sentence_id": f"s{n}"} for n, sentence in enumerate(sentences, start=1)],
+        "timeline_of_events": [],
+        "event_relations": {"events": events, "relations": relations},
+        "entity_relations": [],
+    }
+
+
+def test_merge_renumbers_sentences_and_events_across_chunks(monkeypatch):
+    monkeypatch.setattr(chunking, "chunk_sentences", _chunks)
+    monkeypatch.setattr(chunking.tr, "analyze_text_combined", _combined)
+    merged = chunking.analyze_text_combined_chunked(TEXT, "", "English")
+
+    sentences = chunking.split_sentences(TEXT)
+    assert [(event["event"], event["sentence_id"]) for event in merged["events"]] == [
+        (sentence, f"s{n}") for n, sentence in enumerate(sentences, start=1)]
+    events = merged["event_relations"]["events"]
+    assert events == {f"e{n}": sentence for n, sentence in enumerate(sentences, start=1)}
+    relations = merged["event_relations"]["relations"]
+    assert all(relation["source"] in events and relation["target"] in events for relation in relations)
+    # Within-chunk pairs survive renumbered; dangling ones are dropped.
+    within = {(relation["source"], relation["target"]) for relation in relations}
+    offset = 0
+    for _, ids in _chunks(TEXT):
+        for n in range(1, len(ids)):
+            assert (f"e{offset + n}", f"e{offset + n + 1}") in within
+        offset += len(ids)
+    assert len(relations) == offset - len(_chunks(TEXT))
+    assert "error" not in merged
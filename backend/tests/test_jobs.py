@@ -0,0 +1,88 @@
+# test_jobs.py
+import os
+import threading
+import time
+
+import pytest
+
+import jobs
+
+
+def _running_job(store, worker, updated_at=None):
+    job_id = store.create({"input_text": "x", "doc_date": "", "language": "English", "mode": "fanout"})
+    with store._lock:
+        store._conn.execute("UPDATE jobs SET status = 'running', worker = ?, updated_at = ? WHERE id = ?",
+                            (worker, updated_at or time.time(), job_id))
+        store._conn.commit()
+    return job_id
+
+
+def test_requeues_jobs_of_an_earlier_process_with_this_pid(tmp_path):
+    # A restarted container's worker usually gets the dead worker's pid.
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    previous_boot = _running_job(store, f"{jobs.HOSTNAME}:{os.getpid()}:earlierboot")
+    own = _running_job(store, jobs._worker_name())
+    assert store.requeue_orphans() == 1
+    assert store.get(previous_boot)["status"] == "queued"
+    assert store.get(own)["status"] == "running"
+
+
+def test_requeues_dead_and_stale_workers_only(tmp_path, monkeypatch):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_pid_alive", lambda pid: pid != 99999)
+    dead = _running_job(store, f"{jobs.HOSTNAME}:99999:boot")
+    alive = _running_job(store, f"{jobs.HOSTNAME}:12345:boot")
+    other_host = _running_job(store, "elsewhere:99999:boot")
+    stale = _running_job(store, "elsewhere:1:boot", updated_at=time.time() - jobs.STALE_SECONDS - 1)
+    assert store.requeue_orphans() == 2
+    assert [store.get(job)["status"] for job in (dead, alive, other_host, stale)] == [
+        "queued", "running", "running", "queued"]
+
+
+def test_failed_claim_rolls_back(tmp_path):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create({"input_text": "x", "doc_date": "", "language": "English", "mode": "fanout"})
+    store._conn.execute("CREATE TRIGGER fail BEFORE UPDATE ON jobs BEGIN SELECT RAISE(ABORT, 'boom'); END")
+    with pytest.raises(Exception):
+        store.claim()
+    store._conn.execute("DROP TRIGGER fail")
+    assert store.claim()[0] == job_id
+
+
+class _FailingStore:
+    def __init__(self):
+        self.claims = 0
+        self.finished = {}
+
+    def claim(self):
+        self.claims += 1
+        if self.claims == 1:
+            raise RuntimeError("database is locked")
+        return None
+
+    def set_progress(self, job_id, name, state):
+        raise RuntimeError("database is locked")
+
+    def finish(self, job_id, result=None, error=None):
+        self.finished[job_id] = error
+
+    def requeue_orphans(self):
+        return 0
+
+
+def test_worker_survives_database_errors(monkeypatch):
+    monkeypatch.setattr(jobs, "POLL_SECONDS", 0.01)
+    store = _FailingStore()
+    queue = jobs.JobQueue(store)
+    thread = threading.Thread(target=queue._work, daemon=True)
+    thread.start()
+    deadline = time.time() + 5
+    while store.claims < 3 and time.time() < deadline:
+        time.sleep(0.01)
+    assert thread.is_alive() and store.claims >= 3
+
+
+def test_failed_progress_update_fails_the_job():
+    store = _FailingStore()
+    jobs.JobQueue(store)._run("job", {"mode": "fanout"})
+    assert store.finished["job"] == "RuntimeError: database is locked"
@@ -0,0 +1,32 @@
+# test_json_repair.py
+from json_repair import recover_local
+
+
+def test_parses_clean_json():
+    assert recover_local('{"a": 1}') == ({"a": 1}, "parsed")
+
+
+def test_repairs_fences_prose_and_trailing_commas():
+    assert recover_local('```json\nHere it is: {"a": [1, 2,],}\n```') == ({"a": [1, 2]}, "repaired")
+
+
+def test_salvages_truncated_output():
+    value, outcome = recover_local('{"events": [{"a": 1}, {"b": ')
+    assert (value, outcome) == ({"events": [{"a": 1}]}, "salvaged")
+
+
+def test_skips_a_stray_brace_in_prose():
+    assert recover_local('Sure! I think {this} is {"a":1}') == ({"a": 1}, "repaired")
+
+
+def test_skips_a_stray_bracket_before_an_object():
+    assert recover_local('See [1] and then {"a": 2}', dict) == ({"a": 2}, "repaired")
+
+
+def test_does_not_return_an_array_element_as_the_object():
+    assert recover_local('[{"token":"a"},{"tok', dict) == (None, "failed")
+    assert recover_local('[{"token":"a"},{"tok', list) == ([{"token": "a"}], "salvaged")
+
+
+def test_does_not_return_a_fragment_of_a_malformed_object():
+    assert recover_local('{"a": {"b": 1}, oops}') == (None, "failed")
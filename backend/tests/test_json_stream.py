@@ -0,0 +1,41 @@
+# test_json_stream.py
+import json
+
+import pytest
+
+from json_stream import IncrementalJSONParser
+
+DOCUMENT = {
+    "events": [
+        {"id": "e1", "text": "He said \"stop\" {now} [twice]", "tags": ["a", "b"]},
+        {"id": "e2", "text": "back\\slash, comma", "events": [{"nested": True}]},
+    ],
+    "relations": [1, 2.5, None, True, "three"],
+    "event_relations": {"relations": [{"source": "e1", "target": "e2"}], "note": "ok"},
+    "entity_relations": [],
+}
+TEXT = "Here you go:\n```json\n" + json.dumps(DOCUMENT, indent=2) + "\n```\nDone."
+
+EXPECTED = [(("events",), element) for element in DOCUMENT["events"]] \
+    + [(("relations",), element) for element in DOCUMENT["relations"]] \
+    + [(("event_relations", "relations"), element) for element in DOCUMENT["event_relations"]["relations"]]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, len(TEXT)])
+def test_chunked_feed_matches_json_loads(size):
+    parser = IncrementalJSONParser()
+    emitted = []
+    for start in range(0, len(TEXT), size):
+        emitted.extend(parser.feed(TEXT[start:start + size]))
+    assert emitted == EXPECTED
+    assert parser.finished and parser.skipped_elements == 0
+    assert parser.result() == DOCUMENT
+
+
+def test_elements_arrive_before_the_document_ends():
+    parser = IncrementalJSONParser()
+    text = json.dumps(DOCUMENT)
+    cut = text.index('"relations"')
+    assert [element["id"] for _, element in parser.feed(text[:cut])] == ["e1", "e2"]
+    with pytest.raises(json.JSONDecodeError):
+        parser.result()
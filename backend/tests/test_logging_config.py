@@ -0,0 +1,22 @@
+# test_logging_config.py
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_with_level(level):
+    env = dict(os.environ, ANANSI_LOG_LEVEL=level)
+    return subprocess.run([sys.executable, "-c", "import logging_config; print(logging_config.LEVEL)"],
+                          cwd=BACKEND, env=env, capture_output=True, text=True)
+
+
+def test_level_names_are_case_insensitive():
+    assert _import_with_level("warning").stdout.strip() == "30"
+
+
+def test_misspelled_level_fails_with_a_clear_message():
+    result = _import_with_level("WARN1NG")
+    assert result.returncode != 0
+    assert "ANANSI_LOG_LEVEL must be one of" in result.stderr
@@ -0,0 +1,27 @@
+# test_metrics.py
+import json
+import os
+
+import metrics
+
+LABELS = ("/test", "GET", "200")
+
+
+def _snapshot(directory, pid, boot_id, started_at, value):
+    with open(os.path.join(directory, f"metrics-{pid}-{boot_id}.json"), "w", encoding="utf-8") as handle:
+        json.dump({"pid": pid, "boot_id": boot_id, "started_at": started_at,
+                   "metrics": {metrics.HTTP_REQUESTS.name: [[list(LABELS), value]]}}, handle)
+
+
+def test_an_earlier_process_with_this_pid_keeps_counting(tmp_path, monkeypatch):
+    # A restarted worker that gets the dead worker's pid must not replace its counts.
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_values", {name: {} for name in metrics._metrics})
+    _snapshot(str(tmp_path), os.getpid(), "earlierboot", 1.0, 5)
+    metrics.inc(metrics.HTTP_REQUESTS, LABELS)
+
+    assert metrics._collect()[metrics.HTTP_REQUESTS.name][LABELS] == 6
+    assert not (tmp_path / f"metrics-{os.getpid()}-earlierboot.json").exists()
+    assert (tmp_path / "retained-metrics.json").exists()
+    # Folded once: collecting again does not add the dead snapshot twice.
+    assert metrics._collect()[metrics.HTTP_REQUESTS.name][LABELS] == 6
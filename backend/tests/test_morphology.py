@@ -0,0 +1,74 @@
+# test_morphology.py
+import pytest
+
+import morphology_cache
+import temporal_reasoning
+from analysis_cache import TieredCache
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = TieredCache(db_path=str(tmp_path / "morphology.sqlite3"), table=morphology_cache.TABLE)
+    monkeypatch.setattr(morphology_cache, "get_store", lambda: store)
+    return store
+
+
+def test_normalize_word_strips_punctuation_and_keeps_case():
+    assert morphology_cache.normalize_word(" ¿casas, ") == "casas"
+    assert morphology_cache.normalize_word("Turkey") != morphology_cache.normalize_word("turkey")
+
+
+def test_words_of_keeps_hyphens_and_elisions():
+    assert morphology_cache.words_of("L'homme, el perro-guardián y 3 gatos.") == [
+        "L'homme", "el", "perro-guardián", "y", "gatos"]
+
+
+def test_pack_words_respects_the_budget(monkeypatch):
+    monkeypatch.setattr(morphology_cache, "ANSWER_TOKENS", 10)
+    batches = morphology_cache.pack_words(["a", "b", "c", "d", "e"], budget=25)
+    assert batches == [["a", "b"], ["c", "d"], ["e"]]
+    assert morphology_cache.pack_words(["a"], budget=1) == [["a"]]
+
+
+def test_case_variants_are_separate_entries(store):
+    prompts = temporal_reasoning.MORPHOLOGY_PROMPTS
+    morphology_cache.remember("Polish", "English", prompts, "An adjective: from Poland.")
+    assert morphology_cache.lookup("Polish", "English", prompts)[0] == "An adjective: from Poland."
+    assert morphology_cache.lookup("polish", "English", prompts) == (None, "miss")
+
+
+def test_batch_dedupes_serves_hits_and_packs_misses(store, monkeypatch):
+    calls = []
+
+    def fake(batch, language, use_cache=True):
+        calls.append(list(batch))
+        return {word: f"analysis of {word}" for word in batch if word != "missing"}
+
+    monkeypatch.setattr(temporal_reasoning, "analyze_words_morphology", fake)
+    morphology_cache.remember("casa", "Spanish", temporal_reasoning.MORPHOLOGY_PROMPTS, "stored")
+    results, meta = temporal_reasoning.analyze_morphology_batch(
+        ["casa", "perro,", "perro", "missing", "gato"], "Spanish")
+    assert calls == [["perro", "missing", "gato"]]
+    assert meta == {"words": 5, "unique": 4, "cache_hits": 1, "calls": 1}
+    assert [(r["word"], r["analysis"], r["cache"]) for r in results] == [
+        ("casa", "stored", "memory"), ("perro,", "analysis of perro", "miss"),
+        ("missing", "", "miss"), ("gato", "analysis of gato", "miss")]
+    assert results[2]["error"]
+
+
+def test_batch_caps_distinct_words(monkeypatch):
+    monkeypatch.setattr(morphology_cache, "BATCH_MAX_WORDS", 2)
+    with pytest.raises(ValueError):
+        temporal_reasoning.analyze_morphology_batch(["a", "b", "c", "a"], "English")
+
+
+def test_single_word_call_counts_its_tokens(store, monkeypatch):
+    from types import SimpleNamespace
+
+    import tokens
+
+    answer = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="This is a noun."))])
+    monkeypatch.setattr(temporal_reasoning, "chat_completion", lambda *args, **kwargs: answer)
+    before = tokens.token_stats().get("morphology", {}).get("calls", 0)
+    temporal_reasoning.analyze_word_morphology("casa", "Spanish", use_cache=False)
+    assert tokens.token_stats()["morphology"]["calls"] == before + 1
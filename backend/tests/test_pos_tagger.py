@@ -0,0 +1,14 @@
+# test_pos_tagger.py
+import pos_tagger
+
+
+def test_tokenize_splits_clitics_and_keeps_abbreviations():
+    assert pos_tagger.tokenize("Dr. Smith didn't come at 3 p.m. It rained.") == [
+        ["Dr.", "Smith", "did", "n't", "come", "at", "3", "p.m."], ["It", "rained", "."]]
+
+
+def test_tag_text_tags_closed_class_words():
+    tags = {item["token"]: item["pos"] for item in pos_tagger.tag_text("The cat sat on the mat.", "English")}
+    assert tags["The"] == "DET" and tags["on"] == "ADP" and tags["."] == "PUNCT"
+    tags = {item["token"]: item["pos"] for item in pos_tagger.tag_text("El gato duerme en la casa.", "Spanish")}
+    assert tags["El"] == "DET" and tags["en"] == "ADP"
@@ -0,0 +1,44 @@
+# test_resilience.py
+import httpx
+import openai
+import pytest
+
+import resilience
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = resilience.CircuitBreaker(threshold=1, cooldown=0)
+    monkeypatch.setattr(resilience, "get_breaker", lambda model: breaker)
+    return breaker
+
+
+def _half_open(breaker):
+    # Open with no cooldown left: the next call is the half-open trial.
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_local_error_does_not_close_a_half_open_breaker(breaker):
+    _half_open(breaker)
+
+    def attempt(remaining):
+        raise TypeError("bug in the caller")
+
+    with pytest.raises(TypeError):
+        resilience.call_with_retries("events", "model", attempt)
+    assert breaker.state == "open"
+    assert breaker.allow()
+
+
+def test_non_retryable_upstream_answer_closes_the_breaker(breaker):
+    _half_open(breaker)
+    request = httpx.Request("POST", "http://upstream/v1/chat/completions")
+    error = openai.BadRequestError("bad request", response=httpx.Response(400, request=request), body=None)
+
+    def attempt(remaining):
+        raise error
+
+    with pytest.raises(openai.BadRequestError):
+        resilience.call_with_retries("events", "model", attempt)
+    assert breaker.state == "closed"
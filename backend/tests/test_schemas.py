@@ -0,0 +1,60 @@
+# test_schemas.py
+import pytest
+from pydantic import ValidationError
+
+import schemas
+
+
+@pytest.mark.parametrize("analysis", ["events", "causation", "entities", "pos"])
+def test_wrong_top_level_type_is_rejected(analysis):
+    before = schemas.validation_stats().get(analysis, {}).get("rejected", 0)
+    with pytest.raises(ValidationError):
+        schemas.validate(analysis, "not an object")
+    assert schemas.validation_stats()[analysis]["rejected"] == before + 1
+
+
+def test_events_missing_keys_and_coerced_types():
+    shaped = schemas.validate_result("events", {
+        "events": [{"event_type": None, "agent": ["police", "army"]}, "stray text"],
+        "named_entities": {"dates": ["March 3"], "persons": "nobody"},
+        "summary": 42,
+        "unknown": True,
+    })
+    assert shaped["events"][0]["event_type"] == ""
+    assert shaped["events"][0]["agent"] == "police, army"
+    assert len(shaped["events"]) == 1
+    assert shaped["named_entities"]["dates"] == [{"entity": "March 3", "type": "", "description": ""}]
+    assert shaped["named_entities"]["persons"] == []
+    assert shaped["named_entities"]["locations"] == []
+    assert shaped["timeline_of_events"] == [] and shaped["temporal_references"] == []
+    assert shaped["summary"] == "42"
+    assert "unknown" not in shaped and "error" not in shaped
+
+
+def test_causation_malformed_shape_falls_back_to_defaults():
+    shaped = schemas.validate_result("causation", {
+        "events": ["e1", "e2"],
+        "relations": {"source": 1, "target": "e2", "type": None},
+    })
+    assert shaped["events"] == {}
+    assert shaped["relations"] == [{"source": "1", "target": "e2", "type": ""}]
+
+
+def test_entities_accept_the_old_key_and_keep_notes():
+    shaped = schemas.validate_result("entities", {
+        "entity_relations": [{"source_relation": "Ana", "target_entity": "Lima", "relation": "lives in"}, 7],
+        "warning": "salvaged",
+    })
+    assert shaped["entity_relations"] == [{"source_entity": "Ana", "target_entity": "Lima", "relation": "lives in"}]
+    assert shaped["warning"] == "salvaged"
+    # The "error" note must survive validation: it marks the section failed
+    # and keeps the result out of the cache.
+    assert schemas.validate_result("entities", {"error": "JSON parsing failed"})["error"] == "JSON parsing failed"
+    assert schemas.validate_result("entities", {})["entity_relations"] == []
+
+
+def test_pos_takes_a_plain_list_and_drops_non_objects():
+    before = schemas.validation_stats().get("pos", {}).get("dropped_items", 0)
+    validated = schemas.validate("pos", [{"token": "Ana", "pos": "PROPN"}, ["x"], {"token": 5}])
+    assert validated.model_dump()["tokens"] == [{"token": "Ana", "pos": "PROPN"}, {"token": "5", "pos": ""}]
+    assert schemas.validation_stats()["pos"]["dropped_items"] == before + 1
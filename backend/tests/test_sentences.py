@@ -0,0 +1,33 @@
+# test_sentences.py
+import sentences
+
+
+def test_paragraph_break_ends_a_sentence():
+    assert len(sentences.segment("Hello there.\n\nbob went home. He slept.")) == 3
+    assert len(sentences.segment("Hello there. bob went home. He slept.")) == 2
+
+
+def test_abbreviations_do_not_end_a_sentence():
+    text = "Dr. Smith arrived. The Sra. Gómez left."
+    assert [text[s["start"]:s["end"]] for s in sentences.segment(text)] == [
+        "Dr. Smith arrived.", "The Sra. Gómez left."]
+
+
+def test_fingerprint_follows_breaks_not_spacing():
+    assert sentences.fingerprint("A cat.  B dog.") == sentences.fingerprint("A cat. B  dog.")
+    assert sentences.fingerprint("A cat.\n\nb dog.") != sentences.fingerprint("A cat. b dog.")
+
+
+def test_expand_events_writes_out_the_sentence():
+    text = "It rained. We stayed home."
+    events = sentences.expand_events([{"sentence_id": "s2"}, {"sentence_id": "s9"}, {"event": "x"}], text)
+    assert events[0]["sentence"] == "We stayed home."
+    assert text[events[0]["sentence_start"]:events[0]["sentence_end"]] == "We stayed home."
+    assert events[1]["sentence"] == "" and events[1]["sentence_start"] is None
+    assert events[2] == {"event": "x"}
+
+
+def test_renumber_events_maps_chunk_ids():
+    events = [{"sentence_id": "s1"}, {"sentence_id": "[s2]"}, {"sentence_id": "s7"}]
+    sentences.renumber_events(events, ["s4", "s5"])
+    assert [event["sentence_id"] for event in events] == ["s4", "s5", "s7"]
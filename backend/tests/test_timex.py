@@ -0,0 +1,28 @@
+# test_timex.py
+from datetime import date
+
+import timex
+
+DOC = date(2023, 5, 1)
+
+
+def _found(text):
+    return [(found["text"], found["value"]) for found in timex.extract(text, DOC, "English")]
+
+
+def test_lowercase_english_month_needs_a_year():
+    assert _found("They march 10 miles.") == []
+    assert _found("We stay until may") == []
+    assert _found("On March 10 we met.") == [("March 10", "2023-03-10")]
+    assert _found("on march 10, 2023") == [("march 10, 2023", "2023-03-10")]
+
+
+def test_spanish_months_stay_lowercase():
+    assert [(found["text"], found["value"]) for found in timex.extract("el 10 de marzo", DOC, "Spanish")] \
+        == [("10 de marzo", "2023-03-10")]
+
+
+def test_time_leaves_the_final_period():
+    assert _found("We met at 3 pm.") == [("at 3 pm", "2023-05-01T15:00")]
+    assert _found("We met at 3 p.m.") == [("at 3 p.m", "2023-05-01T15:00")]
+    assert _found("at 3 p.m. yesterday")[0] == ("at 3 p.m.", "2023-05-01T15:00")
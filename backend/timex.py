@@ -0,0 +1,623 @@
+# timex.py
+"""
+Rule-based extraction and normalization of temporal expressions (TIMEX3
+style) in English and Spanish text.
+
+extract() finds absolute ("January 15, 2023", "15 de enero de 2023",
+"2023-01-15", "in 2023"), relative ("yesterday", "Ayer", "hace tres días",
+"last week", "el lunes pasado", "hace rato"), durational ("for two hours",
+"durante 3 años"), set ("every day", "todos los lunes") and clock-time
+("at 3 pm", "a las 15:30") expressions and resolves them against the
+document date:
+
+  {"tid": "t1", "text": "Ayer", "start": 0, "end": 4, "type": "DATE",
+   "value": "2023-01-19", "relative": true,
+   "interval_us": [1674086400000000, 1674172800000000], "duration_us": null}
+
+"value" follows TIMEX3: YYYY-MM-DD, YYYY-MM, YYYY, YYYY-Www, YYYY-MM-DDTHH:MM,
+YYYY-MM-DDTMO/AF/EV/NI (parts of the day), PnD/PTnH... (durations) and
+PRESENT_REF / PAST_REF / FUTURE_REF. "interval_us" is the [start, end)
+interval the value covers, in microseconds since the Unix epoch (UTC); a
+duration has "duration_us" instead (months count as 30 days and years as 365).
+Relative expressions get a null value when there is no document date.
+
+The pipeline uses it to
+  - pass the resolved expressions to the events prompt as hints
+  - annotate the events section (annotate_events()): the expressions are
+    returned under "timexes", relative timeline dates the model left
+    unnormalized ("Ayer") are replaced by their ISO value, and empty
+    temporal_references / timeline_of_events are pre-filled locally
+
+Tunables (environment variables):
+  ANANSI_TIMEX_HINTS       "0" stops adding hints to the prompts   (default "1")
+  ANANSI_TIMEX_MAX_HINTS   most expressions listed in a prompt      (default 40)
+"""
+import calendar
+import os
+import re
+import unicodedata
+from datetime import date, datetime, timedelta, timezone
+
+HINTS_ENABLED = os.environ.get("ANANSI_TIMEX_HINTS", "1") != "0"
+MAX_HINTS = int(os.environ.get("ANANSI_TIMEX_MAX_HINTS", "40"))
+
+# Bumped whenever the rules change, so cached analyses built with older hints
+# are not reused.
+RULES_VERSION = "2"
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4, "apr": 4,
+    "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7, "august": 8, "aug": 8,
+    "september": 9, "sep": 9, "sept": 9, "october": 10, "oct": 10, "november": 11, "nov": 11,
+    "december": 12, "dec": 12,
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+# Spanish month names are written in lowercase; English ones are capitalized.
+_SPANISH_MONTHS = {"enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto", "septiembre",
+                   "setiembre", "octubre", "noviembre", "diciembre"}
+
+WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+    "lunes": 0, "martes": 1, "miércoles": 2, "miercoles": 2, "jueves": 3, "viernes": 4,
+    "sábado": 5, "sabado": 5, "domingo": 6,
+}
+
+NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "fifteen": 15, "twenty": 20,
+    "thirty": 30,
+    "un": 1, "una": 1, "uno": 1, "dos": 2, "tres": 3, "cuatro": 4, "cinco": 5, "seis": 6,
+    "siete": 7, "ocho": 8, "nueve": 9, "diez": 10, "once": 11, "doce": 12, "quince": 15,
+    "veinte": 20, "treinta": 30,
+}
+
+UNITS = {
+    "second": "S", "seconds": "S", "segundo": "S", "segundos": "S",
+    "minute": "MIN", "minutes": "MIN", "minuto": "MIN", "minutos": "MIN",
+    "hour": "H", "hours": "H", "hora": "H", "horas": "H",
+    "day": "D", "days": "D", "día": "D", "días": "D", "dia": "D", "dias": "D",
+    "week": "W", "weeks": "W", "semana": "W", "semanas": "W",
+    "month": "M", "months": "M", "mes": "M", "meses": "M",
+    "year": "Y", "years": "Y", "año": "Y", "años": "Y",
+    "decade": "DE", "decades": "DE", "década": "DE", "décadas": "DE",
+}
+
+_UNIT_MICROSECONDS = {
+    "S": 10 ** 6, "MIN": 60 * 10 ** 6, "H": 3600 * 10 ** 6, "D": 86400 * 10 ** 6,
+    "W": 7 * 86400 * 10 ** 6, "M": 30 * 86400 * 10 ** 6, "Y": 365 * 86400 * 10 ** 6,
+    "DE": 3650 * 86400 * 10 ** 6,
+}
+
+# Parts of the day: TIMEX3 suffix and the hours they cover.
+PARTS_OF_DAY = {
+    "morning": "MO", "mañana": "MO", "afternoon": "AF", "tarde": "AF",
+    "evening": "EV", "night": "NI", "noche": "NI",
+}
+_PART_HOURS = {"MO": (6, 12), "AF": (12, 18), "EV": (18, 22), "NI": (22, 30)}
+
+# Vague references that still fall on the document's day ("hace rato").
+_SAME_DAY_PAST = ("hace rato", "hace un rato", "hace un ratito", "hace un momento", "earlier today",
+                  "a moment ago", "a little while ago")
+_REFS = {
+    "PRESENT_REF": ("now", "right now", "currently", "nowadays", "these days", "ahora", "ahora mismo",
+                    "actualmente", "hoy en día", "hoy en dia", "en este momento"),
+    "PAST_REF": _SAME_DAY_PAST + ("recently", "lately", "a while ago", "recientemente", "hace poco",
+                                  "últimamente", "ultimamente"),
+    "FUTURE_REF": ("soon", "shortly", "pronto", "próximamente", "proximamente", "dentro de poco"),
+}
+
+
+def _alternation(words):
+    # Longest first, so "septiembre" is tried before "sep".
+    return "|".join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+
+
+_MONTH = _alternation(MONTHS)
+_WEEKDAY = _alternation(WEEKDAYS)
+_NUMBER = r"\d{1,3}|" + _alternation(NUMBERS)
+_UNIT = _alternation(UNITS)
+
+
+# -------------------- Calendar helpers --------------------
+
+def _us(moment):
+    if not isinstance(moment, datetime):
+        moment = datetime(moment.year, moment.month, moment.day)
+    return (moment.replace(tzinfo=timezone.utc) - _EPOCH) // timedelta(microseconds=1)
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def _day(day):
+    return {"type": "DATE", "value": day.isoformat(), "interval": (day, day + timedelta(days=1))}
+
+
+def _week(day):
+    monday = day - timedelta(days=day.weekday())
+    year, week, _ = monday.isocalendar()
+    return {"type": "DATE", "value": f"{year}-W{week:02d}", "interval": (monday, monday + timedelta(days=7))}
+
+
+def _month(year, month):
+    first = date(year, month, 1)
+    return {"type": "DATE", "value": f"{year:04d}-{month:02d}", "interval": (first, _add_months(first, 1))}
+
+
+def _year(year):
+    return {"type": "DATE", "value": f"{year:04d}", "interval": (date(year, 1, 1), date(year + 1, 1, 1))}
+
+
+def _part_of_day(day, part):
+    start, end = _PART_HOURS[part]
+    midnight = datetime(day.year, day.month, day.day)
+    return {"type": "TIME", "value": f"{day.isoformat()}T{part}",
+            "interval": (midnight + timedelta(hours=start), midnight + timedelta(hours=end))}
+
+
+def _clock(day, hour, minute, precise):
+    moment = datetime(day.year, day.month, day.day, hour, minute)
+    return {"type": "TIME", "value": moment.strftime("%Y-%m-%dT%H:%M"),
+            "interval": (moment, moment + (timedelta(minutes=1) if precise else timedelta(hours=1)))}
+
+
+def _by_unit(day, unit):
+    """
+    The calendar unit containing *day* at the granularity of *unit*.
+    """
+    if unit == "W":
+        return _week(day)
+    if unit == "M":
+        return _month(day.year, day.month)
+    if unit in ("Y", "DE"):
+        return _year(day.year)
+    return _day(day)
+
+
+def _shift(day, unit, amount):
+    if unit in ("S", "MIN", "H"):
+        # Sub-day offsets stay on the document's day.
+        return day
+    if unit == "D":
+        return day + timedelta(days=amount)
+    if unit == "W":
+        return day + timedelta(weeks=amount)
+    months = {"M": 1, "Y": 12, "DE": 120}[unit]
+    return _add_months(day, amount * months)
+
+
+def _duration_value(unit, amount):
+    if unit == "DE":
+        return f"P{amount * 10}Y"
+    if unit in ("S", "MIN", "H"):
+        return f"PT{amount}{'M' if unit == 'MIN' else unit}"
+    return f"P{amount}{unit}"
+
+
+def _number(text):
+    text = text.lower()
+    return int(text) if text.isdigit() else NUMBERS.get(text)
+
+
+def _year_number(text):
+    year = int(text)
+    if len(text) == 2:
+        year += 2000 if year < 50 else 1900
+    return year
+
+
+def _month_name(name, year):
+    """
+    Returns the number of month *name*, or None for a lowercase English name
+    without a year ("They march 10 miles", "until may").
+    """
+    if year is None and name.islower() and name not in _SPANISH_MONTHS:
+        return None
+    return MONTHS[name.lower()]
+
+
+def _valid_day(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+# -------------------- Rules --------------------
+# Each rule is (pattern, handler). A handler gets the match, the document date
+# (or None) and the language and returns {"type", "value", "interval" or
+# "duration_us", "relative"} or None to reject the match. A named group "t"
+# narrows the expression's span (e.g. "in 2023" -> "2023").
+
+_RULES = []
+
+
+def _rule(pattern):
+    compiled = re.compile(r"(?<!\w)(?:" + pattern + r")(?!\w)", re.IGNORECASE)
+
+    def register(handler):
+        _RULES.append((compiled, handler))
+        return handler
+    return register
+
+
+@_rule(r"(?P<y>\d{4})[-/](?P<m>\d{1,2})[-/](?P<d>\d{1,2})")
+def _iso_date(match, doc, language):
+    day = _valid_day(int(match["y"]), int(match["m"]), int(match["d"]))
+    return day and dict(_day(day), relative=False)
+
+
+@_rule(r"(?P<a>\d{1,2})[/.](?P<b>\d{1,2})[/.](?P<y>\d{4}|\d{2})")
+def _numeric_date(match, doc, language):
+    first, second, year = int(match["a"]), int(match["b"]), _year_number(match["y"])
+    # Day first in Spanish, month first in English, unless that cannot be a date.
+    day_first = str(language or "").lower().startswith(("spanish", "español", "espanol", "es"))
+    if first > 12:
+        day_first = True
+    elif second > 12:
+        day_first = False
+    day = _valid_day(year, second, first) if day_first else _valid_day(year, first, second)
+    return day and dict(_day(day), relative=False)
+
+
+@_rule(r"(?P<mon>" + _MONTH + r")\.?\s+(?P<d>\d{1,2})(?:st|nd|rd|th)?(?:,?\s+(?P<y>\d{4}))?")
+def _month_day_year(match, doc, language):
+    month = _month_name(match["mon"], match["y"])
+    year = int(match["y"]) if match["y"] else (doc.year if doc else None)
+    if month is None or year is None:
+        return None
+    day = _valid_day(year, month, int(match["d"]))
+    return day and dict(_day(day), relative=not match["y"])
+
+
+@_rule(r"(?P<d>\d{1,2})(?:st|nd|rd|th|º|°)?\s+(?:of\s+|de\s+)?(?P<mon>" + _MONTH
+       + r")\.?(?:,?\s+(?:de\s+|del\s+)?(?P<y>\d{4}))?")
+def _day_month_year(match, doc, language):
+    return _month_day_year(match, doc, language)
+
+
+@_rule(r"(?P<mon>" + _MONTH + r")\.?,?\s+(?:de\s+|del\s+|of\s+)?(?P<y>\d{4})")
+def _month_year(match, doc, language):
+    return dict(_month(int(match["y"]), MONTHS[match["mon"].lower()]), relative=False)
+
+
+@_rule(r"(?:in|since|until|by|during|early|late|en|desde|hasta|durante|a\s+principios\s+de|a\s+finales\s+de)"
+       r"\s+(?P<t>(?P<mon>" + _MONTH + r"))")
+def _bare_month(match, doc, language):
+    # Month names alone are only taken after a preposition ("may" is a verb).
+    month = _month_name(match["mon"], None)
+    if doc is None or month is None:
+        return None
+    return dict(_month(doc.year, month), relative=True)
+
+
+@_rule(r"(?:in|since|until|by|during|of|en|desde|hasta|durante|del|de)\s+(?:the\s+year\s+|el\s+año\s+)?"
+       r"(?P<t>(?P<y>1[89]\d\d|20\d\d))")
+def _bare_year(match, doc, language):
+    return dict(_year(int(match["y"])), relative=False)
+
+
+@_rule(r"(?P<w>the\s+day\s+before\s+yesterday|anteayer|antier|antes\s+de\s+ayer"
+       r"|the\s+day\s+after\s+tomorrow|pasado\s+mañana|yesterday|ayer|today|hoy|tomorrow"
+       r"|(?<!la\s)(?<!esta\s)(?<!cada\s)(?<!por\s)mañana)"
+       r"(?:\s+(?:por\s+la\s+|in\s+the\s+|at\s+)?(?P<part>morning|afternoon|evening|night|mañana|tarde|noche))?")
+def _relative_day(match, doc, language):
+    if doc is None:
+        return {"type": "DATE", "value": None, "relative": True}
+    word = " ".join(match["w"].lower().split())
+    offset = {
+        "the day before yesterday": -2, "anteayer": -2, "antier": -2, "antes de ayer": -2,
+        "the day after tomorrow": 2, "pasado mañana": 2, "yesterday": -1, "ayer": -1,
+        "today": 0, "hoy": 0, "tomorrow": 1, "mañana": 1,
+    }[word]
+    day = doc + timedelta(days=offset)
+    if match["part"]:
+        return dict(_part_of_day(day, PARTS_OF_DAY[match["part"].lower()]), relative=True)
+    return dict(_day(day), relative=True)
+
+
+@_rule(r"(?:this|tonight|esta|anoche|last)(?:\s+(?P<part>morning|afternoon|evening|night|mañana|tarde|noche))?")
+def _relative_part_of_day(match, doc, language):
+    word = match.group(0).split()[0].lower()
+    part = match["part"].lower() if match["part"] else None
+    if word in ("tonight", "anoche"):
+        if part:
+            return None
+        part = "night"
+    elif part is None or (word == "last" and part != "night"):
+        return None
+    if doc is None:
+        return {"type": "TIME", "value": None, "relative": True}
+    day = doc - timedelta(days=1) if word in ("anoche", "last") else doc
+    return dict(_part_of_day(day, PARTS_OF_DAY[part]), relative=True)
+
+
+@_rule(r"(?:(?P<en>last|past|previous|this|next|coming|following)\s+(?P<u1>week|month|year)"
+       r"|(?:la|el)\s+(?P<u2>semana|mes|año)\s+(?P<es>pasad[oa]|anterior|próxim[oa]|proxim[oa]|siguiente|entrante|que\s+viene)"
+       r"|(?:la|el)\s+(?P<es2>próxim[oa]|proxim[oa]|pasad[oa])\s+(?P<u3>semana|mes|año)"
+       r"|(?P<es3>esta|este)\s+(?P<u4>semana|mes|año))")
+def _relative_unit(match, doc, language):
+    unit = UNITS[(match["u1"] or match["u2"] or match["u3"] or match["u4"]).lower()]
+    word = (match["en"] or match["es"] or match["es2"] or match["es3"]).lower()
+    if word in ("last", "past", "previous", "pasado", "pasada", "anterior"):
+        offset = -1
+    elif word in ("this", "esta", "este"):
+        offset = 0
+    else:
+        offset = 1
+    if doc is None:
+        return {"type": "DATE", "value": None, "relative": True}
+    return dict(_by_unit(_shift(doc, unit, offset), unit), relative=True)
+
+
+@_rule(r"(?:(?P<n1>" + _NUMBER + r")\s+(?P<u1>" + _UNIT + r")\s+ago"
+       r"|hace\s+(?P<n2>" + _NUMBER + r")\s+(?P<u2>" + _UNIT + r")"
+       r"|(?:in|within)\s+(?P<n3>" + _NUMBER + r")\s+(?P<u3>" + _UNIT + r")"
+       r"|(?P<n4>" + _NUMBER + r")\s+(?P<u4>" + _UNIT + r")\s+from\s+now"
+       r"|dentro\s+de\s+(?P<n5>" + _NUMBER + r")\s+(?P<u5>" + _UNIT + r"))")
+def _offset(match, doc, language):
+    for index, sign in (("1", -1), ("2", -1), ("3", 1), ("4", 1), ("5", 1)):
+        if match["n" + index]:
+            amount, unit = _number(match["n" + index]), UNITS[match["u" + index].lower()]
+            break
+    if amount is None:
+        return None
+    if doc is None:
+        return {"type": "DATE", "value": None, "relative": True}
+    return dict(_by_unit(_shift(doc, unit, sign * amount), unit), relative=True)
+
+
+@_rule(r"(?:(?P<en>last|next|this|on|coming)\s+)?(?:(?P<el>el|este|los)\s+)?(?:(?P<es_pre>próximo|proximo|pasado)\s+)?"
+       r"(?P<wd>" + _WEEKDAY + r")(?:\s+(?P<es>pasado|próximo|proximo|que\s+viene|anterior))?")
+def _weekday(match, doc, language):
+    weekday = WEEKDAYS[match["wd"].lower()]
+    modifier = (match["en"] or match["es_pre"] or match["es"] or "").lower()
+    if doc is None:
+        return {"type": "DATE", "value": None, "relative": True}
+    if modifier in ("next", "coming", "próximo", "proximo", "que viene"):
+        day = doc + timedelta(days=(weekday - doc.weekday() - 1) % 7 + 1)
+    elif modifier in ("last", "pasado", "anterior"):
+        day = doc - timedelta(days=(doc.weekday() - weekday - 1) % 7 + 1)
+    elif modifier == "this":
+        day = doc + timedelta(days=weekday - doc.weekday())
+    else:
+        # A bare weekday in reporting usually means the most recent one.
+        day = doc - timedelta(days=(doc.weekday() - weekday) % 7)
+    return dict(_day(day), relative=True)
+
+
+@_rule(r"(?:(?:for|during|over)\s+(?:the\s+(?P<past1>past|last)\s+)?|(?:durante|por)\s+(?:(?:los|las)\s+(?P<past2>últim[oa]s|ultim[oa]s)\s+)?"
+       r"|(?:the\s+(?P<past3>past|last)\s+)|(?:(?:los|las)\s+(?P<past4>últim[oa]s|ultim[oa]s)\s+))"
+       r"(?P<n>" + _NUMBER + r")\s+(?P<u>" + _UNIT + r")")
+def _duration(match, doc, language):
+    amount, unit = _number(match["n"]), UNITS[match["u"].lower()]
+    if amount is None:
+        return None
+    result = {"type": "DURATION", "value": _duration_value(unit, amount),
+              "duration_us": amount * _UNIT_MICROSECONDS[unit], "relative": False}
+    if (match["past1"] or match["past2"] or match["past3"] or match["past4"]) and doc is not None:
+        # "the past three days" is anchored: it ends with the document's day.
+        end = doc + timedelta(days=1)
+        result["interval"] = (_shift(end, unit, -amount) if unit not in ("S", "MIN", "H") else doc, end)
+        result["relative"] = True
+    return result
+
+
+@_rule(r"(?P<n>\d{1,3})-(?P<u>second|minute|hour|day|week|month|year)(?:-long)?")
+def _compound_duration(match, doc, language):
+    unit, amount = UNITS[match["u"].lower()], int(match["n"])
+    return {"type": "DURATION", "value": _duration_value(unit, amount),
+            "duration_us": amount * _UNIT_MICROSECONDS[unit], "relative": False}
+
+
+@_rule(r"(?:every|each|cada)\s+(?P<u1>day|week|month|year|día|dia|semana|mes|año)"
+       r"|todos\s+los\s+(?P<u2>días|dias|meses|años)|todas\s+las\s+(?P<u3>semanas)"
+       r"|(?P<adv>daily|weekly|monthly|yearly|annually|diariamente|semanalmente|mensualmente|anualmente)")
+def _set(match, doc, language):
+    word = (match["u1"] or match["u2"] or match["u3"] or "").lower()
+    adverbs = {"daily": "D", "diariamente": "D", "weekly": "W", "semanalmente": "W",
+               "monthly": "M", "mensualmente": "M", "yearly": "Y", "annually": "Y", "anualmente": "Y"}
+    unit = adverbs[match["adv"].lower()] if match["adv"] else UNITS[word]
+    return {"type": "SET", "value": f"P1{unit}", "relative": False}
+
+
+@_rule(r"(?:every|each|cada)\s+(?P<w1>" + _WEEKDAY + r")|todos\s+los\s+(?P<w2>lunes|martes|miércoles|miercoles"
+       r"|jueves|viernes|sábados|sabados|domingos)|(?P<w3>mondays|tuesdays|wednesdays|thursdays|fridays|saturdays|sundays)")
+def _weekday_set(match, doc, language):
+    word = (match["w1"] or match["w2"] or match["w3"]).lower()
+    weekday = WEEKDAYS.get(word, WEEKDAYS.get(word.rstrip("s")))
+    if weekday is None:
+        return None
+    return {"type": "SET", "value": f"XXXX-WXX-{weekday + 1}", "relative": False}
+
+
+@_rule(r"(?:at\s+|around\s+|a\s+las\s+|a\s+la\s+|sobre\s+las\s+)?(?P<h>\d{1,2})(?::(?P<min>\d{2}))?\s*"
+       # The dot of "p.m." is left to end the sentence ("at 3 p.m. Then", "at 3 pm.").
+       r"(?P<ampm>[ap](?:\.\s?m\.(?!\s*$|\s+(?-i:[A-Z]))|\.?\s?m))"
+       r"|(?:at\s+|a\s+las\s+)(?P<h2>\d{1,2}):(?P<min2>\d{2})(?:\s+(?:hours|horas|hrs|h))?"
+       r"|a\s+las\s+(?P<h3>\d{1,2}|" + _alternation(n for n in NUMBERS if NUMBERS[n] <= 12 and len(n) > 2) + r")"
+       r"(?:\s+de\s+la\s+(?P<part3>mañana|tarde|noche))?"
+       r"|(?P<named>noon|midday|midnight|mediodía|mediodia|medianoche)")
+def _time(match, doc, language):
+    if match["named"]:
+        hour, minute = (0, 0) if match["named"].lower() in ("midnight", "medianoche") else (12, 0)
+        precise = True
+    elif match["h"]:
+        hour, minute = int(match["h"]), int(match["min"] or 0)
+        if hour > 12:
+            return None
+        pm = match["ampm"].lower().startswith("p")
+        hour = hour % 12 + (12 if pm else 0)
+        precise = match["min"] is not None
+    elif match["h2"]:
+        hour, minute, precise = int(match["h2"]), int(match["min2"]), True
+    else:
+        hour, minute, precise = _number(match["h3"]), 0, False
+        part = (match["part3"] or "").lower()
+        if part in ("tarde", "noche") and hour < 12:
+            hour += 12
+    if hour is None or hour > 23 or minute > 59:
+        return None
+    if doc is None:
+        return {"type": "TIME", "value": f"XXXX-XX-XXT{hour:02d}:{minute:02d}", "relative": True}
+    return dict(_clock(doc, hour, minute, precise), relative=True)
+
+
+@_rule(_alternation(word for words in _REFS.values() for word in words))
+def _reference(match, doc, language):
+    phrase = " ".join(match.group(0).lower().split())
+    value = next(ref for ref, words in _REFS.items() if phrase in words)
+    result = {"type": "DATE", "value": value, "relative": True}
+    if doc is not None and (value == "PRESENT_REF" or phrase in _SAME_DAY_PAST):
+        result["interval"] = _day(doc)["interval"]
+    return result
+
+
+# -------------------- Extraction --------------------
+
+def parse_doc_date(doc_date, language="English"):
+    """
+    Returns the document date as a date, or None if it is empty or cannot be
+    read as a single day.
+    """
+    text = " ".join(str(doc_date or "").split())
+    if not text:
+        return None
+    iso = re.match(r"^(\d{4})-(\d{2})-(\d{2})", text)
+    if iso:
+        return _valid_day(*(int(part) for part in iso.groups()))
+    for timex in extract(text, None, language):
+        value = timex["value"] or ""
+        if timex["type"] == "DATE" and re.match(r"^\d{4}-\d{2}-\d{2}$", value):
+            return date.fromisoformat(value)
+    return None
+
+
+def extract(text, doc_date=None, language="English"):
+    """
+    Finds and normalizes the temporal expressions in *text*.
+
+    :param text: The text to scan
+    :param doc_date: Document date (a date, or a string parse_doc_date()
+                     understands); relative expressions are resolved against it
+    :param language: Language of the text; decides whether 03/04/2023 is
+                     day-first (Spanish) or month-first (English)
+    :return: list of timex dicts in text order (see the module docstring)
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    doc = doc_date if isinstance(doc_date, date) or doc_date is None else parse_doc_date(doc_date, language)
+    candidates = []
+    for priority, (pattern, handler) in enumerate(_RULES):
+        for match in pattern.finditer(text):
+            result = handler(match, doc, language)
+            if result is None:
+                continue
+            start, end = match.span("t") if "t" in pattern.groupindex and match["t"] else match.span()
+            candidates.append((start, end, priority, result))
+    # Longest expressions win; among equal spans the earlier rule.
+    candidates.sort(key=lambda c: (-(c[1] - c[0]), c[2], c[0]))
+    taken, chosen = [], []
+    for start, end, _, result in candidates:
+        if any(start < other_end and other_start < end for other_start, other_end in taken):
+            continue
+        taken.append((start, end))
+        chosen.append((start, end, result))
+    chosen.sort(key=lambda c: c[0])
+
+    timexes = []
+    for number, (start, end, result) in enumerate(chosen, start=1):
+        interval = result.get("interval")
+        timexes.append({
+            "tid": f"t{number}",
+            "text": text[start:end],
+            "start": start,
+            "end": end,
+            "type": result["type"],
+            "value": result["value"],
+            "relative": result["relative"],
+            "interval_us": [_us(interval[0]), _us(interval[1])] if interval else None,
+            "duration_us": result.get("duration_us"),
+        })
+    return timexes
+
+
+# -------------------- Uses in the pipeline --------------------
+
+def prompt_hints(input_text, doc_date, language):
+    """
+    Returns the lines listing the resolved expressions of *input_text*, for
+    the events prompt, or "" when there are none (or hints are disabled).
+    """
+    if not HINTS_ENABLED:
+        return ""
+    resolved = [timex for timex in extract(input_text, doc_date, language) if timex["value"]]
+    if not resolved:
+        return ""
+    lines = [f'- "{timex["text"]}" ({timex["type"]}) = {timex["value"]}' for timex in resolved[:MAX_HINTS]]
+    return ("Temporal expressions found in the text, normalized against the document date "
+            "(use these values when normalizing dates):\n" + "\n".join(lines) + "\n")
+
+
+def _sentence_around(text, start, end):
+    left = max(text.rfind(mark, 0, start) for mark in ".!?\n") + 1
+    rights = [position for position in (text.find(mark, end) for mark in ".!?\n") if position != -1]
+    return " ".join(text[left:min(rights) + 1 if rights else len(text)].split())
+
+
+def _normalized_date(date_text, doc, language):
+    # A timeline date that is itself one resolvable expression ("Ayer",
+    # "yesterday morning") is replaced by its value.
+    stripped = str(date_text or "").strip().strip(".,;:()")
+    found = extract(stripped, doc, language) if stripped else []
+    if len(found) == 1 and found[0]["value"] and found[0]["relative"] and found[0]["type"] in ("DATE", "TIME") \
+            and found[0]["end"] - found[0]["start"] == len(stripped) and found[0]["value"] != stripped:
+        return found[0]["value"]
+    return None
+
+
+def annotate_events(result, input_text, doc_date, language):
+    """
+    Returns a copy of an events result with the text's temporal expressions
+    under "timexes", relative timeline dates normalized (the model's wording
+    kept as "date_text"), and temporal_references / timeline_of_events
+    pre-filled from the expressions when the model returned none. Pre-filled
+    timeline entries are marked "source": "timex".
+    """
+    doc = parse_doc_date(doc_date, language)
+    timexes = extract(input_text, doc, language)
+    annotated = dict(result)
+    annotated["timexes"] = timexes
+
+    if not annotated.get("temporal_references"):
+        annotated["temporal_references"] = [
+            {"reference": timex["text"], "description": f"{timex['type']} {timex['value'] or '(unresolved)'}"}
+            for timex in timexes
+        ]
+
+    timeline = []
+    for entry in annotated.get("timeline_of_events") or []:
+        normalized = _normalized_date(entry.get("date"), doc, language) if isinstance(entry, dict) else None
+        timeline.append(dict(entry, date=normalized, date_text=entry.get("date")) if normalized else entry)
+    if not timeline:
+        by_value = {}
+        for timex in timexes:
+            if timex["type"] != "DATE" or not timex["value"] or timex["value"].endswith("_REF"):
+                continue
+            entry = by_value.get(timex["value"])
+            if entry is None:
+                entry = by_value[timex["value"]] = {"date": timex["value"], "events": [], "source": "timex"}
+                timeline.append(entry)
+            entry["events"].append({
+                "event_summary": _sentence_around(input_text, timex["start"], timex["end"]),
+                "event_verb": "",
+                "temporal_reference_connection": timex["text"],
+            })
+        timeline.sort(key=lambda entry: entry["date"])
+    annotated["timeline_of_events"] = timeline
+    return annotated
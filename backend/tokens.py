@@ -0,0 +1,118 @@
+# tokens.py
+"""
+Local token counting and per-analysis token accounting.
+
+count_tokens() uses tiktoken when it is installed (o200k_base, the encoding of
+the o-series and gpt-4o models) and otherwise a word/punctuation heuristic
+that stays within ~10-15% of it for English and Spanish prose.
+
+record() splits each call's prompt into static instruction tokens and input
+(document) tokens and adds the answer's output tokens, per analysis, so the
+fixed overhead of a prompt version can be compared with what the documents
+themselves cost. token_stats() returns the totals; the provider-reported
+usage (llm_client.usage_stats()) remains the billing truth.
+
+Tunables (environment variables):
+  ANANSI_TOKENIZER   "heuristic" to skip tiktoken even if installed
+"""
+import math
+import os
+import re
+import threading
+
+_WORD = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# List prices in USD per million tokens (input, output), for estimates only.
+PRICES = {
+    "o4-mini": (1.10, 4.40),
+    "o3-mini": (1.10, 4.40),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _load_encoding():
+    if os.environ.get("ANANSI_TOKENIZER") == "heuristic":
+        return False
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # Not installed, or the BPE file could not be fetched.
+        return False
+
+
+def tokenizer_name():
+    return "tiktoken/o200k_base" if _get_encoding() else "heuristic"
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = _load_encoding()
+    return _encoding
+
+
+def count_tokens(text):
+    """
+    Returns the number of tokens in *text*.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Short words are one token, longer ones about one per four characters.
+    return sum(max(1, math.ceil(len(word) / 4)) for word in _WORD.findall(text))
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    Returns the list-price cost in USD, or None for models without a price.
+    """
+    prices = PRICES.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def record(analysis, prompt, input_text, output):
+    """
+    Counts one call's tokens under *analysis*.
+
+    :param prompt: The full prompt sent
+    :param input_text: The part of the prompt that is the user's document
+    :param output: The model's answer
+    """
+    prompt_tokens = count_tokens(prompt)
+    input_tokens = count_tokens(input_text)
+    output_tokens = count_tokens(output)
+    with _stats_lock:
+        totals = _stats.setdefault(analysis, {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "static_tokens": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+        })
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["static_tokens"] += max(prompt_tokens - input_tokens, 0)
+        totals["input_tokens"] += input_tokens
+        totals["output_tokens"] += output_tokens
+
+
+def token_stats():
+    """
+    Returns locally counted tokens per analysis since the process started.
+    """
+    with _stats_lock:
+        return {analysis: dict(totals) for analysis, totals in _stats.items()}
@@ -61,6 +61,8 @@ function App() {
           doc_date: docDate,
           input_text: inputText,
           language,
+          // events carry only a sentence id unless the text is asked for
+          expand_sentences: "1",
         }),
       });
 